@@ -1,16 +1,15 @@
+import asyncio
 import operator
 from typing import Dict, Any, List, Annotated
 
-import streamlit
 from langchain_core.messages import AIMessage
 from langchain_core.output_parsers import JsonOutputParser
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import START, END
 from langgraph.graph import MessagesState, StateGraph
 
 from common.agent import BaseAgent
+from common.checkpoint import get_checkpointer
 from common.sqlite import get_schema, execute_query
 
 
@@ -42,34 +41,42 @@ class DataQueryAssistantAgent(BaseAgent):
 
     interrupt_before = ["ask_question"]
 
+    semantic_cache = True
+
     update_as_node = "ask_question"
 
+    model_routes = {"parse_question": "fast"}
+
+    node_latency_budgets = {"parse_question": 10.0}
+
     @classmethod
     def update_graph_state(cls, human_message):
         return {"question": human_message}
 
     @classmethod
-    def get_graph(cls):
-        llm = ChatOpenAI(
-            model=cls.model,
-            api_key=streamlit.session_state["OPENAI_API_KEY"],
-            base_url=cls.base_url,
-            temperature=0,
-        )
+    def build_graph(cls):
+        llm = cls.get_llm(temperature=0)
+        parse_question_llm = cls.get_llm(temperature=0, node="parse_question")
 
-        def invoke_llm(state):
-            response = llm.invoke(state["messages"])
+        sqlite_file = cls.get_uploaded_file()
+
+        async def invoke_llm(state):
+            response = await llm.ainvoke(state["messages"])
             return {"messages": [response]}
 
-        def ask_question(state):
+        async def ask_question(state):
             pass
 
-        def parse_question(state):
+        def get_question(state):
+            return state.get("question")
+
+        async def parse_question(state):
             """Parse user question and identify relevant tables and columns."""
             question = state["question"]
 
-            schema = get_schema(
-                sqlite_file=streamlit.session_state["uploaded_file"][cls.name]
+            schema = await asyncio.to_thread(
+                get_schema,
+                sqlite_file=sqlite_file,
             )
 
             prompt = ChatPromptTemplate.from_messages(
@@ -106,15 +113,17 @@ class DataQueryAssistantAgent(BaseAgent):
 
             output_parser = JsonOutputParser()
 
-            response = llm.invoke(
-                prompt.format_messages(schema=schema, question=question)
+            response = (
+                await parse_question_llm.ainvoke(
+                    prompt.format_messages(schema=schema, question=question)
+                )
             ).content
 
             parsed_response = output_parser.parse(response)
 
             return {"parsed_question": parsed_response}
 
-        def get_unique_nouns(state):
+        async def get_unique_nouns(state):
             """Find unique nouns in relevant tables and columns."""
             parsed_question = state["parsed_question"]
 
@@ -129,8 +138,9 @@ class DataQueryAssistantAgent(BaseAgent):
                 if noun_columns:
                     column_names = ", ".join(f"`{col}`" for col in noun_columns)
                     query = f"SELECT DISTINCT {column_names} FROM `{table_name}`"
-                    results = execute_query(
-                        sqlite_file=streamlit.session_state["uploaded_file"][cls.name],
+                    results = await asyncio.to_thread(
+                        execute_query,
+                        sqlite_file=sqlite_file,
                         query=query,
                     )
                     for row in results:
@@ -138,7 +148,7 @@ class DataQueryAssistantAgent(BaseAgent):
 
             return {"unique_nouns": list(unique_nouns)}
 
-        def generate_sql(state: dict) -> dict:
+        async def generate_sql(state: dict) -> dict:
             """Generate SQL query based on parsed question and unique nouns."""
             question = state["question"]
             parsed_question = state["parsed_question"]
@@ -147,8 +157,9 @@ class DataQueryAssistantAgent(BaseAgent):
             if not parsed_question["is_relevant"]:
                 return {"sql_query": "NOT_RELEVANT", "is_relevant": False}
 
-            schema = get_schema(
-                sqlite_file=streamlit.session_state["uploaded_file"][cls.name]
+            schema = await asyncio.to_thread(
+                get_schema,
+                sqlite_file=sqlite_file,
             )
 
             prompt = ChatPromptTemplate.from_messages(
@@ -203,12 +214,14 @@ class DataQueryAssistantAgent(BaseAgent):
                 ]
             )
 
-            response = llm.invoke(
-                prompt.format_messages(
-                    schema=schema,
-                    question=question,
-                    parsed_question=parsed_question,
-                    unique_nouns=unique_nouns,
+            response = (
+                await llm.ainvoke(
+                    prompt.format_messages(
+                        schema=schema,
+                        question=question,
+                        parsed_question=parsed_question,
+                        unique_nouns=unique_nouns,
+                    )
                 )
             ).content
 
@@ -217,15 +230,16 @@ class DataQueryAssistantAgent(BaseAgent):
             else:
                 return {"sql_query": response}
 
-        def validate_and_fix_sql(state: dict) -> dict:
+        async def validate_and_fix_sql(state: dict) -> dict:
             """Validate and fix the generated SQL query."""
             sql_query = state["sql_query"]
 
             if sql_query == "NOT_RELEVANT":
                 return {"sql_query": "NOT_RELEVANT", "sql_valid": False}
 
-            schema = get_schema(
-                sqlite_file=streamlit.session_state["uploaded_file"][cls.name]
+            schema = await asyncio.to_thread(
+                get_schema,
+                sqlite_file=sqlite_file,
             )
 
             prompt = ChatPromptTemplate.from_messages(
@@ -288,8 +302,10 @@ class DataQueryAssistantAgent(BaseAgent):
 
             output_parser = JsonOutputParser()
 
-            response = llm.invoke(
-                prompt.format_messages(schema=schema, sql_query=sql_query)
+            response = (
+                await llm.ainvoke(
+                    prompt.format_messages(schema=schema, sql_query=sql_query)
+                )
             ).content
 
             result = output_parser.parse(response)
@@ -303,7 +319,7 @@ class DataQueryAssistantAgent(BaseAgent):
                     "sql_issues": result["issues"],
                 }
 
-        def execute_sql(state: dict) -> dict:
+        async def execute_sql(state: dict) -> dict:
             """Execute SQL query and return results."""
             query = state["sql_query"]
 
@@ -311,15 +327,16 @@ class DataQueryAssistantAgent(BaseAgent):
                 return {"results": "NOT_RELEVANT"}
 
             try:
-                results = execute_query(
-                    sqlite_file=streamlit.session_state["uploaded_file"][cls.name],
+                results = await asyncio.to_thread(
+                    execute_query,
+                    sqlite_file=sqlite_file,
                     query=query,
                 )
                 return {"results": results}
             except Exception as e:
                 return {"error": str(e)}
 
-        def format_results(state: dict) -> dict:
+        async def format_results(state: dict) -> dict:
             """Format query results into a human-readable response."""
             question = state["question"]
             results = state["results"]
@@ -341,8 +358,10 @@ class DataQueryAssistantAgent(BaseAgent):
                 ]
             )
 
-            response = llm.invoke(
-                prompt.format_messages(question=question, results=results)
+            response = (
+                await llm.ainvoke(
+                    prompt.format_messages(question=question, results=results)
+                )
             ).content
 
             final_response_prompt = """
@@ -358,15 +377,21 @@ class DataQueryAssistantAgent(BaseAgent):
                     final response: {response}
             """
 
-            final_response = llm.invoke(
-                final_response_prompt.format(
-                    human_message=state["messages"][-1],
-                    query=state["sql_query"],
-                    results=state["results"],
-                    response=response,
+            final_response = (
+                await llm.ainvoke(
+                    final_response_prompt.format(
+                        human_message=state["messages"][-1],
+                        query=state["sql_query"],
+                        results=state["results"],
+                        response=response,
+                    )
                 )
             ).content
 
+            cls.remember_answer(
+                state, final_response, source=sqlite_file, get_question=get_question
+            )
+
             return {"messages": [AIMessage(content=final_response)]}
 
         graph = StateGraph(input=InputState, output=OutputState)
@@ -382,7 +407,13 @@ class DataQueryAssistantAgent(BaseAgent):
 
         graph.add_edge(START, "agent")
         graph.add_edge("agent", "ask_question")
-        graph.add_edge("ask_question", "parse_question")
+        cls.add_semantic_cache(
+            graph,
+            after="ask_question",
+            before="parse_question",
+            source=sqlite_file,
+            get_question=get_question,
+        )
         graph.add_edge("parse_question", "get_unique_nouns")
         graph.add_edge("get_unique_nouns", "generate_sql")
         graph.add_edge("generate_sql", "validate_and_fix_sql")
@@ -391,5 +422,5 @@ class DataQueryAssistantAgent(BaseAgent):
         graph.add_edge("format_results", END)
 
         return graph.compile(
-            interrupt_before=cls.interrupt_before, checkpointer=MemorySaver()
+            interrupt_before=cls.interrupt_before, checkpointer=get_checkpointer()
         )
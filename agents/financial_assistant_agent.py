@@ -1,8 +1,7 @@
 from datetime import datetime
 
-import streamlit as st
-
 from common.agent import BaseAgent
+from common.config import get_config
 from tools.financial_assistant.last_quote import LastQuoteTool
 from tools.financial_assistant.line_items import SearchLineItemsTool
 from tools.financial_assistant.prices import PricesTool
@@ -13,6 +12,17 @@ from tools.financial_assistant.web_search import WebSearchTool
 class FinancialAssistantAgent(BaseAgent):
     name = "Financial Assistant"
 
+    config_keys = [
+        "OPENAI_API_KEY",
+        "FINANCIAL_DATASETS_API_KEY",
+        "POLYGON_API_KEY",
+        "TAVILY_API_KEY",
+    ]
+
+    # Quotes and news go stale quickly
+    semantic_cache = True
+    semantic_cache_ttl_seconds = 900
+
     system_prompt = f"""
         You are a highly capable financial assistant named FinanceGPT. Your purpose is to provide insightful and concise analysis to help users make informed financial decisions.
 
@@ -31,18 +41,13 @@ class FinancialAssistantAgent(BaseAgent):
 
     @classmethod
     def get_tools(cls):
+        config = get_config()
         return [
-            LastQuoteTool(polygon_api_key=st.session_state["POLYGON_API_KEY"]),
-            PricesTool(
-                financial_datasets_api_key=st.session_state[
-                    "FINANCIAL_DATASETS_API_KEY"
-                ]
-            ),
-            TickerNewsTool(polygon_api_key=st.session_state["POLYGON_API_KEY"]),
+            LastQuoteTool(polygon_api_key=config["POLYGON_API_KEY"]),
+            PricesTool(financial_datasets_api_key=config["FINANCIAL_DATASETS_API_KEY"]),
+            TickerNewsTool(polygon_api_key=config["POLYGON_API_KEY"]),
             SearchLineItemsTool(
-                financial_datasets_api_key=st.session_state[
-                    "FINANCIAL_DATASETS_API_KEY"
-                ]
+                financial_datasets_api_key=config["FINANCIAL_DATASETS_API_KEY"]
             ),
-            WebSearchTool(tavily_api_key=st.session_state["TAVILY_API_KEY"]),
+            WebSearchTool(tavily_api_key=config["TAVILY_API_KEY"]),
         ]
@@ -1,62 +1,59 @@
 from typing import Sequence
 
-import streamlit
-from langchain.prompts import Prompt
+from langchain_core.prompts import PromptTemplate
 from langchain_core.tools import BaseTool
-from langchain_openai import ChatOpenAI
 from langgraph.constants import START, END
 from langgraph.graph import StateGraph, MessagesState
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import tools_condition
 
 from common.agent import BaseAgent
+from common.config import get_config
 from tools.graph_rag import DocumentsRetrieverTool
 
 
 class GraphRAGAgent(BaseAgent):
     name = "Graph RAG Agent"
 
+    config_keys = [
+        "OPENAI_API_KEY",
+        "NEO4J_URI",
+        "NEO4J_USERNAME",
+        "NEO4J_PASSWORD",
+    ]
+
     @classmethod
     def get_tools(cls) -> Sequence[BaseTool]:
-        if (
-            "uploaded_file" in streamlit.session_state
-            and cls.name in streamlit.session_state["uploaded_file"]
-            and streamlit.session_state["uploaded_file"][cls.name]
-        ):
+        config = get_config()
+        if uploaded_file := cls.get_uploaded_file():
             return [
                 DocumentsRetrieverTool(
-                    pdf_file=streamlit.session_state["uploaded_file"][cls.name],
-                    openai_api_key=streamlit.session_state["OPENAI_API_KEY"],
-                    neo4j_uri=streamlit.session_state["NEO4J_URI"],
-                    neo4j_username=streamlit.session_state["NEO4J_USERNAME"],
-                    neo4j_password=streamlit.session_state["NEO4J_PASSWORD"],
+                    pdf_file=uploaded_file,
+                    openai_api_key=config["OPENAI_API_KEY"],
+                    neo4j_uri=config["NEO4J_URI"],
+                    neo4j_username=config["NEO4J_USERNAME"],
+                    neo4j_password=config["NEO4J_PASSWORD"],
                 )
             ]
         else:
             return []
 
     @classmethod
-    def get_graph(cls):
-        openai_api_key = streamlit.session_state["OPENAI_API_KEY"]
+    def build_graph(cls):
         tools = cls.get_tools()
 
-        llm = ChatOpenAI(
-            model=cls.model,
-            api_key=openai_api_key,
-            base_url=cls.base_url,
-            temperature=0,
-        )
+        llm = cls.get_llm(temperature=0)
 
         llm_with_tools = llm.bind_tools(tools)
 
-        def agent(state):
-            return {"messages": [llm_with_tools.invoke(state["messages"])]}
+        async def agent(state):
+            return {"messages": [await llm_with_tools.ainvoke(state["messages"])]}
 
-        def generate(state):
+        async def generate(state):
             messages = state["messages"]
             question = messages[0].content
             docs = messages[-1].content
 
-            prompt = Prompt.from_template(
+            prompt = PromptTemplate.from_template(
                 """
                 You are an assistant for question-answering tasks. Use the following pieces of retrieved context to answer the question. If you don't know the answer, just say that you don't know. Use three sentences maximum and keep the answer concise.
 
@@ -70,14 +67,14 @@ class GraphRAGAgent(BaseAgent):
 
             rag_chain = prompt | llm
 
-            response = rag_chain.invoke({"context": docs, "question": question})
+            response = await rag_chain.ainvoke({"context": docs, "question": question})
 
             return {"messages": [response]}
 
         graph = StateGraph(MessagesState)
 
         graph.add_node("agent", agent)
-        graph.add_node("retrieve", ToolNode(tools))
+        graph.add_node("retrieve", cls.get_tool_executor(tools))
         graph.add_node("generate", generate)
 
         graph.add_edge(START, "agent")
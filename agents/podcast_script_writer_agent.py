@@ -1,23 +1,23 @@
+import asyncio
 import operator
+import weakref
 from typing import Annotated, List
 
-import google.generativeai as genai
-import streamlit
-import streamlit as st
 from langchain_core.messages import (
     SystemMessage,
     get_buffer_string,
     AIMessage,
     HumanMessage,
 )
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import START, END
 from langgraph.graph import StateGraph, MessagesState
 from langgraph.types import Send
 
 from common.agent import BaseAgent
-from common.tools import wikipedia_search, tavily_search
+from common.config import get_config
+from common.checkpoint import get_checkpointer
+from common.rate_limit import background
+from common.tools import awikipedia_search, atavily_search
 
 
 class Planning(MessagesState):
@@ -158,9 +158,44 @@ Use ## Conclusion as the section header for your conclusion.
 Here are the segments to draw upon for crafting your conclusion: {formatted_str_sections}"""
 
 
+class GeminiModel:
+    """Gemini model calling with its own API key.
+
+    genai.configure sets the key for the whole process, so graphs of
+    sessions with different keys would send each other's. Async clients
+    are bound to the event loop they are created on, one model per loop.
+    """
+
+    def __init__(self, api_key: str, **kwargs):
+        self.api_key = api_key
+        self.kwargs = kwargs
+        self.models = weakref.WeakKeyDictionary()
+
+    def get_model(self):
+        import google.generativeai as genai
+        from google.ai import generativelanguage as glm
+
+        loop = asyncio.get_running_loop()
+        if (model := self.models.get(loop)) is None:
+            model = self.models[loop] = genai.GenerativeModel(**self.kwargs)
+            model._async_client = glm.GenerativeServiceAsyncClient(
+                client_options={"api_key": self.api_key}
+            )
+        return model
+
+    async def generate_content_async(self, contents, **kwargs):
+        return await self.get_model().generate_content_async(contents, **kwargs)
+
+
 class PodcastScriptWriterAgent(BaseAgent):
     name = "Podcast Script Writer"
 
+    config_keys = [
+        "OPENAI_API_KEY",
+        "GOOGLE_API_KEY",
+        "TAVILY_API_KEY",
+    ]
+
     system_prompt = """You are an intelligent AI agent specialised in writing the script for a podcast for a specific topic.
     Just greet the user with a Hi and ask for the topic and then proceed accordingly. Please do not include any further details and preamble."""
 
@@ -170,59 +205,70 @@ class PodcastScriptWriterAgent(BaseAgent):
 
     nodes_to_display = ["agent", "Finalize podcast"]
 
+    model_routes = {"get_keywords": "fast"}
+
+    node_latency_budgets = {"get_keywords": 5.0}
+
     @classmethod
     def update_graph_state(cls, human_message):
         return {"topic": human_message}
 
     @classmethod
-    def get_graph(cls):
-        openai_api_key = streamlit.session_state["OPENAI_API_KEY"]
-        tavily_api_key = streamlit.session_state["TAVILY_API_KEY"]
-
-        def get_model(temp: float = 0.1, max_tokens: int = 100):
-            return ChatOpenAI(
-                model=cls.model,
-                api_key=openai_api_key,
-                temperature=temp,
-                max_tokens=max_tokens,
-                base_url=cls.base_url,
-            )
+    def get_script_model(cls, config):
+        # Stateless calls, the compiled graph is cached and shared between runs
+        return GeminiModel(
+            api_key=config["GOOGLE_API_KEY"],
+            model_name="gemini-1.5-flash",
+            generation_config={
+                "temperature": 0.21,
+                "top_p": 0.95,
+                "top_k": 64,
+                "max_output_tokens": 5000,
+                "response_mime_type": "text/plain",
+            },
+        )
 
-        def invoke_llm(state):
-            response = get_model().invoke(state["messages"])
+    @classmethod
+    def build_graph(cls):
+        config = get_config()
+        tavily_api_key = config["TAVILY_API_KEY"]
+
+        # Built here, the nodes run on the agent loop without the session's config
+        model = cls.get_llm(temperature=0.1, max_tokens=100)
+        keywords_model = cls.get_llm(
+            temperature=0.1, max_tokens=100, node="get_keywords"
+        )
+        long_model = cls.get_llm(temperature=0.1, max_tokens=1000)
+
+        async def invoke_llm(state):
+            response = await model.ainvoke(state["messages"])
             return {"messages": [response]}
 
-        def ask_topic(state):
+        async def ask_topic(state):
             pass
 
-        def get_keywords(state: Planning):
-            return {
-                "keywords": get_model()
-                .invoke(
-                    [
-                        SystemMessage(
-                            content=f"Your task is to generate 5 comma separated relevant words about the following topic: {state["topic"]}"
-                        )
-                    ]
-                    + state["messages"]
-                )
-                .content.split(",")
-            }
+        async def get_keywords(state: Planning):
+            response = await keywords_model.ainvoke(
+                [
+                    SystemMessage(
+                        content=f"Your task is to generate 5 comma separated relevant words about the following topic: {state["topic"]}"
+                    )
+                ]
+                + state["messages"]
+            )
+            return {"keywords": response.content.split(",")}
 
-        def get_structure(state: Planning):
-            return {
-                "subtopics": get_model()
-                .invoke(
-                    [
-                        SystemMessage(
-                            content=f"""You task is to generate 5 comma separated subtopics to make a podcast about the following topic: {state["topic"]}, and the following keywords: {",".join(state["keywords"])}.
-                            Do not include any preamble in your response, just provide the comma separated subtopics."""
-                        )
-                    ]
-                    + state["messages"]
-                )
-                .content.split(",")
-            }
+        async def get_structure(state: Planning):
+            response = await model.ainvoke(
+                [
+                    SystemMessage(
+                        content=f"""You task is to generate 5 comma separated subtopics to make a podcast about the following topic: {state["topic"]}, and the following keywords: {",".join(state["keywords"])}.
+                        Do not include any preamble in your response, just provide the comma separated subtopics."""
+                    )
+                ]
+                + state["messages"]
+            )
+            return {"subtopics": response.content.split(",")}
 
         planning_builder = StateGraph(Planning)
 
@@ -233,11 +279,11 @@ class PodcastScriptWriterAgent(BaseAgent):
         planning_builder.add_edge("get_keywords", "get_structure")
         planning_builder.add_edge("get_structure", END)
 
-        def generate_question(state: InterviewState):
+        async def generate_question(state: InterviewState):
             """Node to generate a question"""
             return {
                 "messages": [
-                    get_model(max_tokens=1000).invoke(
+                    await long_model.ainvoke(
                         [
                             SystemMessage(
                                 content=question_instructions.format(
@@ -250,37 +296,26 @@ class PodcastScriptWriterAgent(BaseAgent):
                 ]
             }
 
-        def search_web(state: InterviewState):
+        async def search_web(state: InterviewState):
+            query = await long_model.ainvoke(
+                [SystemMessage(content=search_instructions)] + [state["messages"][-1]]
+            )
             return {
                 "context": [
-                    tavily_search(
-                        query=get_model(max_tokens=1000)
-                        .invoke(
-                            [SystemMessage(content=search_instructions)]
-                            + [state["messages"][-1]]
-                        )
-                        .content,
-                        tavily_api_key=tavily_api_key,
+                    await atavily_search(
+                        query=query.content, tavily_api_key=tavily_api_key
                     )
                 ]
             }
 
-        def search_wikipedia(state: InterviewState):
-            return {
-                "context": [
-                    wikipedia_search(
-                        query=get_model(max_tokens=1000)
-                        .invoke(
-                            [SystemMessage(content=search_instructions)]
-                            + state["messages"]
-                        )
-                        .content
-                    )
-                ]
-            }
+        async def search_wikipedia(state: InterviewState):
+            query = await long_model.ainvoke(
+                [SystemMessage(content=search_instructions)] + state["messages"]
+            )
+            return {"context": [await awikipedia_search(query=query.content)]}
 
-        def generate_answer(state: InterviewState):
-            answer = get_model(max_tokens=1000).invoke(
+        async def generate_answer(state: InterviewState):
+            answer = await long_model.ainvoke(
                 [
                     SystemMessage(
                         content=answer_instructions.format(
@@ -294,7 +329,7 @@ class PodcastScriptWriterAgent(BaseAgent):
 
             return {"messages": [answer]}
 
-        def save_podcast(state: InterviewState):
+        async def save_podcast(state: InterviewState):
             return {"section": get_buffer_string(state["messages"])}
 
         def route_messages(state: InterviewState, name: str = "expert"):
@@ -314,39 +349,27 @@ class PodcastScriptWriterAgent(BaseAgent):
                 return "Save podcast"
             return "Host question"
 
-        generation_config = {
-            "temperature": 0.21,
-            "top_p": 0.95,
-            "top_k": 64,
-            "max_output_tokens": 5000,
-            "response_mime_type": "text/plain",
-        }
+        podcast_model = cls.get_script_model(config)
 
-        genai.configure(api_key=st.session_state["GOOGLE_API_KEY"])
-
-        model = genai.GenerativeModel(
-            model_name="gemini-1.5-flash",
-            generation_config=generation_config,
-        )
-
-        podcast_model = model.start_chat()
-
-        def write_section(state: InterviewState):
+        async def write_section(state: InterviewState):
             return {
                 "sections": [
-                    podcast_model.send_message(
-                        section_writer_instructions.format(focus=state["topic"])
-                        + f"Use this source to write your section: {state["section"]}"
+                    (
+                        await podcast_model.generate_content_async(
+                            section_writer_instructions.format(focus=state["topic"])
+                            + f"Use this source to write your section: {state["section"]}"
+                        )
                     ).text
                 ]
             }
 
         interview_builder = StateGraph(InterviewState)
 
-        interview_builder.add_node("Host question", generate_question)
-        interview_builder.add_node("Web research", search_web)
-        interview_builder.add_node("Wiki research", search_wikipedia)
-        interview_builder.add_node("Expert answer", generate_answer)
+        # Interviews run in parallel, in the background lane of the rate limits
+        interview_builder.add_node("Host question", background(generate_question))
+        interview_builder.add_node("Web research", background(search_web))
+        interview_builder.add_node("Wiki research", background(search_wikipedia))
+        interview_builder.add_node("Expert answer", background(generate_answer))
         interview_builder.add_node("Save podcast", save_podcast)
         interview_builder.add_node("Write script", write_section)
 
@@ -378,43 +401,49 @@ class PodcastScriptWriterAgent(BaseAgent):
                 for subtopic in state["subtopics"]
             ]
 
-        def write_report(state: ResearchGraphState):
+        async def write_report(state: ResearchGraphState):
             return {
-                "content": podcast_model.send_message(
-                    report_writer_instructions.format(
-                        topic=state["topic"],
-                        context="\n\n".join(
-                            [f"{section}" for section in state["sections"]]
-                        ),
+                "content": (
+                    await podcast_model.generate_content_async(
+                        report_writer_instructions.format(
+                            topic=state["topic"],
+                            context="\n\n".join(
+                                [f"{section}" for section in state["sections"]]
+                            ),
+                        )
                     )
                 ).text
             }
 
-        def write_introduction(state: ResearchGraphState):
+        async def write_introduction(state: ResearchGraphState):
             return {
-                "introduction": podcast_model.send_message(
-                    intro_instructions.format(
-                        topic=state["topic"],
-                        formatted_str_sections="\n\n".join(
-                            [f"{section}" for section in state["sections"]]
-                        ),
+                "introduction": (
+                    await podcast_model.generate_content_async(
+                        intro_instructions.format(
+                            topic=state["topic"],
+                            formatted_str_sections="\n\n".join(
+                                [f"{section}" for section in state["sections"]]
+                            ),
+                        )
                     )
                 ).text
             }
 
-        def write_conclusion(state: ResearchGraphState):
+        async def write_conclusion(state: ResearchGraphState):
             return {
-                "conclusion": podcast_model.send_message(
-                    conclusion_instructions.format(
-                        topic=state["topic"],
-                        formatted_str_sections="\n\n".join(
-                            [f"{section}" for section in state["sections"]]
-                        ),
+                "conclusion": (
+                    await podcast_model.generate_content_async(
+                        conclusion_instructions.format(
+                            topic=state["topic"],
+                            formatted_str_sections="\n\n".join(
+                                [f"{section}" for section in state["sections"]]
+                            ),
+                        )
                     )
                 ).text
             }
 
-        def finalize_report(state: ResearchGraphState):
+        async def finalize_report(state: ResearchGraphState):
             final_report = (
                 state["introduction"]
                 + "\n\n---\n\n"
@@ -454,5 +483,5 @@ class PodcastScriptWriterAgent(BaseAgent):
         builder.add_edge("Finalize podcast", END)
 
         return builder.compile(
-            interrupt_before=cls.interrupt_before, checkpointer=MemorySaver()
+            interrupt_before=cls.interrupt_before, checkpointer=get_checkpointer()
         )
@@ -1,6 +1,5 @@
-import streamlit as st
-
 from common.agent import BaseAgent
+from common.config import get_config
 from tools.python_and_react_assistant.execute_python import ExecutePythonTool
 from tools.python_and_react_assistant.install_npm_dependencies import (
     install_npm_dependencies,
@@ -11,6 +10,11 @@ from tools.python_and_react_assistant.render_react import render_react
 class PythonAndReactAssistantAgent(BaseAgent):
     name = "Python and React Assistant"
 
+    config_keys = ["OPENAI_API_KEY", "E2B_API_KEY"]
+
+    # npm installs and renders share the working directory, run them in order
+    max_tool_concurrency = 1
+
     system_prompt = """
             You are a Python and React expert. You can create React applications and run Python code in a Jupyter notebook. Here are some guidelines for this environment:
             - The python code runs in jupyter notebook.
@@ -29,7 +33,7 @@ class PythonAndReactAssistantAgent(BaseAgent):
     def get_tools(cls):
         return [
             ExecutePythonTool(
-                e2b_api_key=st.session_state["E2B_API_KEY"],
+                e2b_api_key=get_config()["E2B_API_KEY"],
             ),
             render_react,
             install_npm_dependencies,
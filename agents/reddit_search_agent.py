@@ -1,12 +1,18 @@
-import streamlit
-
 from common.agent import BaseAgent
+from common.config import get_config
 from tools.reddit_search import RedditSearchTool
 
 
 class RedditSearchAgent(BaseAgent):
     name = "Reddit Search"
 
+    config_keys = [
+        "OPENAI_API_KEY",
+        "REDDIT_CLIENT_ID",
+        "REDDIT_CLIENT_SECRET",
+        "REDDIT_USER_AGENT",
+    ]
+
     system_prompt = """
         You are a helpful assistant that helps users find information on Reddit.
         You can search for information on any topic and get relevant results.
@@ -18,10 +24,11 @@ class RedditSearchAgent(BaseAgent):
 
     @classmethod
     def get_tools(cls):
+        config = get_config()
         return [
             RedditSearchTool(
-                reddit_client_id=streamlit.session_state["REDDIT_CLIENT_ID"],
-                reddit_client_secret=streamlit.session_state["REDDIT_CLIENT_SECRET"],
-                reddit_user_agent=streamlit.session_state["REDDIT_USER_AGENT"],
+                reddit_client_id=config["REDDIT_CLIENT_ID"],
+                reddit_client_secret=config["REDDIT_CLIENT_SECRET"],
+                reddit_user_agent=config["REDDIT_USER_AGENT"],
             )
         ]
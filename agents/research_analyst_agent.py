@@ -29,23 +29,21 @@ Output Format:
 import operator
 from typing import List, Annotated
 
-import streamlit
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools import TavilySearchResults
-from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
 from langchain_core.messages import (
     SystemMessage,
     HumanMessage,
     get_buffer_string,
     AIMessage,
 )
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import START, END, Send
 from langgraph.graph import StateGraph, MessagesState
 from pydantic import BaseModel, Field
 
 from common.agent import BaseAgent
+from common.config import get_config
+from common.checkpoint import get_checkpointer
+from common.rate_limit import background
+from common.tools import atavily_search, awikipedia_search
 
 
 class UserInput(BaseModel):
@@ -297,6 +295,8 @@ intro_conclusion_instructions = """
 class ResearchAnalystAgent(BaseAgent):
     name = "Research Analyst"
 
+    config_keys = ["OPENAI_API_KEY", "TAVILY_API_KEY"]
+
     system_prompt = """
         You are a research analyst AI agent.
         Ask for the topic and the number of analysts to be involved in the research.
@@ -309,27 +309,37 @@ class ResearchAnalystAgent(BaseAgent):
 
     nodes_to_display = ["agent", "create_analysts", "finalize_report"]
 
+    model_routes = {
+        "user_input": "fast",
+        "search_web": "fast",
+        "search_wikipedia": "fast",
+    }
+
+    node_latency_budgets = {
+        "user_input": 5.0,
+        "search_web": 15.0,
+        "search_wikipedia": 15.0,
+    }
+
     @classmethod
-    def get_graph(cls):
-        openai_api_key = streamlit.session_state["OPENAI_API_KEY"]
-        tavily_api_key = streamlit.session_state["TAVILY_API_KEY"]
-
-        llm = ChatOpenAI(
-            model=cls.model,
-            api_key=openai_api_key,
-            base_url=cls.base_url,
-            temperature=0,
-        )
+    def build_graph(cls):
+        config = get_config()
+        tavily_api_key = config["TAVILY_API_KEY"]
+
+        llm = cls.get_llm(temperature=0)
+        user_input_llm = cls.get_llm(temperature=0, node="user_input")
+        search_web_llm = cls.get_llm(temperature=0, node="search_web")
+        search_wikipedia_llm = cls.get_llm(temperature=0, node="search_wikipedia")
 
         graph = StateGraph(ResearchGraphState)
 
-        def call_model(state: GenerateAnalystsState):
-            response = llm.invoke(state["messages"])
+        async def call_model(state: GenerateAnalystsState):
+            response = await llm.ainvoke(state["messages"])
             return {"messages": [response]}
 
-        def user_input(state: GenerateAnalystsState):
+        async def user_input(state: GenerateAnalystsState):
             last_message = state["messages"][-1]
-            structured_llm = llm.with_structured_output(UserInput)
+            structured_llm = user_input_llm.with_structured_output(UserInput)
 
             prompt = """
             Below is the input from the user:
@@ -338,11 +348,13 @@ class ResearchAnalystAgent(BaseAgent):
             Fetch the topic and number of analysts from the user's input.
             """
 
-            response = structured_llm.invoke(prompt.format(last_message=last_message))
+            response = await structured_llm.ainvoke(
+                prompt.format(last_message=last_message)
+            )
 
             return {"topic": response.topic, "max_analysts": response.max_analysts}
 
-        def create_analysts(state: GenerateAnalystsState):
+        async def create_analysts(state: GenerateAnalystsState):
             """Create analysts"""
 
             topic = state["topic"]
@@ -358,7 +370,7 @@ class ResearchAnalystAgent(BaseAgent):
             )
 
             # Generate question
-            analysts = structured_llm.invoke(
+            analysts = await structured_llm.ainvoke(
                 [SystemMessage(content=system_message)]
                 + [HumanMessage(content="Generate the set of analysts.")]
             )
@@ -373,7 +385,7 @@ class ResearchAnalystAgent(BaseAgent):
             And then mention the details. Avoid the header.
             """
 
-            analysts_details = llm.invoke(
+            analysts_details = await llm.ainvoke(
                 prompt_analysts_details.format(
                     analysts=",".join([a.persona for a in analysts.analysts])
                 )
@@ -382,7 +394,7 @@ class ResearchAnalystAgent(BaseAgent):
             # Write the list of analysis to state
             return {"messages": [analysts_details], "analysts": analysts.analysts}
 
-        def ask_question(state: InterviewState):
+        async def ask_question(state: InterviewState):
             """Node to generate a question"""
 
             # Get state
@@ -391,62 +403,39 @@ class ResearchAnalystAgent(BaseAgent):
 
             # Generate question
             system_message = question_instructions.format(goals=analyst.persona)
-            question = llm.invoke([SystemMessage(content=system_message)] + messages)
+            question = await llm.ainvoke(
+                [SystemMessage(content=system_message)] + messages
+            )
 
             # Write messages to state
             return {"messages": [question]}
 
-        def search_web(state: InterviewState):
+        async def search_web(state: InterviewState):
             """Retrieve docs from web search"""
 
             # Search query
-            structured_llm = llm.with_structured_output(SearchQuery)
-            search_query = structured_llm.invoke(
+            structured_llm = search_web_llm.with_structured_output(SearchQuery)
+            search_query = await structured_llm.ainvoke(
                 [SystemMessage(content=search_instructions)] + state["messages"]
             )
 
-            # Search
-            tavily_search = TavilySearchResults(
-                max_results=3,
-                api_wrapper=TavilySearchAPIWrapper(tavily_api_key=tavily_api_key),
-            )
-            search_docs = tavily_search.invoke(search_query.search_query)
-
-            # Format
-            formatted_search_docs = "\n\n---\n\n".join(
-                [
-                    f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-                    for doc in search_docs
-                ]
+            # Analysts searching the same query share one search
+            return await atavily_search(
+                query=search_query.search_query, tavily_api_key=tavily_api_key
             )
 
-            return {"context": [formatted_search_docs]}
-
-        def search_wikipedia(state: InterviewState):
+        async def search_wikipedia(state: InterviewState):
             """Retrieve docs from wikipedia"""
 
             # Search query
-            structured_llm = llm.with_structured_output(SearchQuery)
-            search_query = structured_llm.invoke(
+            structured_llm = search_wikipedia_llm.with_structured_output(SearchQuery)
+            search_query = await structured_llm.ainvoke(
                 [search_instructions] + state["messages"]
             )
 
-            # Search
-            search_docs = WikipediaLoader(
-                query=search_query.search_query, load_max_docs=2
-            ).load()
-
-            # Format
-            formatted_search_docs = "\n\n---\n\n".join(
-                [
-                    f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
-                    for doc in search_docs
-                ]
-            )
-
-            return {"context": [formatted_search_docs]}
+            return await awikipedia_search(query=search_query.search_query)
 
-        def answer_question(state: InterviewState):
+        async def answer_question(state: InterviewState):
             """Node to answer a question"""
 
             # Get state
@@ -458,7 +447,9 @@ class ResearchAnalystAgent(BaseAgent):
             system_message = answer_instructions.format(
                 goals=analyst.persona, context=context
             )
-            answer = llm.invoke([SystemMessage(content=system_message)] + messages)
+            answer = await llm.ainvoke(
+                [SystemMessage(content=system_message)] + messages
+            )
 
             # Name the message as coming from the expert
             answer.name = "expert"
@@ -466,7 +457,7 @@ class ResearchAnalystAgent(BaseAgent):
             # Append it to state
             return {"messages": [answer]}
 
-        def write_section(state: InterviewState):
+        async def write_section(state: InterviewState):
             """Node to answer a question"""
 
             # Get state
@@ -477,7 +468,7 @@ class ResearchAnalystAgent(BaseAgent):
             system_message = section_writer_instructions.format(
                 focus=analyst.description
             )
-            section = llm.invoke(
+            section = await llm.ainvoke(
                 [SystemMessage(content=system_message)]
                 + [
                     HumanMessage(
@@ -489,7 +480,7 @@ class ResearchAnalystAgent(BaseAgent):
             # Append it to state
             return {"sections": [section.content]}
 
-        def save_interview(state: InterviewState):
+        async def save_interview(state: InterviewState):
             """Save interviews"""
 
             # Get messages
@@ -527,12 +518,13 @@ class ResearchAnalystAgent(BaseAgent):
 
         interview_builder = StateGraph(InterviewState)
 
-        interview_builder.add_node("ask_question", ask_question)
-        interview_builder.add_node("search_web", search_web)
-        interview_builder.add_node("search_wikipedia", search_wikipedia)
-        interview_builder.add_node("answer_question", answer_question)
+        # Interviews run in parallel, in the background lane of the rate limits
+        interview_builder.add_node("ask_question", background(ask_question))
+        interview_builder.add_node("search_web", background(search_web))
+        interview_builder.add_node("search_wikipedia", background(search_wikipedia))
+        interview_builder.add_node("answer_question", background(answer_question))
         interview_builder.add_node("save_interview", save_interview)
-        interview_builder.add_node("write_section", write_section)
+        interview_builder.add_node("write_section", background(write_section))
 
         # Flow
         interview_builder.add_edge(START, "ask_question")
@@ -548,7 +540,7 @@ class ResearchAnalystAgent(BaseAgent):
         interview_builder.add_edge("save_interview", "write_section")
         interview_builder.add_edge("write_section", END)
 
-        def write_report(state: ResearchGraphState):
+        async def write_report(state: ResearchGraphState):
             # Full set of sections
             sections = state["sections"]
             topic = state["topic"]
@@ -560,13 +552,13 @@ class ResearchAnalystAgent(BaseAgent):
             system_message = report_writer_instructions.format(
                 topic=topic, context=formatted_str_sections
             )
-            report = llm.invoke(
+            report = await llm.ainvoke(
                 [SystemMessage(content=system_message)]
                 + [HumanMessage(content=f"Write a report based upon these memos.")]
             )
             return {"content": report.content}
 
-        def write_introduction(state: ResearchGraphState):
+        async def write_introduction(state: ResearchGraphState):
             # Full set of sections
             sections = state["sections"]
             topic = state["topic"]
@@ -579,13 +571,13 @@ class ResearchAnalystAgent(BaseAgent):
             instructions = intro_conclusion_instructions.format(
                 topic=topic, formatted_str_sections=formatted_str_sections
             )
-            intro = llm.invoke(
+            intro = await llm.ainvoke(
                 [instructions]
                 + [HumanMessage(content=f"Write the report introduction")]
             )
             return {"introduction": intro.content}
 
-        def write_conclusion(state: ResearchGraphState):
+        async def write_conclusion(state: ResearchGraphState):
             # Full set of sections
             sections = state["sections"]
             topic = state["topic"]
@@ -598,12 +590,12 @@ class ResearchAnalystAgent(BaseAgent):
             instructions = intro_conclusion_instructions.format(
                 topic=topic, formatted_str_sections=formatted_str_sections
             )
-            conclusion = llm.invoke(
+            conclusion = await llm.ainvoke(
                 [instructions] + [HumanMessage(content=f"Write the report conclusion")]
             )
             return {"conclusion": conclusion.content}
 
-        def finalize_report(state: ResearchGraphState):
+        async def finalize_report(state: ResearchGraphState):
             """This is the "reduce" step where we gather all the sections, combine them, and reflect on them to write the intro/conclusion"""
 
             # Save full final report
@@ -676,5 +668,5 @@ class ResearchAnalystAgent(BaseAgent):
         graph.add_edge("finalize_report", END)
 
         return graph.compile(
-            interrupt_before=cls.interrupt_before, checkpointer=MemorySaver()
+            interrupt_before=cls.interrupt_before, checkpointer=get_checkpointer()
         )
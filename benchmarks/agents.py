@@ -0,0 +1,795 @@
+"""Offline benchmark of the agent graphs with scripted fake models and tools.
+
+Every graph is built outside Streamlit, with fake chat models, stubbed
+tools and stubbed search/Gemini clients that only sleep for the injected
+latency. The report gives per-node wall time, the parallelism achieved by
+fan-out, time spent in the checkpointer and peak memory, as JSON. Run from
+the repository root:
+
+    python -m benchmarks.agents --output results.json
+    python -m benchmarks.agents --baseline results.json
+
+Fake models of the fast tier answer after --fast-llm-latency seconds, and
+with several --routing-profiles the report compares their end-to-end wall
+time:
+
+    python -m benchmarks.agents --routing-profiles routed single
+"""
+
+import os
+
+# The caches would turn repeated runs into lookups
+os.environ.setdefault("AGENT_LLM_CACHE", "0")
+os.environ.setdefault("AGENT_SEMANTIC_CACHE", "0")
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import platform
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Callable, Optional
+from unittest import mock
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.tools import StructuredTool
+from langgraph.checkpoint.memory import MemorySaver
+
+import common.checkpoint
+import langchain_community.document_loaders
+import langchain_community.tools
+import langchain_community.utilities.tavily_search
+from agents import podcast_script_writer_agent
+from agents.data_query_assistant_agent import DataQueryAssistantAgent
+from agents.financial_assistant_agent import FinancialAssistantAgent
+from agents.graph_rag_agent import GraphRAGAgent
+from agents.podcast_script_writer_agent import PodcastScriptWriterAgent
+from agents.research_analyst_agent import (
+    Analyst,
+    Perspectives,
+    ResearchAnalystAgent,
+    SearchQuery,
+    UserInput,
+)
+from agents.simple_rag_agent import SimpleRAGAgent
+from common.agent import ROUTING_PROFILES
+from common.checkpoint import SqliteCheckpointSaver
+from common.config import AgentConfig, use_config
+
+CONFIG = AgentConfig(
+    keys={
+        key: "benchmark"
+        for key in [
+            "OPENAI_API_KEY",
+            "TAVILY_API_KEY",
+            "GOOGLE_API_KEY",
+            "FINANCIAL_DATASETS_API_KEY",
+            "POLYGON_API_KEY",
+            "NEO4J_URI",
+            "NEO4J_USERNAME",
+            "NEO4J_PASSWORD",
+        ]
+    }
+)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering with `respond(messages)` after `latency` seconds."""
+
+    respond: Callable[[list], Any]
+    latency: float = 0.0
+    structured: dict[str, Callable[[], Any]] = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _result(self, messages) -> ChatResult:
+        response = self.respond(messages)
+        if isinstance(response, str):
+            response = AIMessage(content=response)
+        return ChatResult(generations=[ChatGeneration(message=response)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def with_structured_output(self, schema, **kwargs):
+        def invoke(_):
+            time.sleep(self.latency)
+            return self.structured[schema.__name__]()
+
+        async def ainvoke(_):
+            await asyncio.sleep(self.latency)
+            return self.structured[schema.__name__]()
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=schema.__name__)
+
+
+def fake_tool(name: str, result: str, latency: float):
+    async def run(**kwargs):
+        await asyncio.sleep(latency)
+        return result
+
+    return StructuredTool.from_function(
+        coroutine=run,
+        name=name,
+        description=f"Fake {name}",
+        args_schema={
+            "type": "object",
+            "properties": {"query": {"type": "string"}},
+        },
+    )
+
+
+def text_of(messages) -> str:
+    return "\n".join(
+        message if isinstance(message, str) else str(message.content)
+        for message in messages
+    )
+
+
+def tool_call(name: str, **args) -> dict:
+    return {"name": name, "args": args, "id": f"call_{uuid.uuid4().hex[:8]}"}
+
+
+class Scenario:
+    """An agent, patched for offline runs, and the turns of one conversation."""
+
+    name: str
+    agent: type
+
+    def __init__(
+        self,
+        llm_latency: float,
+        tool_latency: float,
+        fanout: int,
+        fast_llm_latency: float = None,
+    ):
+        self.llm_latency = llm_latency
+        self.tool_latency = tool_latency
+        self.fanout = fanout
+        self.fast_llm_latency = (
+            llm_latency if fast_llm_latency is None else fast_llm_latency
+        )
+
+    def respond(self, messages):
+        return "Done."
+
+    def structured(self) -> dict:
+        return {}
+
+    def get_llm(self, tier: str = "default", **kwargs):
+        return FakeChatModel(
+            respond=self.respond,
+            latency=self.fast_llm_latency if tier == "fast" else self.llm_latency,
+            structured=self.structured(),
+        )
+
+    def get_tools(self):
+        return []
+
+    def patches(self) -> list:
+        return []
+
+    def agent_class(self, routing_profile: str = "routed"):
+        scenario = self
+
+        class BenchmarkAgent(self.agent):
+            @classmethod
+            def get_llm(cls, cache=None, node=None, **kwargs):
+                return scenario.get_llm(tier=cls.get_model_tier(node), **kwargs)
+
+            @classmethod
+            def get_tools(cls):
+                return scenario.get_tools()
+
+            @classmethod
+            def get_uploaded_file(cls):
+                return scenario.uploaded_file()
+
+        BenchmarkAgent.routing_profile = routing_profile
+        BenchmarkAgent.__name__ = f"Benchmark{self.agent.__name__}"
+        return BenchmarkAgent
+
+    def uploaded_file(self) -> Optional[str]:
+        return None
+
+    def turns(self) -> list[str]:
+        return ["Hello"]
+
+
+class BaseAgentScenario(Scenario):
+    name = "BaseAgent"
+    agent = FinancialAssistantAgent
+
+    tools = ["get-prices", "get-ticker-news", "search_line_items"]
+
+    def respond(self, messages):
+        if messages[-1].type == "tool":
+            return "Apple, Microsoft and Nvidia are all up this quarter."
+        return AIMessage(
+            content="",
+            tool_calls=[
+                tool_call(tool, query=ticker)
+                for tool in self.tools
+                for ticker in ["AAPL", "MSFT", "NVDA"][: self.fanout]
+            ],
+        )
+
+    def get_tools(self):
+        prices = json.dumps([{"close": 100 + i, "time": i} for i in range(5000)])
+        return [
+            fake_tool(tool, prices if tool == "get-prices" else "{}", self.tool_latency)
+            for tool in self.tools
+        ]
+
+    def turns(self):
+        return [
+            "Compare prices, news and revenue of Apple, Microsoft and Nvidia",
+            "And how did they do last year?",
+        ]
+
+
+class ResearchAnalystScenario(Scenario):
+    name = "ResearchAnalystAgent"
+    agent = ResearchAnalystAgent
+
+    def respond(self, messages):
+        text = text_of(messages)
+        if "interviewing an expert" in text:
+            return "Can you tell me more about this?"
+        return "Here is some text written by the fake model."
+
+    def structured(self):
+        return {
+            "UserInput": lambda: UserInput(topic="AI agents", max_analysts=self.fanout),
+            "Perspectives": lambda: Perspectives(
+                analysts=[
+                    Analyst(
+                        affiliation="Lab",
+                        name=f"Analyst {i}",
+                        role="Researcher",
+                        description=f"Focus area {i}",
+                    )
+                    for i in range(self.fanout)
+                ]
+            ),
+            "SearchQuery": lambda: SearchQuery(search_query="AI agents"),
+        }
+
+    def patches(self):
+        latency = self.tool_latency
+
+        class FakeTavilySearch:
+            def __init__(self, **kwargs):
+                pass
+
+            async def ainvoke(self, query):
+                await asyncio.sleep(latency)
+                return [{"url": "https://example.com", "content": "Search result"}]
+
+        class FakeWikipediaLoader:
+            def __init__(self, **kwargs):
+                pass
+
+            async def aload(self):
+                await asyncio.sleep(latency)
+                return [Document("Wikipedia page", metadata={"source": "wiki"})]
+
+        return [
+            mock.patch.object(
+                langchain_community.tools, "TavilySearchResults", FakeTavilySearch
+            ),
+            mock.patch.object(
+                langchain_community.utilities.tavily_search,
+                "TavilySearchAPIWrapper",
+                lambda **kwargs: None,
+            ),
+            mock.patch.object(
+                langchain_community.document_loaders,
+                "WikipediaLoader",
+                FakeWikipediaLoader,
+            ),
+        ]
+
+    def turns(self):
+        return ["Hi", f"Research AI agents with {self.fanout} analysts"]
+
+
+class PodcastScriptWriterScenario(Scenario):
+    name = "PodcastScriptWriterAgent"
+    agent = PodcastScriptWriterAgent
+
+    def respond(self, messages):
+        text = text_of(messages)
+        if "comma separated" in text:
+            return ",".join(f"item {i}" for i in range(self.fanout))
+        return "Here is some text written by the fake model."
+
+    def patches(self):
+        latency = self.tool_latency
+        llm_latency = self.llm_latency
+
+        class FakeGenerativeModel:
+            async def generate_content_async(self, prompt):
+                await asyncio.sleep(llm_latency)
+                return SimpleNamespace(text="Podcast script section.")
+
+        async def search(**kwargs):
+            await asyncio.sleep(latency)
+            return "Search result"
+
+        return [
+            mock.patch.object(
+                PodcastScriptWriterAgent,
+                "get_script_model",
+                classmethod(lambda cls, config: FakeGenerativeModel()),
+            ),
+            mock.patch.object(podcast_script_writer_agent, "atavily_search", search),
+            mock.patch.object(podcast_script_writer_agent, "awikipedia_search", search),
+        ]
+
+    def turns(self):
+        return ["Hi", "The history of jazz"]
+
+
+class DataQueryAssistantScenario(Scenario):
+    name = "DataQueryAssistantAgent"
+    agent = DataQueryAssistantAgent
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.database = os.path.join(tempfile.mkdtemp(), "benchmark.sqlite")
+
+        conn = sqlite3.connect(self.database)
+        with conn:
+            conn.execute("CREATE TABLE sales (artist TEXT, amount REAL)")
+            conn.executemany(
+                "INSERT INTO sales VALUES (?, ?)",
+                [(f"Artist {i % 50}", i * 1.5) for i in range(1000)],
+            )
+        conn.close()
+
+    def uploaded_file(self):
+        return self.database
+
+    def respond(self, messages):
+        text = text_of(messages)
+        if "identify the relevant tables" in text:
+            return json.dumps(
+                {
+                    "is_relevant": True,
+                    "relevant_tables": [
+                        {
+                            "table_name": "sales",
+                            "columns": ["artist", "amount"],
+                            "noun_columns": ["artist"],
+                        }
+                    ],
+                }
+            )
+        if "validates and fixes SQL" in text:
+            return json.dumps({"valid": True, "issues": None, "corrected_query": ""})
+        if "generates SQL queries" in text:
+            return (
+                "SELECT artist, SUM(amount) FROM sales "
+                "GROUP BY artist ORDER BY 2 DESC LIMIT 5"
+            )
+        return "The top selling artists are Artist 49 and Artist 48."
+
+    def turns(self):
+        return ["Hi", "Who are the top selling artists?"]
+
+
+class SimpleRAGScenario(Scenario):
+    name = "SimpleRAGAgent"
+    agent = SimpleRAGAgent
+
+    def uploaded_file(self):
+        return "benchmark.pdf"
+
+    def respond(self, messages):
+        if "retrieved context" in text_of(messages):
+            return "The document concludes that fake models are fast."
+        return AIMessage(
+            content="", tool_calls=[tool_call("documents-retriever", query="summary")]
+        )
+
+    def get_tools(self):
+        return [
+            fake_tool(
+                "documents-retriever",
+                "Chunk of the document. " * 100,
+                self.tool_latency,
+            )
+        ]
+
+    def turns(self):
+        return ["What is the main conclusion of the document?"]
+
+
+class GraphRAGScenario(SimpleRAGScenario):
+    name = "GraphRAGAgent"
+    agent = GraphRAGAgent
+
+
+SCENARIOS = [
+    BaseAgentScenario,
+    ResearchAnalystScenario,
+    PodcastScriptWriterScenario,
+    DataQueryAssistantScenario,
+    SimpleRAGScenario,
+    GraphRAGScenario,
+]
+
+
+class NodeTimer(BaseCallbackHandler):
+    """Wall time of every graph node run, nested subgraph nodes included."""
+
+    run_inline = True
+
+    def __init__(self):
+        self.started = {}
+        self.parents = {}
+        self.intervals = []
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        self.parents[run_id] = parent_run_id
+        metadata = metadata or {}
+        if kwargs.get("name") and kwargs["name"] == metadata.get("langgraph_node"):
+            namespace = metadata.get("langgraph_checkpoint_ns", "")
+            path = "/".join(part.split(":")[0] for part in namespace.split("|"))
+            self.started[run_id] = (path or kwargs["name"], time.perf_counter())
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        if run_id in self.started:
+            node, start = self.started.pop(run_id)
+            self.intervals.append((run_id, node, start, time.perf_counter()))
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.on_chain_end(None, run_id=run_id)
+
+    def leaf_intervals(self):
+        """Node runs without node runs nested in them, subgraph nodes excluded."""
+        nodes = {run_id for run_id, *_ in self.intervals}
+        containers = set()
+        for run_id in nodes:
+            parent = self.parents.get(run_id)
+            while parent is not None:
+                if parent in nodes:
+                    containers.add(parent)
+                    break
+                parent = self.parents.get(parent)
+        return [
+            interval for interval in self.intervals if interval[0] not in containers
+        ]
+
+
+def parallelism(intervals) -> dict:
+    if not intervals:
+        return {"max_concurrent_nodes": 0, "average_concurrent_nodes": 0.0}
+
+    events = sorted(
+        [(start, 1) for _, _, start, _ in intervals]
+        + [(end, -1) for _, _, _, end in intervals]
+    )
+    concurrent = peak = 0
+    for _, change in events:
+        concurrent += change
+        peak = max(peak, concurrent)
+
+    busy = sum(end - start for _, _, start, end in intervals)
+    span = max(end for *_, end in intervals) - min(start for *_, start, _ in intervals)
+    return {
+        "max_concurrent_nodes": peak,
+        "average_concurrent_nodes": round(busy / span, 2) if span else 0.0,
+    }
+
+
+class CheckpointTimer:
+    """Checkpointer proxy adding up the time spent in its calls."""
+
+    methods = {
+        f"{prefix}{method}"
+        for prefix in ("", "a")
+        for method in ("get_tuple", "list", "put", "put_writes")
+    }
+    timing = contextvars.ContextVar("timing", default=False)
+
+    def __init__(self, checkpointer):
+        self.checkpointer = checkpointer
+        self.seconds = 0.0
+        self.calls = defaultdict(int)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.checkpointer, name)
+        if name not in self.methods:
+            return attribute
+
+        if asyncio.iscoroutinefunction(attribute):
+
+            @functools.wraps(attribute)
+            async def timed(*args, **kwargs):
+                if self.timing.get():
+                    return await attribute(*args, **kwargs)
+                token = self.timing.set(True)
+                start = time.perf_counter()
+                try:
+                    return await attribute(*args, **kwargs)
+                finally:
+                    self.seconds += time.perf_counter() - start
+                    self.calls[name] += 1
+                    self.timing.reset(token)
+
+            return timed
+
+        @functools.wraps(attribute)
+        def timed(*args, **kwargs):
+            if self.timing.get():
+                return attribute(*args, **kwargs)
+            token = self.timing.set(True)
+            start = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self.seconds += time.perf_counter() - start
+                self.calls[name] += 1
+                self.timing.reset(token)
+
+        return timed
+
+
+def make_checkpointer(backend: str):
+    if backend == "memory":
+        return MemorySaver()
+    return SqliteCheckpointSaver(os.path.join(tempfile.mkdtemp(), "checkpoints.sqlite"))
+
+
+async def run_conversation(agent, graph, turns: list[str], callbacks) -> int:
+    config = {"configurable": {"thread_id": uuid.uuid4().hex}, "callbacks": callbacks}
+    steps = 0
+
+    for i, turn in enumerate(turns):
+        if i == 0:
+            agent_input = {
+                "messages": [
+                    SystemMessage(content=agent.system_prompt),
+                    HumanMessage(content=turn),
+                ]
+            }
+        elif not agent.interrupt_before:
+            agent_input = {"messages": [HumanMessage(content=turn)]}
+        else:
+            agent_input = None
+            await graph.aupdate_state(
+                config,
+                {"messages": [HumanMessage(content=turn)]}
+                | agent.update_graph_state(turn),
+                as_node=agent.update_as_node,
+            )
+
+        async for _ in graph.astream(agent_input, config, stream_mode="updates"):
+            steps += 1
+
+    return steps
+
+
+def run_scenario(
+    scenario: Scenario, backend: str, repeat: int, routing_profile: str = "routed"
+) -> dict:
+    checkpointer = CheckpointTimer(make_checkpointer(backend))
+
+    with contextlib.ExitStack() as stack:
+        for patch in scenario.patches() + [
+            use_config(CONFIG),
+            mock.patch.object(common.checkpoint, "_checkpointer", checkpointer),
+        ]:
+            stack.enter_context(patch)
+
+        agent = scenario.agent_class(routing_profile)
+
+        start = time.perf_counter()
+        graph = agent.build_graph()
+        build_seconds = time.perf_counter() - start
+
+        runs = []
+        for _ in range(repeat):
+            timer = NodeTimer()
+            checkpointer.seconds = 0.0
+            start = time.perf_counter()
+            steps = asyncio.run(
+                run_conversation(agent, graph, scenario.turns(), [timer])
+            )
+            runs.append(
+                (time.perf_counter() - start, timer, checkpointer.seconds, steps)
+            )
+
+        tracemalloc.start()
+        asyncio.run(run_conversation(agent, graph, scenario.turns(), []))
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    wall, timer, checkpoint_seconds, steps = min(runs, key=lambda run: run[0])
+
+    nodes = defaultdict(list)
+    for _, node, start, end in timer.intervals:
+        nodes[node].append(end - start)
+
+    def budget(node):
+        return agent.node_latency_budgets.get(node.rsplit("/", 1)[-1])
+
+    def tier(node):
+        return agent.get_model_tier(node.rsplit("/", 1)[-1])
+
+    return {
+        "agent": scenario.name,
+        "routing_profile": routing_profile,
+        "build_s": round(build_seconds, 4),
+        "wall_s": round(wall, 4),
+        "wall_s_runs": [round(run[0], 4) for run in runs],
+        "steps": steps,
+        "nodes": {
+            node: {
+                "calls": len(times),
+                "total_s": round(sum(times), 4),
+                "mean_s": round(sum(times) / len(times), 4),
+                "max_s": round(max(times), 4),
+                "tier": tier(node),
+                "budget_s": budget(node),
+                "over_budget": sum(
+                    budget(node) is not None and time > budget(node) for time in times
+                ),
+            }
+            for node, times in sorted(nodes.items())
+        },
+        "parallelism": parallelism(timer.leaf_intervals()),
+        "checkpoint": {
+            "backend": backend,
+            "seconds": round(checkpoint_seconds, 4),
+            "share_of_wall": round(checkpoint_seconds / wall, 3) if wall else 0.0,
+            "calls": dict(checkpointer.calls),
+        },
+        "peak_traced_memory_bytes": peak_bytes,
+    }
+
+
+def routing_report(rows: list[dict]) -> dict:
+    """End-to-end and per-node wall time of each agent under each routing profile."""
+    report = defaultdict(lambda: {"wall_s": {}, "nodes": defaultdict(dict)})
+
+    for row in rows:
+        agent = report[row["agent"]]
+        agent["wall_s"][row["routing_profile"]] = row["wall_s"]
+        for node, timing in row["nodes"].items():
+            agent["nodes"][node][row["routing_profile"]] = {
+                "tier": timing["tier"],
+                "mean_s": timing["mean_s"],
+            }
+
+    for agent in report.values():
+        if agent["wall_s"].get("routed") and agent["wall_s"].get("single"):
+            agent["speedup"] = round(
+                agent["wall_s"]["single"] / agent["wall_s"]["routed"], 2
+            )
+        # Only the nodes routed off the default tier by some profile
+        agent["nodes"] = {
+            node: profiles
+            for node, profiles in sorted(agent["nodes"].items())
+            if any(timing["tier"] != "default" for timing in profiles.values())
+        }
+
+    return dict(report)
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    previous = {
+        (row["agent"], row.get("routing_profile", "routed")): row
+        for row in baseline["results"]
+    }
+    regressions = []
+
+    for row in results["results"]:
+        before = previous.get((row["agent"], row["routing_profile"]))
+        if before and row["wall_s"] > before["wall_s"] * (1 + tolerance):
+            regressions.append(
+                f"{row['agent']} ({row['routing_profile']}): "
+                f"wall {before['wall_s']}s -> {row['wall_s']}s"
+            )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", nargs="*", help="scenario names to run")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--fast-llm-latency", type=float, default=0.02)
+    parser.add_argument("--tool-latency", type=float, default=0.1)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--checkpointer", choices=["sqlite", "memory"], default="sqlite"
+    )
+    parser.add_argument("--output", help="write the JSON report to this file")
+    parser.add_argument("--baseline", help="JSON report to compare wall times to")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument(
+        "--routing-profiles", nargs="+", choices=ROUTING_PROFILES, default=["routed"]
+    )
+    args = parser.parse_args()
+
+    scenarios = [
+        scenario(
+            args.llm_latency, args.tool_latency, args.fanout, args.fast_llm_latency
+        )
+        for scenario in SCENARIOS
+        if not args.agents or scenario.name in args.agents
+    ]
+
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.time(),
+        "settings": {
+            "llm_latency_s": args.llm_latency,
+            "fast_llm_latency_s": args.fast_llm_latency,
+            "tool_latency_s": args.tool_latency,
+            "fanout": args.fanout,
+            "repeat": args.repeat,
+            "checkpointer": args.checkpointer,
+            "routing_profiles": args.routing_profiles,
+        },
+        "results": [
+            run_scenario(scenario, args.checkpointer, args.repeat, routing_profile)
+            for scenario in scenarios
+            for routing_profile in args.routing_profiles
+        ],
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+    }
+
+    if len(args.routing_profiles) > 1:
+        results["routing"] = routing_report(results["results"])
+
+    report = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(report)
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""Import time of each page entry point, against a per-page budget.
+
+Every page runs in a fresh interpreter with `-X importtime`, after
+Streamlit itself is imported, as in a Streamlit worker. The import time of
+a page is the time spent importing modules while the page script runs.
+Run from the repository root:
+
+    python -m benchmarks.imports
+    python -m benchmarks.imports --json
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Milliseconds on a developer laptop, with headroom
+BUDGETS_MS = {
+    "AI_Agents.py": 150,
+    "pages/Data_Query_Assistant.py": 1500,
+    "pages/Financial_Assistant.py": 1500,
+    "pages/Graph_RAG.py": 1500,
+    "pages/Podcast_Script_Writer.py": 1500,
+    "pages/Python_And_React_Assistant.py": 1500,
+    "pages/Reddit_Search.py": 1500,
+    "pages/Research_Analyst.py": 1500,
+    "pages/Simple_RAG.py": 1500,
+}
+DEFAULT_BUDGET_MS = 1500
+
+# Modules whose import is reported as heavy when loaded by a page
+HEAVY_MODULES = [
+    "faiss",
+    "neo4j",
+    "langchain_experimental",
+    "google.generativeai",
+    "praw",
+    "e2b_code_interpreter",
+    "langchain_openai",
+    "langchain_community",
+    "pypdf",
+]
+
+MARKER = "benchmark: page start"
+
+SCRIPT = f"""
+import runpy, sys
+import streamlit
+sys.stderr.write("{MARKER}\\n")
+sys.stderr.flush()
+runpy.run_path(sys.argv[1], run_name="__main__")
+"""
+
+
+def parse_importtime(stderr: str):
+    """Top level imports with their cumulative microseconds, and all module names."""
+    lines = stderr.split(MARKER, 1)[-1].splitlines()
+    top_level = {}
+    modules = set()
+
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.add(name.strip())
+        if not name[1:].startswith(" "):
+            top_level[name.strip()] = int(cumulative)
+
+    return top_level, modules
+
+
+def measure(page: str) -> dict:
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT, page],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONWARNINGS": "ignore"},
+    )
+    wall = time.perf_counter() - start
+
+    if MARKER not in result.stderr:
+        raise RuntimeError(f"{page} failed:\n{result.stderr[-2000:]}")
+
+    top_level, modules = parse_importtime(result.stderr)
+    return {
+        "import_ms": round(sum(top_level.values()) / 1000, 1),
+        "wall_ms": round(1000 * wall, 1),
+        "slowest": [
+            {"module": module, "ms": round(us / 1000, 1)}
+            for module, us in sorted(
+                top_level.items(), key=lambda item: item[1], reverse=True
+            )[:5]
+        ],
+        "heavy_modules": [module for module in HEAVY_MODULES if module in modules],
+    }
+
+
+def run(pages: list[str], repeat: int) -> list[dict]:
+    report = []
+    for page in pages:
+        runs = [measure(page) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run["import_ms"])
+        budget = BUDGETS_MS.get(page, DEFAULT_BUDGET_MS)
+        report.append(
+            {
+                "page": page,
+                **best,
+                "budget_ms": budget,
+                "over_budget": best["import_ms"] > budget,
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", help="page scripts, all by default")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print the JSON report")
+    args = parser.parse_args()
+
+    pages = args.pages or ["AI_Agents.py"] + sorted(glob.glob("pages/*.py"))
+    report = run(pages, args.repeat)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{'page':<38} {'import ms':>9} {'budget':>6}  heavy modules")
+        for row in report:
+            print(
+                f"{row['page']:<38} {row['import_ms']:>9} {row['budget_ms']:>6}"
+                f"{' !' if row['over_budget'] else '  '} {', '.join(row['heavy_modules'])}"
+            )
+
+    if any(row["over_budget"] for row in report):
+        sys.exit(1)
@@ -0,0 +1,229 @@
+"""Wall time of indexing a synthetic PDF for Simple RAG.
+
+A PDF of --pages pages is generated, read and split like the Simple RAG
+tool does, then embedded with a fake embedding API that sleeps for a round
+trip per request and for every token it embeds, and fails a share of the
+requests. The report compares a single `FAISS.from_documents` call, which
+sends its requests one after the other, with the batched, concurrent
+embedding pipeline, and reports the time to read and embed the PDF when
+pages are parsed while earlier chunks embed, as JSON. Run from the
+repository root:
+
+    python -m benchmarks.ingestion --pages 500
+    python -m benchmarks.ingestion --pages 500 --max-in-flight 8
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+import zlib
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from common.compaction import TokenCounter
+from common.ingestion import (
+    EMBED_BATCH_TOKENS,
+    EMBED_MAX_IN_FLIGHT,
+    EmbeddingPipeline,
+    Prefetch,
+)
+
+WORDS = (
+    "index chunk vector model report revenue quarter growth margin risk "
+    "customer market product policy section table figure result method data"
+).split()
+
+
+def write_pdf(path: str, pages: int, lines: int = 45, seed: int = 0):
+    """A PDF of `pages` pages of `lines` lines of random words each."""
+    rng = random.Random(seed)
+    objects = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+
+    for page in range(pages):
+        text = " ".join(
+            f"({page}.{line} {' '.join(rng.choices(WORDS, k=12))}) '"
+            for line in range(lines)
+        )
+        stream = f"BT /F1 10 Tf 40 800 Td 12 TL {text} ET".encode()
+        objects.append(
+            b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        )
+
+    # Objects are numbered from 1: the font, the contents, the pages, the tree
+    tree = 2 + 2 * pages
+    for page in range(pages):
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 842] "
+            b"/Contents %d 0 R /Resources << /Font << /F1 1 0 R >> >> >>"
+            % (tree, page + 2)
+        )
+    kids = b" ".join(b"%d 0 R" % (pages + 2 + page) for page in range(pages))
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % tree)
+
+    pdf = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1,
+        len(objects),
+        xref,
+    )
+
+    with open(path, "wb") as f:
+        f.write(pdf)
+
+
+class FakeEmbeddingAPI(Embeddings):
+    """Embeddings sleeping like a remote API, in requests of `chunk_size` texts.
+
+    A request takes `latency` seconds plus `token_seconds` per token, and
+    fails with probability `failure_rate`. Vectors hash the text.
+    """
+
+    def __init__(
+        self,
+        latency: float,
+        token_seconds: float,
+        failure_rate: float = 0.0,
+        chunk_size: int = 1000,
+        dim: int = 256,
+    ):
+        self.latency = latency
+        self.token_seconds = token_seconds
+        self.failure_rate = failure_rate
+        self.chunk_size = chunk_size
+        self.dim = dim
+        self.counter = TokenCounter("text-embedding-ada-002")
+        self.random = random.Random(0)
+        self.requests = 0
+        self.failures = 0
+
+    def requests_of(self, texts: list[str]):
+        for start in range(0, len(texts), self.chunk_size):
+            request = texts[start : start + self.chunk_size]
+            tokens = sum(self.counter.text_tokens(text) for text in request)
+            self.requests += 1
+            yield request, self.latency + self.token_seconds * tokens
+
+    def respond(self, request: list[str]) -> list[list[float]]:
+        if self.random.random() < self.failure_rate:
+            self.failures += 1
+            raise ConnectionError("Injected embedding API failure")
+        return [
+            np.random.default_rng(zlib.crc32(text.encode())).random(self.dim).tolist()
+            for text in request
+        ]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for request, seconds in self.requests_of(texts):
+            time.sleep(seconds)
+            vectors += self.respond(request)
+        return vectors
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for request, seconds in self.requests_of(texts):
+            await asyncio.sleep(seconds)
+            vectors += self.respond(request)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.respond([text])[0]
+
+
+def chunks_of(path: str):
+    from tools.simple_rag import DocumentsRetrieverTool
+
+    return DocumentsRetrieverTool(pdf_file=path, openai_api_key="")._split_documents()
+
+
+def run(args) -> dict:
+    def api(failure_rate=0.0):
+        return FakeEmbeddingAPI(args.latency, args.token_seconds, failure_rate)
+
+    def pipeline(embeddings):
+        return EmbeddingPipeline(
+            embeddings,
+            batch_tokens=args.batch_tokens,
+            max_in_flight=args.max_in_flight,
+            retry_seconds=0.05,
+        )
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.pdf")
+        write_pdf(path, args.pages)
+
+        start = time.perf_counter()
+        documents = list(chunks_of(path))
+        read_seconds = time.perf_counter() - start
+
+        report = {
+            "pages": args.pages,
+            "chunks": len(documents),
+            "read_and_split_seconds": round(read_seconds, 2),
+        }
+
+        if not args.skip_sequential:
+            from langchain_community.vectorstores import FAISS
+
+            embeddings = api()
+            start = time.perf_counter()
+            FAISS.from_documents(documents, embeddings)
+            report["sequential"] = {
+                "seconds": round(time.perf_counter() - start, 2),
+                "requests": embeddings.requests,
+            }
+
+        embeddings = api(args.failure_rate)
+        batched = pipeline(embeddings)
+        start = time.perf_counter()
+        vector_store = asyncio.run(batched.build(documents))
+        report["pipeline"] = {
+            "seconds": round(time.perf_counter() - start, 2),
+            "requests": embeddings.requests,
+            "failed_requests": embeddings.failures,
+            "retried_batches": batched.progress.retries,
+            "vectors": vector_store.index.ntotal,
+            "batch_tokens": args.batch_tokens,
+            "max_in_flight": args.max_in_flight,
+        }
+
+        # Reading, splitting and embedding overlap, as on upload
+        start = time.perf_counter()
+        with Prefetch(chunks_of(path)) as chunks:
+            asyncio.run(pipeline(api(args.failure_rate)).build(chunks))
+        report["streamed_read_and_embed_seconds"] = round(
+            time.perf_counter() - start, 2
+        )
+
+    if "sequential" in report:
+        report["speedup"] = round(
+            report["sequential"]["seconds"] / report["pipeline"]["seconds"], 2
+        )
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-seconds", type=float, default=2e-5)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--batch-tokens", type=int, default=EMBED_BATCH_TOKENS)
+    parser.add_argument("--max-in-flight", type=int, default=EMBED_MAX_IN_FLIGHT)
+    parser.add_argument(
+        "--skip-sequential", action="store_true", help="only run the pipeline"
+    )
+    print(json.dumps(run(parser.parse_args()), indent=2))
@@ -0,0 +1,85 @@
+"""Wall time of extracting the pages of synthetic PDFs, sequentially and in parallel.
+
+For each --pages size a PDF is generated and its pages extracted with
+PyPDFLoader, as one process does, and with the process pool of
+`common.pdf` for each --workers count, checking both give the same pages
+with the same metadata. Starting the pool is reported apart, it happens
+once per app process. Prints a JSON report. Run from the repository root:
+
+    python -m benchmarks.pdf_extraction --pages 200 800 --workers 2 4
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.ingestion import write_pdf
+from common.pdf import PdfExtractor, cpu_count, extract_range
+
+
+def sequential(path: str) -> list:
+    from langchain_community.document_loaders import PyPDFLoader
+
+    return list(PyPDFLoader(path).lazy_load())
+
+
+def run(args) -> dict:
+    report = {"cpus": cpu_count()}
+    extractors = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "warmup.pdf")
+        write_pdf(path, 1)
+        for workers in args.workers:
+            extractor = PdfExtractor(workers=workers, min_pages_per_worker=1)
+            start = time.perf_counter()
+            # Spawns the workers, which import pypdf
+            list(
+                extractor.get_executor().map(
+                    extract_range, [path] * workers, [0] * workers, [1] * workers
+                )
+            )
+            report[f"pool_start_seconds_{workers}_workers"] = round(
+                time.perf_counter() - start, 2
+            )
+            extractors[workers] = extractor
+
+        report["sizes"] = []
+        for pages in args.pages:
+            path = os.path.join(directory, f"{pages}.pdf")
+            write_pdf(path, pages, lines=args.lines)
+
+            start = time.perf_counter()
+            expected = sequential(path)
+            seconds = time.perf_counter() - start
+            size = {
+                "pages": pages,
+                "megabytes": round(os.path.getsize(path) / 2**20, 1),
+                "sequential_seconds": round(seconds, 2),
+            }
+
+            for workers, extractor in extractors.items():
+                start = time.perf_counter()
+                extracted = list(extractor.pages(path))
+                parallel_seconds = time.perf_counter() - start
+                assert [(page.page_content, page.metadata) for page in extracted] == [
+                    (page.page_content, page.metadata) for page in expected
+                ]
+                size[f"{workers}_workers"] = {
+                    "seconds": round(parallel_seconds, 2),
+                    "speedup": round(seconds / parallel_seconds, 2),
+                }
+            report["sizes"].append(size)
+
+    for extractor in extractors.values():
+        extractor.get_executor().shutdown()
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[200, 800])
+    parser.add_argument("--lines", type=int, default=45)
+    parser.add_argument("--workers", type=int, nargs="+", default=[max(2, cpu_count())])
+    print(json.dumps(run(parser.parse_args()), indent=2))
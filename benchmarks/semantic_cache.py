@@ -0,0 +1,206 @@
+"""Hit rate of the semantic cache against its similarity threshold.
+
+Each seed question is cached first, then its paraphrases should hit and the
+distractors, questions on the same data with a different answer, should
+miss. The last seeds have near misses as distractors, questions differing
+only in an entity or a number, which embed well above the threshold and
+must be refused by the key-term check. Run from the repository root:
+
+    python -m benchmarks.semantic_cache
+"""
+
+import argparse
+import json
+import time
+
+from common.semantic_cache import SemanticCache
+
+# seed question, paraphrases, distractors
+QUESTIONS = [
+    (
+        "What are the top selling artists?",
+        [
+            "Which artists sell the most?",
+            "top selling artists",
+            "Show me the top-selling artists",
+            "Who are the best selling artists?",
+        ],
+        ["What are the least selling artists?", "How many artists are there?"],
+    ),
+    (
+        "How many customers are from Brazil?",
+        [
+            "Number of customers from Brazil",
+            "how many customers come from brazil",
+            "Count the customers in Brazil",
+        ],
+        ["How many customers are from Canada?", "List the customers from Brazil"],
+    ),
+    (
+        "What is the total revenue per country?",
+        [
+            "Total revenue for each country",
+            "revenue per country in total",
+            "What's the total revenue by country?",
+        ],
+        ["What is the total revenue per city?", "What is the average invoice total?"],
+    ),
+    (
+        "Which genre has the most tracks?",
+        [
+            "What genre has the most tracks?",
+            "genre with the most tracks",
+            "Which genre contains the largest number of tracks?",
+        ],
+        ["Which genre has the fewest tracks?", "Which album has the most tracks?"],
+    ),
+    (
+        "What is the current stock price of Apple?",
+        [
+            "Apple current stock price",
+            "What's Apple's current stock price?",
+            "Give me the current price of Apple stock",
+        ],
+        [
+            "What is the current stock price of Microsoft?",
+            "What was the stock price of Apple last year?",
+        ],
+    ),
+    (
+        "Show the latest news for Tesla",
+        [
+            "latest Tesla news",
+            "What is the latest news on Tesla?",
+            "Tesla latest news please",
+        ],
+        ["Show the latest news for Nvidia", "Show the revenue of Tesla"],
+    ),
+    (
+        "Compare the net income of Google and Amazon",
+        [
+            "Compare net income for Google and Amazon",
+            "net income comparison of Amazon and Google",
+            "How does the net income of Google compare to Amazon?",
+        ],
+        [
+            "Compare the revenue of Google and Amazon",
+            "What is the net income of Netflix?",
+        ],
+    ),
+    (
+        "What is the main conclusion of the document?",
+        [
+            "What's the document's main conclusion?",
+            "main conclusion of the document",
+            "What does the document conclude?",
+        ],
+        ["What is the title of the document?", "Who wrote the document?"],
+    ),
+    (
+        "Summarize the methodology section",
+        [
+            "Give me a summary of the methodology section",
+            "summary of methodology section",
+            "Can you summarize the section on methodology?",
+        ],
+        ["Summarize the results section", "Summarize the introduction"],
+    ),
+    (
+        "What are the limitations mentioned by the authors?",
+        [
+            "Which limitations do the authors mention?",
+            "limitations mentioned by authors",
+            "What limitations are mentioned by the authors?",
+        ],
+        ["What future work do the authors propose?", "Who are the authors?"],
+    ),
+    (
+        "What was the revenue of NVDA last quarter?",
+        [
+            "NVDA revenue last quarter",
+            "What was NVDA's revenue last quarter?",
+        ],
+        [
+            "What was the revenue of AMD last quarter?",
+            "What was the revenue of NVDA last year?",
+        ],
+    ),
+    (
+        "Who are the top 5 customers by total spent?",
+        [
+            "top 5 customers by total spent",
+            "Which are the top 5 customers by total spent?",
+        ],
+        [
+            "Who are the top 10 customers by total spent?",
+            "Who are the top 3 customers by total spent?",
+        ],
+    ),
+    (
+        "Summarize chapter 3 of the document",
+        [
+            "Give me a summary of chapter 3 of the document",
+            "summary of chapter 3 of the document",
+        ],
+        ["Summarize chapter 4 of the document", "Summarize chapter 13 of the document"],
+    ),
+]
+
+THRESHOLDS = [0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+
+
+def run(thresholds=THRESHOLDS) -> list[dict]:
+    report = []
+
+    for threshold in thresholds:
+        cache = SemanticCache(threshold=threshold)
+        for seed, _, _ in QUESTIONS:
+            cache.update("benchmark", None, seed, seed)
+
+        hits = false_hits = wrong_hits = lookups = 0
+        paraphrases = sum(len(paraphrases) for _, paraphrases, _ in QUESTIONS)
+        distractors = sum(len(distractors) for _, _, distractors in QUESTIONS)
+
+        start = time.perf_counter()
+        for seed, paraphrases_of_seed, distractors_of_seed in QUESTIONS:
+            for question in paraphrases_of_seed:
+                answer = cache.lookup("benchmark", None, question)
+                hits += answer == seed
+                wrong_hits += answer is not None and answer != seed
+            for question in distractors_of_seed:
+                false_hits += cache.lookup("benchmark", None, question) is not None
+            lookups += len(paraphrases_of_seed) + len(distractors_of_seed)
+        elapsed = time.perf_counter() - start
+
+        report.append(
+            {
+                "threshold": threshold,
+                "hit_rate": round(hits / paraphrases, 3),
+                "false_hit_rate": round(false_hits / distractors, 3),
+                "wrong_answer_hits": wrong_hits,
+                "lookup_us": round(1e6 * elapsed / lookups, 1),
+            }
+        )
+
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--json", action="store_true", help="print the JSON report")
+    args = parser.parse_args()
+
+    report = run()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(
+            f"{'threshold':>9} {'hit rate':>8} {'false hits':>10} "
+            f"{'wrong hits':>10} {'lookup us':>9}"
+        )
+        for row in report:
+            print(
+                f"{row['threshold']:>9} {row['hit_rate']:>8} "
+                f"{row['false_hit_rate']:>10} {row['wrong_answer_hits']:>10} {row['lookup_us']:>9}"
+            )
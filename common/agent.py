@@ -1,12 +1,54 @@
-from typing import Sequence
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Sequence
 
-import streamlit as st
+from langchain_core.messages import AIMessage
 from langchain_core.tools import BaseTool
-from langchain_openai import ChatOpenAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.constants import START, END
 from langgraph.graph import StateGraph, MessagesState
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import tools_condition
+
+from common.checkpoint import get_checkpointer
+from common.config import get_config
+from common.compaction import (
+    KEEP_RECENT_TURNS,
+    TOKEN_BUDGET,
+    TOOL_RESULT_MAX_TOKENS,
+    MessageCompactor,
+)
+from common.http import OPENAI_BASE_URL, get_client, get_async_client
+from common.llm_cache import get_llm_cache
+from common.semantic_cache import (
+    SEMANTIC_CACHE,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    first_question,
+    semantic_cache,
+)
+from common.tool_executor import ToolExecutor, TOOL_MAX_CONCURRENCY
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+
+GRAPH_CACHE_SIZE = 32
+
+FAST_MODEL = os.environ.get("AGENT_FAST_MODEL", "gpt-4o-mini")
+# "routed" runs nodes on the tier of their route, "single" all on the default model
+ROUTING_PROFILE = os.environ.get("AGENT_ROUTING_PROFILE", "routed")
+ROUTING_PROFILES = ("routed", "single")
+
+_graph_cache = OrderedDict()
+_graph_cache_lock = threading.Lock()
+
+
+def fingerprint(value) -> str:
+    return hashlib.sha256(str(value).encode()).hexdigest()[:16]
+
+
+def clear_graph_cache():
+    with _graph_cache_lock:
+        _graph_cache.clear()
 
 
 class BaseAgent:
@@ -17,8 +59,36 @@ class BaseAgent:
     nodes_to_display = []
     tools: Sequence[BaseTool] = []
 
+    # Limits on concurrent tool calls and seconds per call, per tool by name
+    max_tool_concurrency: int = TOOL_MAX_CONCURRENCY
+    tool_concurrency: dict[str, int] = {}
+    tool_timeouts: dict[str, float] = {}
+
+    # Config keys the graph is built from, part of the compiled graph cache key
+    config_keys: list[str] = ["OPENAI_API_KEY"]
+
+    # Cache responses of temperature 0 calls, get_llm(cache=...) overrides per node
+    llm_cache: bool = True
+
+    # Prompt token budget, older turns and tool results are compacted to fit
+    token_budget: int = TOKEN_BUDGET
+    keep_recent_turns: int = KEEP_RECENT_TURNS
+    tool_result_max_tokens: int = TOOL_RESULT_MAX_TOKENS
+
+    # Answer questions similar to earlier single-turn ones from the semantic cache
+    semantic_cache: bool = False
+    semantic_cache_ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS
+
     model = "gpt-4o"
-    base_url = "https://api.openai.com/v1"
+    base_url = OPENAI_BASE_URL
+
+    # Model tier of nodes by name, other nodes run on `model`, the default tier
+    model_tiers: dict[str, str] = {"fast": FAST_MODEL}
+    model_routes: dict[str, str] = {}
+    routing_profile: str = ROUTING_PROFILE
+
+    # Seconds a node run is expected to take, slower runs are counted by tracing
+    node_latency_budgets: dict[str, float] = {}
 
     @classmethod
     def get_tools(cls) -> Sequence[BaseTool]:
@@ -29,37 +99,170 @@ class BaseAgent:
         return {}
 
     @classmethod
-    def get_graph(cls):
-        tools = cls.get_tools()
+    def get_model_tier(cls, node: str = None) -> str:
+        if cls.routing_profile not in ROUTING_PROFILES:
+            raise ValueError(f"Unknown routing profile {cls.routing_profile}")
+        if cls.routing_profile == "single":
+            return "default"
+        return cls.model_routes.get(node, "default")
 
-        llm = ChatOpenAI(
-            model=cls.model,
-            api_key=st.session_state["OPENAI_API_KEY"],
+    @classmethod
+    def get_model(cls, node: str = None) -> str:
+        tier = cls.get_model_tier(node)
+        return cls.model if tier == "default" else cls.model_tiers[tier]
+
+    @classmethod
+    def get_llm(cls, cache: bool = None, node: str = None, **kwargs) -> "ChatOpenAI":
+        from langchain_openai import ChatOpenAI
+
+        if cache is None:
+            cache = cls.llm_cache and kwargs.get("temperature") == 0
+
+        return ChatOpenAI(
+            model=cls.get_model(node),
+            api_key=get_config()["OPENAI_API_KEY"],
             base_url=cls.base_url,
-            temperature=0,
+            http_client=get_client(cls.base_url),
+            http_async_client=get_async_client(cls.base_url),
+            cache=(cache and get_llm_cache(cls.name, cls.base_url)) or False,
+            **kwargs,
         )
 
+    @classmethod
+    def get_tool_executor(cls, tools: Sequence[BaseTool]) -> ToolExecutor:
+        return ToolExecutor(
+            tools=tools,
+            max_concurrency=cls.max_tool_concurrency,
+            tool_concurrency=cls.tool_concurrency,
+            tool_timeouts=cls.tool_timeouts,
+        )
+
+    @classmethod
+    def get_compactor(cls) -> MessageCompactor:
+        return MessageCompactor(
+            name=cls.name,
+            model=cls.model,
+            token_budget=cls.token_budget,
+            keep_recent_turns=cls.keep_recent_turns,
+            tool_result_max_tokens=cls.tool_result_max_tokens,
+        )
+
+    @classmethod
+    def add_semantic_cache(
+        cls, graph, after, before, source=None, get_question=first_question
+    ):
+        if not (cls.semantic_cache and SEMANTIC_CACHE):
+            graph.add_edge(after, before)
+            return
+
+        async def cached_answer(state):
+            question = get_question(state)
+            if question and (
+                answer := semantic_cache.lookup(cls.name, source, question)
+            ):
+                return {
+                    "messages": [
+                        AIMessage(
+                            content=answer, response_metadata={"cache": "semantic"}
+                        )
+                    ]
+                }
+            return {}
+
+        def route_cached_answer(state):
+            if state["messages"][-1].response_metadata.get("cache") == "semantic":
+                return END
+            return before
+
+        graph.add_node("cached_answer", cached_answer)
+        graph.add_edge(after, "cached_answer")
+        graph.add_conditional_edges("cached_answer", route_cached_answer, [before, END])
+
+    @classmethod
+    def remember_answer(cls, state, answer, source=None, get_question=first_question):
+        if not (cls.semantic_cache and SEMANTIC_CACHE):
+            return
+
+        if answer and (question := get_question(state)):
+            semantic_cache.update(
+                cls.name,
+                source,
+                question,
+                answer,
+                ttl_seconds=cls.semantic_cache_ttl_seconds,
+            )
+
+    @classmethod
+    def get_uploaded_file(cls):
+        return get_config().get_uploaded_file(cls.name)
+
+    @classmethod
+    def get_uploaded_file_hash(cls):
+        """Content hash of the uploaded file, to key indexes built from it."""
+        return get_config().get_uploaded_file_hash(cls.name)
+
+    @classmethod
+    def get_graph_cache_key(cls):
+        config = get_config()
+        return (
+            cls,
+            cls.model,
+            cls.base_url,
+            cls.routing_profile,
+            tuple((key, fingerprint(config.get(key, ""))) for key in cls.config_keys),
+            config.get_uploaded_file(cls.name),
+        )
+
+    @classmethod
+    def get_graph(cls):
+        key = cls.get_graph_cache_key()
+
+        with _graph_cache_lock:
+            if key in _graph_cache:
+                _graph_cache.move_to_end(key)
+                return _graph_cache[key]
+
+        graph = cls.build_graph()
+
+        with _graph_cache_lock:
+            graph = _graph_cache.setdefault(key, graph)
+            _graph_cache.move_to_end(key)
+            while len(_graph_cache) > GRAPH_CACHE_SIZE:
+                _graph_cache.popitem(last=False)
+
+        return graph
+
+    @classmethod
+    def build_graph(cls):
+        tools = cls.get_tools()
+
+        llm = cls.get_llm(temperature=0, node="agent")
+
         if tools:
             llm = llm.bind_tools(tools=tools)
 
-        def call_llm(state):
+        async def call_llm(state):
             messages = state["messages"]
-            response = llm.invoke(messages)
+            response = await llm.ainvoke(messages)
+            if not response.tool_calls:
+                cls.remember_answer(state, response.content)
             return {"messages": [response]}
 
         graph = StateGraph(MessagesState)
 
+        graph.add_node("compact", cls.get_compactor())
         graph.add_node("agent", call_llm)
-        graph.add_node("tools", ToolNode(tools=tools))
+        graph.add_node("tools", cls.get_tool_executor(tools))
 
-        graph.add_edge(START, "agent")
+        cls.add_semantic_cache(graph, after=START, before="compact")
+        graph.add_edge("compact", "agent")
         graph.add_conditional_edges(
             source="agent",
             path=tools_condition,
             path_map={"tools": "tools", END: END},
         )
-        graph.add_edge("tools", "agent")
+        graph.add_edge("tools", "compact")
 
         return graph.compile(
-            interrupt_before=cls.interrupt_before, checkpointer=MemorySaver()
+            interrupt_before=cls.interrupt_before, checkpointer=get_checkpointer()
         )
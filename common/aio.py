@@ -0,0 +1,78 @@
+import asyncio
+import concurrent.futures
+import queue
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+_DONE = object()
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Event loop shared by all sessions, running on a daemon thread."""
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="agent-event-loop", daemon=True
+            ).start()
+
+    return _loop
+
+
+def run(coro, on_idle=None, idle_seconds: float = 0.5):
+    """Run a coroutine on the shared loop and wait for its result.
+
+    `on_idle` is called every `idle_seconds` while waiting, the coroutine is
+    cancelled if it raises.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        while True:
+            try:
+                return future.result(timeout=idle_seconds if on_idle else None)
+            except concurrent.futures.TimeoutError:
+                on_idle()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+def iterate(async_iterable, token=None, on_idle=None, idle_seconds: float = 0.5):
+    """Consume an async iterable on the shared loop from synchronous code.
+
+    Cancelling `token` cancels the consuming task. `on_idle` is called every
+    `idle_seconds` without an item, e.g. to let the caller stop waiting.
+    """
+    items = queue.Queue()
+
+    async def consume():
+        try:
+            async for item in async_iterable:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_DONE, e))
+            raise
+        items.put((_DONE, None))
+
+    future = asyncio.run_coroutine_threadsafe(consume(), get_loop())
+    if token is not None:
+        token.on_cancel(future.cancel)
+
+    try:
+        while True:
+            try:
+                item, error = items.get(timeout=idle_seconds if on_idle else None)
+            except queue.Empty:
+                on_idle()
+                continue
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from typing import Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, AnyMessage, ToolMessage
+
+
+class RunCancelled(asyncio.CancelledError):
+    """The graph run was cancelled through its `CancelToken`.
+
+    A `CancelledError`, so that tools and nodes handling `Exception` let it
+    through.
+    """
+
+
+class CancelMetrics:
+    def __init__(self):
+        self.cancelled = defaultdict(int)
+        self.resumed = 0
+        self.lock = threading.Lock()
+
+    def record(self, reason: str):
+        with self.lock:
+            self.cancelled[reason] += 1
+
+    def record_resume(self):
+        with self.lock:
+            self.resumed += 1
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "cancelled_runs": dict(self.cancelled),
+                "resumed_runs": self.resumed,
+            }
+
+
+cancel_metrics = CancelMetrics()
+
+
+class CancelToken:
+    """Cooperative cancellation of a graph run.
+
+    Cancelling the token runs its `on_cancel` callbacks, which cancel the task
+    streaming the graph, and with it the running nodes, Send branches and the
+    LLM and tool calls they await. Sync nodes running in threads can't be
+    interrupted, the token's callback handler stops them at their next node,
+    LLM or tool call instead. Completed nodes stay checkpointed, so streaming
+    the thread again with no input resumes the run.
+    """
+
+    def __init__(self):
+        self.reason: str = None
+        self.cancelled_at: float = None
+        self.callbacks: list[Callable] = []
+        self.lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.reason = reason
+            self.cancelled_at = time.time()
+            callbacks, self.callbacks = self.callbacks, []
+
+        cancel_metrics.record(reason)
+        for callback in callbacks:
+            callback()
+        return True
+
+    def on_cancel(self, callback: Callable):
+        with self.lock:
+            if not self.cancelled:
+                self.callbacks.append(callback)
+                return
+        callback()
+
+    def cancel_task(self, task: asyncio.Task):
+        """Cancel `task` on its own loop when the token is cancelled."""
+        self.on_cancel(lambda: task.get_loop().call_soon_threadsafe(task.cancel))
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RunCancelled(self.reason)
+
+    def config(self, config: dict) -> dict:
+        return {
+            **config,
+            "callbacks": [
+                *(config.get("callbacks") or []),
+                CancellationCallbackHandler(self),
+            ],
+        }
+
+
+class CancellationCallbackHandler(BaseCallbackHandler):
+    """Stops a cancelled run before it starts another node, LLM or tool call."""
+
+    raise_error = True
+    run_inline = True
+
+    def __init__(self, token: CancelToken):
+        self.token = token
+
+    def on_chain_start(self, serialized, inputs, **kwargs):
+        self.token.raise_if_cancelled()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.token.raise_if_cancelled()
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.token.raise_if_cancelled()
+
+    def on_tool_start(self, serialized, input_str, **kwargs):
+        self.token.raise_if_cancelled()
+
+    def on_retriever_start(self, serialized, query, **kwargs):
+        self.token.raise_if_cancelled()
+
+
+def cancelled_tool_messages(messages: list[AnyMessage]) -> list[ToolMessage]:
+    """Answers to the tool calls a cancelled run left unanswered.
+
+    Chat models reject a conversation continuing after tool calls without
+    their results, these close them before the next human message.
+    """
+    answered = {
+        message.tool_call_id for message in messages if isinstance(message, ToolMessage)
+    }
+    for message in reversed(messages):
+        if isinstance(message, AIMessage):
+            return [
+                ToolMessage(
+                    content="Cancelled, the user moved on.",
+                    name=tool_call["name"],
+                    tool_call_id=tool_call["id"],
+                    status="error",
+                )
+                for tool_call in message.tool_calls
+                if tool_call["id"] not in answered
+            ]
+    return []
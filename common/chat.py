@@ -1,16 +1,37 @@
 import streamlit as st
+from langchain_core.messages import AIMessage
 
 
-def add_chat_message(agent_name: str, role: str, content: str):
-    st.session_state.page_messages[agent_name].append(
-        {"role": role, "content": content}
-    )
+def add_chat_message(messages: list, role: str, content: str):
+    messages.append({"role": role, "content": content})
     with st.chat_message(role):
         st.markdown(f"<p class='fontStyle'>{content}</p>", unsafe_allow_html=True)
 
 
-def display_message(agent_name: str, v):
-    if "messages" in v:
+def stream_message_chunk(placeholders: dict, node: str, chunk):
+    if not isinstance(chunk, AIMessage) or not isinstance(chunk.content, str):
+        return
+    if not chunk.content:
+        return
+
+    placeholder, content = placeholders.get(node) or (st.empty(), "")
+    content += chunk.content
+    placeholders[node] = (placeholder, content)
+
+    with placeholder.container():
+        with st.chat_message("ai"):
+            st.markdown(f"<p class='fontStyle'>{content}</p>", unsafe_allow_html=True)
+
+
+def display_message(messages: list, v, placeholder=None):
+    if placeholder is not None:
+        placeholder.empty()
+
+    if v and v.get("messages"):
         m = v["messages"][-1]
         if (m.type == "ai" and not m.tool_calls) or m.type == "human":
-            add_chat_message(agent_name=agent_name, role=m.type, content=m.content)
+            if placeholder is not None:
+                with placeholder.container():
+                    add_chat_message(messages=messages, role=m.type, content=m.content)
+            else:
+                add_chat_message(messages=messages, role=m.type, content=m.content)
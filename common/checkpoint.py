@@ -0,0 +1,416 @@
+import asyncio
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from common.tracing import instrument_checkpointer
+
+CHECKPOINTER = os.environ.get("AGENT_CHECKPOINTER", "sqlite")
+CHECKPOINT_DB = os.environ.get("AGENT_CHECKPOINT_DB", ".cache/checkpoints.sqlite")
+CHECKPOINT_KEEP_LAST = int(os.environ.get("AGENT_CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_TTL_SECONDS = int(os.environ.get("AGENT_CHECKPOINT_TTL_SECONDS", "86400"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS checkpoints_created_at
+    ON checkpoints (thread_id, created_at);
+"""
+
+
+def _config(thread_id, checkpoint_ns, checkpoint_id):
+    return {
+        "configurable": {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint_id,
+        }
+    }
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpointer storing graph state in a local SQLite database.
+
+    Pending writes of a super-step are buffered and committed in the same
+    transaction as the checkpoint that closes the step. Old checkpoints are
+    pruned to the last `keep_last` per thread namespace, and threads idle for
+    longer than `ttl_seconds` are deleted.
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_DB,
+        *,
+        keep_last: Optional[int] = CHECKPOINT_KEEP_LAST,
+        ttl_seconds: Optional[int] = CHECKPOINT_TTL_SECONDS,
+        ttl_sweep_interval: int = 300,
+        serde=None,
+    ):
+        super().__init__(serde=serde)
+        self.path = path
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self.ttl_sweep_interval = ttl_sweep_interval
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        self.pending_writes: list[tuple] = []
+        self.last_ttl_sweep = 0.0
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.conn.close()
+
+    def flush(self):
+        with self.lock:
+            if self.pending_writes:
+                with self.conn:
+                    self._insert_writes()
+
+    def _insert_writes(self):
+        for replace, row in self.pending_writes:
+            self.conn.execute(
+                f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO writes "
+                "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+        self.pending_writes.clear()
+
+    def _load_writes(self, thread_id, checkpoint_ns, checkpoint_id):
+        rows = self.conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return [
+            (task_id, channel, self.serde.loads_typed((type_, value)))
+            for task_id, channel, type_, value in rows
+        ]
+
+    def _to_tuple(self, thread_id, checkpoint_ns, row) -> CheckpointTuple:
+        (
+            checkpoint_id,
+            parent_checkpoint_id,
+            type_,
+            checkpoint,
+            metadata_type,
+            metadata,
+        ) = row
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint=self.serde.loads_typed((type_, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                _config(thread_id, checkpoint_ns, parent_checkpoint_id)
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=self._load_writes(thread_id, checkpoint_ns, checkpoint_id),
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+
+        with self.lock:
+            self.flush()
+
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self.conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self.conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                    "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+
+            if row:
+                return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        clauses, params = [], []
+
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if (
+                checkpoint_ns := config["configurable"].get("checkpoint_ns")
+            ) is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_checkpoint_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_checkpoint_id)
+
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        checkpoint_tuples = []
+        with self.lock:
+            self.flush()
+            for thread_id, checkpoint_ns, *row in self.conn.execute(query, params):
+                if limit is not None and len(checkpoint_tuples) >= limit:
+                    break
+
+                checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, row)
+                if filter and not all(
+                    checkpoint_tuple.metadata.get(key) == value
+                    for key, value in filter.items()
+                ):
+                    continue
+
+                checkpoint_tuples.append(checkpoint_tuple)
+
+        yield from checkpoint_tuples
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(metadata)
+
+        with self.lock:
+            with self.conn:
+                self._insert_writes()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints "
+                    "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        serialized_checkpoint,
+                        metadata_type,
+                        serialized_metadata,
+                        time.time(),
+                    ),
+                )
+                self._prune(thread_id, checkpoint_ns)
+
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        replace = all(channel in WRITES_IDX_MAP for channel, _ in writes)
+
+        rows = [
+            (
+                replace,
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    *self.serde.dumps_typed(value),
+                ),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+
+        with self.lock:
+            self.pending_writes.extend(rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.lock:
+            self.pending_writes = [
+                row for row in self.pending_writes if row[1][0] != thread_id
+            ]
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)
+                )
+                self.conn.execute(
+                    "DELETE FROM writes WHERE thread_id = ?", (thread_id,)
+                )
+
+    def _prune(self, thread_id, checkpoint_ns):
+        if self.keep_last:
+            self.conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                "ORDER BY checkpoint_id DESC LIMIT ?)",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns, self.keep_last),
+            )
+            self.conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id NOT IN "
+                "(SELECT checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?)",
+                (thread_id, checkpoint_ns, thread_id, checkpoint_ns),
+            )
+
+        now = time.time()
+        if self.ttl_seconds and now - self.last_ttl_sweep > self.ttl_sweep_interval:
+            self.last_ttl_sweep = now
+            expired = [
+                row[0]
+                for row in self.conn.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?",
+                    (now - self.ttl_seconds,),
+                )
+            ]
+            for expired_thread_id in expired:
+                self.conn.execute(
+                    "DELETE FROM checkpoints WHERE thread_id = ?", (expired_thread_id,)
+                )
+                self.conn.execute(
+                    "DELETE FROM writes WHERE thread_id = ?", (expired_thread_id,)
+                )
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for checkpoint_tuple in await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        ):
+            yield checkpoint_tuple
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return await asyncio.to_thread(
+            self.put_writes, config, writes, task_id, task_path
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        return await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+CHECKPOINTERS = {
+    "memory": MemorySaver,
+    "sqlite": SqliteCheckpointSaver,
+}
+
+_checkpointer = None
+_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> BaseCheckpointSaver:
+    global _checkpointer
+
+    with _checkpointer_lock:
+        if _checkpointer is None:
+            _checkpointer = instrument_checkpointer(CHECKPOINTERS[CHECKPOINTER]())
+        return _checkpointer
+
+
+def get_thread_size(checkpointer, thread_id: str) -> int:
+    """Approximate number of bytes a checkpointer holds for a thread."""
+    if isinstance(checkpointer, SqliteCheckpointSaver):
+        with checkpointer.lock:
+            checkpoints, writes = checkpointer.conn.execute(
+                "SELECT "
+                "(SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints WHERE thread_id = ?), "
+                "(SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes WHERE thread_id = ?)",
+                (thread_id, thread_id),
+            ).fetchone()
+        return checkpoints + writes
+
+    if isinstance(checkpointer, MemorySaver):
+        size = 0
+        for checkpoints in checkpointer.storage.get(thread_id, {}).values():
+            for checkpoint, metadata, *_ in checkpoints.values():
+                size += len(checkpoint[1]) + len(metadata[1])
+        for key, blob in list(getattr(checkpointer, "blobs", {}).items()):
+            if key[0] == thread_id:
+                size += len(blob[1])
+        return size
+
+    return 0
@@ -0,0 +1,211 @@
+import asyncio
+import concurrent.futures
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+COALESCE = os.environ.get("AGENT_COALESCE", "1") == "1"
+# Seconds a finished call keeps serving identical calls, 0 to share in-flight calls only
+COALESCE_WINDOW_SECONDS = float(os.environ.get("AGENT_COALESCE_WINDOW_SECONDS", "0"))
+
+
+@dataclass
+class Flight:
+    future: concurrent.futures.Future = field(default_factory=concurrent.futures.Future)
+    finished_at: float = None
+    task: asyncio.Task = None
+    waiters: int = 0
+
+    def __post_init__(self):
+        # Running futures cannot be cancelled by one of their waiters
+        self.future.set_running_or_notify_cancel()
+
+
+class SingleFlight:
+    """Identical concurrent calls share one in-flight call and its result.
+
+    Calls share a key when they are identical. The first caller runs the
+    call, later callers wait for its result, from any thread or event loop.
+    Results stay shared for `window_seconds` after the call finished, errors
+    are not. Callers receive the same result object and must not mutate it.
+    An async call is cancelled once all of its callers were cancelled.
+    """
+
+    def __init__(
+        self, window_seconds: float = COALESCE_WINDOW_SECONDS, enabled: bool = COALESCE
+    ):
+        self.window_seconds = window_seconds
+        self.enabled = enabled
+        self.flights: dict[str, Flight] = {}
+        self.calls = defaultdict(int)
+        self.executed = defaultdict(int)
+        self.coalesced = defaultdict(int)
+        self.reused = defaultdict(int)
+        self.abandoned = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def join(self, name: str, key: str) -> tuple[Flight, bool]:
+        """Flight of `key`, and whether the caller has to run it."""
+        now = time.monotonic()
+        with self.lock:
+            self.calls[name] += 1
+            for expired in [
+                stale
+                for stale, flight in self.flights.items()
+                if flight.finished_at is not None
+                and now - flight.finished_at > self.window_seconds
+            ]:
+                del self.flights[expired]
+
+            if flight := self.flights.get(key):
+                if flight.finished_at is None:
+                    self.coalesced[name] += 1
+                else:
+                    self.reused[name] += 1
+                flight.waiters += 1
+                return flight, False
+
+            self.executed[name] += 1
+            flight = self.flights[key] = Flight(waiters=1)
+            return flight, True
+
+    def leave(self, name: str, key: str, flight: Flight):
+        with self.lock:
+            flight.waiters -= 1
+            if flight.waiters or flight.task is None or flight.task.done():
+                return
+            # Nobody waits for the call anymore, new callers start over
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+            self.abandoned[name] += 1
+        flight.task.get_loop().call_soon_threadsafe(flight.task.cancel)
+
+    def land(self, key: str, flight: Flight, result: Any = None, error=None):
+        with self.lock:
+            if error is not None or self.window_seconds <= 0:
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+            else:
+                flight.finished_at = time.monotonic()
+
+        if error is not None:
+            flight.future.set_exception(error)
+        else:
+            flight.future.set_result(result)
+
+    def call(self, name: str, key: str, func: Callable, *args, **kwargs):
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        flight, leader = self.join(name, key)
+        if leader:
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as e:
+                self.land(key, flight, error=e)
+                raise
+            self.land(key, flight, result)
+        try:
+            return flight.future.result()
+        finally:
+            self.leave(name, key, flight)
+
+    async def acall(self, name: str, key: str, func: Callable, *args, **kwargs):
+        if not self.enabled:
+            return await func(*args, **kwargs)
+
+        flight, leader = self.join(name, key)
+        if leader:
+            # A task, so that the leader being cancelled does not fail the others
+            flight.task = asyncio.ensure_future(func(*args, **kwargs))
+
+            def settle(task: asyncio.Task):
+                if task.cancelled():
+                    self.land(key, flight, error=asyncio.CancelledError())
+                elif task.exception() is not None:
+                    self.land(key, flight, error=task.exception())
+                else:
+                    self.land(key, flight, task.result())
+
+            flight.task.add_done_callback(settle)
+        try:
+            return await asyncio.wrap_future(flight.future)
+        finally:
+            self.leave(name, key, flight)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                name: {
+                    "calls": self.calls[name],
+                    "executed": self.executed[name],
+                    "coalesced": self.coalesced[name],
+                    "reused": self.reused[name],
+                    "abandoned": self.abandoned[name],
+                }
+                for name in self.calls
+            }
+
+
+single_flight = SingleFlight()
+
+
+def normalize(value):
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(key): normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize(item) for item in value]
+    return value
+
+
+def coalesce(name: str, *attributes: str):
+    """Share identical concurrent calls of a function or tool method.
+
+    Calls are identical when their arguments, with defaults applied, are
+    equal. For methods, `self` compares by its listed `attributes`, e.g. its
+    API key. Sync and async variants of a call share `name` to share calls.
+    """
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def key(*args, **kwargs) -> str:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            if "self" in arguments:
+                instance = arguments.pop("self")
+                arguments["self"] = {
+                    attribute: getattr(instance, attribute) for attribute in attributes
+                }
+            payload = json.dumps(
+                [name, normalize(arguments)], sort_keys=True, default=str
+            )
+            return hashlib.sha256(payload.encode()).hexdigest()
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await single_flight.acall(
+                    name, key(*args, **kwargs), func, *args, **kwargs
+                )
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return single_flight.call(name, key(*args, **kwargs), func, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
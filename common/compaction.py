@@ -0,0 +1,214 @@
+import functools
+import json
+import os
+import threading
+from collections import defaultdict
+
+from langchain_core.messages import (
+    AnyMessage,
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    ToolMessage,
+)
+
+TOKEN_BUDGET = int(os.environ.get("AGENT_TOKEN_BUDGET", "16000"))
+KEEP_RECENT_TURNS = int(os.environ.get("AGENT_KEEP_RECENT_TURNS", "2"))
+TOOL_RESULT_MAX_TOKENS = int(os.environ.get("AGENT_TOOL_RESULT_MAX_TOKENS", "500"))
+
+# Per-message overhead of the chat format
+MESSAGE_TOKENS = 4
+CHARS_PER_TOKEN = 4
+
+
+@functools.cache
+def get_encoding(model: str):
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        # Unknown model, or the encoding can't be downloaded
+        return None
+
+
+class TokenCounter:
+    def __init__(self, model: str = "gpt-4o"):
+        self.encoding = get_encoding(model)
+
+    def encode(self, text: str):
+        if self.encoding is None:
+            return text
+        return self.encoding.encode(text, disallowed_special=())
+
+    def decode(self, tokens) -> str:
+        if self.encoding is None:
+            return tokens
+        return self.encoding.decode(tokens)
+
+    def text_tokens(self, text: str) -> int:
+        if self.encoding is None:
+            return -(-len(text) // CHARS_PER_TOKEN)
+        return len(self.encode(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.encoding is None:
+            return text[: max_tokens * CHARS_PER_TOKEN]
+        return self.decode(self.encode(text)[:max_tokens])
+
+    def message_tokens(self, message: AnyMessage) -> int:
+        content = message.content
+        if not isinstance(content, str):
+            content = json.dumps(content)
+        tokens = MESSAGE_TOKENS + self.text_tokens(content)
+        for tool_call in getattr(message, "tool_calls", None) or []:
+            tokens += self.text_tokens(
+                tool_call["name"] + json.dumps(tool_call["args"])
+            )
+        return tokens
+
+
+class CompactionMetrics:
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.compactions = defaultdict(int)
+        self.tokens_before = defaultdict(int)
+        self.tokens_after = defaultdict(int)
+        self.last_saved = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def record(self, name: str, tokens_before: int, tokens_after: int):
+        with self.lock:
+            self.calls[name] += 1
+            self.compactions[name] += tokens_after < tokens_before
+            self.tokens_before[name] += tokens_before
+            self.tokens_after[name] += tokens_after
+            self.last_saved[name] = tokens_before - tokens_after
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                name: {
+                    "llm_calls": self.calls[name],
+                    "compactions": self.compactions[name],
+                    "prompt_tokens": self.tokens_after[name],
+                    "tokens_saved": self.tokens_before[name] - self.tokens_after[name],
+                    "last_tokens_saved": self.last_saved[name],
+                }
+                for name in self.calls
+            }
+
+
+compaction_metrics = CompactionMetrics()
+
+
+def split_turns(messages: list[AnyMessage]):
+    """Leading system messages, and the rest grouped into turns starting at each human message."""
+    head = 0
+    while head < len(messages) and isinstance(messages[head], SystemMessage):
+        head += 1
+
+    turns = []
+    for message in messages[head:]:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    return messages[:head], turns
+
+
+class MessageCompactor:
+    """Graph node keeping the prompt of the next LLM call within a token budget.
+
+    The system prompt and the last `keep_recent_turns` turns are kept
+    verbatim. Older tool results are truncated to `tool_result_max_tokens`,
+    then the oldest turns are removed while the conversation exceeds
+    `token_budget`. If the recent turns alone still exceed it, their tool
+    results are truncated as well. Changes are written back to the graph
+    state, so the checkpoint shrinks along with the prompt.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        model: str = "gpt-4o",
+        token_budget: int = TOKEN_BUDGET,
+        keep_recent_turns: int = KEEP_RECENT_TURNS,
+        tool_result_max_tokens: int = TOOL_RESULT_MAX_TOKENS,
+        metrics: CompactionMetrics = compaction_metrics,
+    ):
+        self.name = name
+        self.counter = TokenCounter(model)
+        self.token_budget = token_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.tool_result_max_tokens = tool_result_max_tokens
+        self.metrics = metrics
+
+    def truncate_tool_result(self, message: ToolMessage, tokens: int):
+        omitted = tokens - MESSAGE_TOKENS - self.tool_result_max_tokens
+        return message.model_copy(
+            update={
+                "content": self.counter.truncate(
+                    message.content, self.tool_result_max_tokens
+                )
+                + f"\n... [{omitted} tokens of this tool result omitted]",
+                "response_metadata": {
+                    **message.response_metadata,
+                    "omitted_tokens": omitted,
+                },
+            }
+        )
+
+    def compact(self, messages: list[AnyMessage]):
+        _, turns = split_turns(messages)
+        split = max(len(turns) - self.keep_recent_turns, 0)
+        old, recent = turns[:split], turns[split:]
+
+        tokens = {
+            id(message): self.counter.message_tokens(message) for message in messages
+        }
+        tokens_before = sum(tokens.values())
+        total = tokens_before
+        updates = {}
+
+        def truncate_tool_results(turn_list):
+            nonlocal total
+            for turn in turn_list:
+                for message in turn:
+                    if (
+                        isinstance(message, ToolMessage)
+                        and isinstance(message.content, str)
+                        and "omitted_tokens" not in message.response_metadata
+                        and tokens[id(message)]
+                        > self.tool_result_max_tokens + MESSAGE_TOKENS
+                    ):
+                        truncated = self.truncate_tool_result(
+                            message, tokens[id(message)]
+                        )
+                        total += (
+                            self.counter.message_tokens(truncated) - tokens[id(message)]
+                        )
+                        updates[message.id] = truncated
+
+        truncate_tool_results(old)
+
+        for turn in old:
+            if total <= self.token_budget:
+                break
+            for message in turn:
+                total -= (
+                    self.counter.message_tokens(updates[message.id])
+                    if message.id in updates
+                    else tokens[id(message)]
+                )
+                updates[message.id] = RemoveMessage(id=message.id)
+
+        if total > self.token_budget:
+            truncate_tool_results(recent)
+
+        return list(updates.values()), tokens_before, total
+
+    def __call__(self, state):
+        updates, tokens_before, tokens_after = self.compact(state["messages"])
+        self.metrics.record(self.name, tokens_before, tokens_after)
+        return {"messages": updates}
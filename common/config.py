@@ -0,0 +1,64 @@
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Mapping, Optional
+
+_config = contextvars.ContextVar("agent_config", default=None)
+
+
+@dataclass(frozen=True)
+class AgentConfig:
+    """Credentials and uploaded files graphs are built with, per request.
+
+    Streamlit pages build it from the session state, the API server from the
+    request body.
+    """
+
+    keys: Mapping[str, str] = field(default_factory=dict)
+    uploaded_files: Mapping[str, str] = field(default_factory=dict)
+    uploaded_file_hashes: Mapping[str, str] = field(default_factory=dict)
+
+    def __getitem__(self, key: str) -> str:
+        if key not in self.keys:
+            raise KeyError(f"{key} is not configured")
+        return self.keys[key]
+
+    def get(self, key: str, default: str = None) -> Optional[str]:
+        return self.keys.get(key, default)
+
+    def get_uploaded_file(self, agent_name: str) -> Optional[str]:
+        return self.uploaded_files.get(agent_name)
+
+    def get_uploaded_file_hash(self, agent_name: str) -> Optional[str]:
+        return self.uploaded_file_hashes.get(agent_name)
+
+    @classmethod
+    def from_session_state(cls) -> "AgentConfig":
+        import streamlit as st
+
+        return cls(
+            keys={
+                key: value
+                for key, value in st.session_state.items()
+                if isinstance(value, str)
+            },
+            uploaded_files=dict(st.session_state.get("uploaded_file") or {}),
+            uploaded_file_hashes=dict(st.session_state.get("uploaded_file_hash") or {}),
+        )
+
+
+@contextmanager
+def use_config(config: AgentConfig):
+    token = _config.set(config)
+    try:
+        yield config
+    finally:
+        _config.reset(token)
+
+
+def get_config() -> AgentConfig:
+    """Config of the current request, else of the current Streamlit session."""
+    config = _config.get()
+    if config is None:
+        return AgentConfig.from_session_state()
+    return config
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+from collections import deque
+from html import escape
+
+DIAGRAM_CACHE_DIR = os.environ.get("AGENT_DIAGRAM_CACHE_DIR", ".cache/diagrams")
+
+NODE_HEIGHT = 36
+LAYER_GAP = 70
+NODE_GAP = 30
+CHAR_WIDTH = 8
+PADDING = 20
+
+_images = {}
+_images_lock = threading.Lock()
+
+
+def graph_hash(drawable) -> str:
+    structure = {
+        "nodes": sorted([node.id, node.name] for node in drawable.nodes.values()),
+        "edges": sorted(
+            [edge.source, edge.target, str(edge.data or ""), edge.conditional]
+            for edge in drawable.edges
+        ),
+    }
+    return hashlib.sha256(json.dumps(structure).encode()).hexdigest()
+
+
+def render_svg(drawable) -> str:
+    """Layered top-down layout of the graph, rendered without any external service."""
+    nodes = list(drawable.nodes)
+    first = drawable.first_node()
+    start = first.id if first else (nodes[0] if nodes else None)
+
+    outgoing = {node: [] for node in nodes}
+    for edge in drawable.edges:
+        outgoing[edge.source].append(edge.target)
+
+    layers = {start: 0} if start else {}
+    queue = deque([start] if start else [])
+    while queue:
+        node = queue.popleft()
+        for target in outgoing[node]:
+            if target not in layers:
+                layers[target] = layers[node] + 1
+                queue.append(target)
+    for node in nodes:
+        layers.setdefault(node, max(layers.values(), default=-1) + 1)
+
+    rows = {}
+    for node in nodes:
+        rows.setdefault(layers[node], []).append(node)
+
+    labels = {node: drawable.nodes[node].name for node in nodes}
+    widths = {node: len(labels[node]) * CHAR_WIDTH + 2 * PADDING for node in nodes}
+    row_widths = {
+        layer: sum(widths[node] for node in row) + NODE_GAP * (len(row) - 1)
+        for layer, row in rows.items()
+    }
+    width = max(row_widths.values(), default=0) + 2 * PADDING
+    height = len(rows) * (NODE_HEIGHT + LAYER_GAP) - LAYER_GAP + 2 * PADDING
+
+    positions = {}
+    for layer, row in rows.items():
+        x = (width - row_widths[layer]) / 2
+        y = PADDING + layer * (NODE_HEIGHT + LAYER_GAP)
+        for node in row:
+            positions[node] = (x, y)
+            x += widths[node] + NODE_GAP
+
+    def anchor(node, bottom):
+        x, y = positions[node]
+        return x + widths[node] / 2, y + (NODE_HEIGHT if bottom else 0)
+
+    elements = []
+    for edge in drawable.edges:
+        dash = ' stroke-dasharray="5,4"' if edge.conditional else ""
+        if layers[edge.target] > layers[edge.source]:
+            x1, y1 = anchor(edge.source, bottom=True)
+            x2, y2 = anchor(edge.target, bottom=False)
+            path = f"M{x1},{y1} L{x2},{y2}"
+        else:
+            x1, y1 = positions[edge.source]
+            x2, y2 = positions[edge.target]
+            x1, x2 = x1 + widths[edge.source], x2 + widths[edge.target]
+            y1, y2 = y1 + NODE_HEIGHT / 2, y2 + NODE_HEIGHT / 2
+            bend = max(x1, x2) + LAYER_GAP
+            path = f"M{x1},{y1} C{bend},{y1} {bend},{y2} {x2},{y2}"
+            width = max(width, bend + PADDING)
+        elements.append(
+            f'<path d="{path}" fill="none" stroke="#16423C" stroke-width="1.5"{dash} marker-end="url(#arrow)"/>'
+        )
+
+    for node in nodes:
+        x, y = positions[node]
+        fill = "#E9EFEC" if node == start else "#C4DAD2"
+        elements.append(
+            f'<rect x="{x}" y="{y}" width="{widths[node]}" height="{NODE_HEIGHT}" rx="8" fill="{fill}" stroke="#16423C"/>'
+            f'<text x="{x + widths[node] / 2}" y="{y + NODE_HEIGHT / 2}" text-anchor="middle" dominant-baseline="central" '
+            f'font-family="Poppins, sans-serif" font-size="13" fill="#16423C">{escape(labels[node])}</text>'
+        )
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}">'
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="7" markerHeight="7" orient="auto-start-reverse">'
+        '<path d="M0,0 L10,5 L0,10 z" fill="#16423C"/></marker></defs>'
+        '<rect width="100%" height="100%" fill="white"/>' + "".join(elements) + "</svg>"
+    )
+
+
+def render(drawable):
+    try:
+        return drawable.draw_png(), "png"
+    except ImportError:
+        pass
+
+    try:
+        return drawable.draw_mermaid_png(), "png"
+    except Exception:
+        return render_svg(drawable), "svg"
+
+
+def get_graph_image(agent_graph):
+    """Workflow diagram of a compiled graph, rendered once per graph shape."""
+    drawable = agent_graph.get_graph(xray=1)
+    key = graph_hash(drawable)
+
+    with _images_lock:
+        if key in _images:
+            return _images[key]
+
+    for extension, mode in (("png", "rb"), ("svg", "r")):
+        path = os.path.join(DIAGRAM_CACHE_DIR, f"{key}.{extension}")
+        if os.path.exists(path):
+            with open(path, mode) as file:
+                image = file.read()
+            break
+    else:
+        image, extension = render(drawable)
+        os.makedirs(DIAGRAM_CACHE_DIR, exist_ok=True)
+        path = os.path.join(DIAGRAM_CACHE_DIR, f"{key}.{extension}")
+        with open(
+            f"{path}.{os.getpid()}.tmp", "wb" if extension == "png" else "w"
+        ) as file:
+            file.write(image)
+        os.replace(f"{path}.{os.getpid()}.tmp", path)
+
+    with _images_lock:
+        _images[key] = image
+
+    return image
@@ -0,0 +1,401 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+EMBEDDING_CACHE = os.environ.get("AGENT_EMBEDDING_CACHE", "1") == "1"
+EMBEDDING_CACHE_DIR = os.environ.get("AGENT_EMBEDDING_CACHE_DIR", ".cache/embeddings")
+EMBEDDING_CACHE_MAX_VECTORS = int(
+    os.environ.get("AGENT_EMBEDDING_CACHE_MAX_VECTORS", "200000")
+)
+# Share of orphaned rows that triggers the compaction of a vectors file
+EMBEDDING_CACHE_COMPACT_RATIO = float(
+    os.environ.get("AGENT_EMBEDDING_CACHE_COMPACT_RATIO", "0.5")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS segments (
+    model TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL,
+    generation INTEGER NOT NULL,
+    rows INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS vectors (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+CREATE INDEX IF NOT EXISTS vectors_accessed_at ON vectors (accessed_at);
+"""
+
+# Host parameters per query, below SQLite's limit
+BATCH = 500
+# Files with fewer rows are not worth compacting
+COMPACT_MIN_ROWS = 1024
+# Read times buffered before they are written without waiting for a put
+ACCESS_FLUSH = 4096
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def batches(items: list, size: int = BATCH):
+    for start in range(0, len(items), size):
+        yield items[start : start + size]
+
+
+class EmbeddingStore:
+    """Embedding vectors of texts, per embedding model, on disk.
+
+    Vectors are float32 rows appended to one file per model, read through a
+    memory map, and an SQLite index maps a model and text hash to its row.
+    Processes share both, writers serialize on the index. Beyond
+    `max_vectors` the least recently read vectors are dropped from the
+    index, which orphans their rows, and a file is compacted once orphans
+    make up `compact_ratio` of its rows.
+    """
+
+    def __init__(
+        self,
+        directory: str = EMBEDDING_CACHE_DIR,
+        max_vectors: int = EMBEDDING_CACHE_MAX_VECTORS,
+        compact_ratio: float = EMBEDDING_CACHE_COMPACT_RATIO,
+    ):
+        self.directory = directory
+        self.max_vectors = max_vectors
+        self.compact_ratio = compact_ratio
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(
+            os.path.join(directory, "index.sqlite"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self.maps: dict[str, tuple[int, np.memmap]] = {}
+        # Read times of vectors, written with the next write transaction
+        self.accessed: dict[tuple[str, str], float] = {}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.compactions = 0
+
+    def vectors_path(self, model: str, generation: int) -> str:
+        return os.path.join(self.directory, f"{text_hash(model)[:16]}.{generation}.f32")
+
+    def vectors(self, model: str, dim: int, generation: int, rows: int) -> np.ndarray:
+        mapped = self.maps.get(model)
+        if mapped is None or mapped[0] != generation or len(mapped[1]) < rows:
+            array = np.memmap(
+                self.vectors_path(model, generation),
+                dtype=np.float32,
+                mode="r",
+                shape=(rows, dim),
+            )
+            mapped = self.maps[model] = (generation, array)
+        return mapped[1]
+
+    @contextmanager
+    def read_transaction(self):
+        """Consistent snapshot of the index, which does not block writers."""
+        self.conn.execute("BEGIN")
+        try:
+            yield
+        finally:
+            self.conn.execute("COMMIT")
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction, serializing the processes sharing the store."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def flush_accessed(self):
+        """Write the buffered read times, in a write transaction."""
+        accessed, self.accessed = self.accessed, {}
+        self.conn.executemany(
+            "UPDATE vectors SET accessed_at = ? WHERE model = ? AND text_hash = ?",
+            [(at, model, hash_) for (model, hash_), at in accessed.items()],
+        )
+
+    def segment(self, model: str) -> Optional[tuple[int, int, int]]:
+        return self.conn.execute(
+            "SELECT dim, generation, rows FROM segments WHERE model = ?", (model,)
+        ).fetchone()
+
+    def find(self, model: str, hashes: list[str]) -> dict[str, int]:
+        found = {}
+        for batch in batches(hashes):
+            found.update(
+                self.conn.execute(
+                    "SELECT text_hash, row FROM vectors WHERE model = ? "
+                    f"AND text_hash IN ({', '.join('?' * len(batch))})",
+                    (model, *batch),
+                )
+            )
+        return found
+
+    def get_many(self, model: str, texts: Sequence[str]) -> list[Optional[np.ndarray]]:
+        """Stored vectors of `texts`, None for the texts not stored."""
+        hashes = [text_hash(text) for text in texts]
+        vectors = {}
+
+        with self.lock:
+            for _ in range(2):
+                try:
+                    with self.read_transaction():
+                        if segment := self.segment(model):
+                            found = self.find(model, list(dict.fromkeys(hashes)))
+                            if found:
+                                array = self.vectors(model, *segment)
+                                vectors = {
+                                    hash_: np.array(array[row])
+                                    for hash_, row in found.items()
+                                }
+                    break
+                except FileNotFoundError:
+                    # Another process compacted the file since the lookup,
+                    # looked up once more, then the texts are misses
+                    continue
+
+            now = time.time()
+            self.accessed.update(((model, hash_), now) for hash_ in vectors)
+            if len(self.accessed) >= ACCESS_FLUSH:
+                with self.transaction():
+                    self.flush_accessed()
+
+            hits = sum(hash_ in vectors for hash_ in hashes)
+            self.hits[model] += hits
+            self.misses[model] += len(hashes) - hits
+
+        return [vectors.get(hash_) for hash_ in hashes]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence):
+        array = np.asarray(vectors, dtype=np.float32)
+        if not len(array):
+            return
+        rows_by_hash = dict(zip((text_hash(text) for text in texts), array))
+
+        with self.lock:
+            with self.transaction():
+                # Before the least recently read vectors are dropped
+                self.flush_accessed()
+                if segment := self.segment(model):
+                    dim, generation, rows = segment
+                    if dim != array.shape[1]:
+                        raise ValueError(
+                            f"{model} vectors have {dim} dimensions, not {array.shape[1]}"
+                        )
+                else:
+                    dim, generation, rows = array.shape[1], 0, 0
+                    self.conn.execute(
+                        "INSERT INTO segments (model, dim, generation, rows) VALUES (?, ?, ?, ?)",
+                        (model, dim, generation, rows),
+                    )
+
+                # Another process may have stored some of them meanwhile
+                for hash_ in self.find(model, list(rows_by_hash)):
+                    del rows_by_hash[hash_]
+                if not rows_by_hash:
+                    return
+
+                # Appended after the rows in the index, overwriting rows a
+                # crashed writer left behind
+                path = self.vectors_path(model, generation)
+                with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                    f.seek(rows * dim * 4)
+                    f.write(np.stack(list(rows_by_hash.values())).tobytes())
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                now = time.time()
+                self.conn.executemany(
+                    "INSERT INTO vectors (model, text_hash, row, accessed_at) VALUES (?, ?, ?, ?)",
+                    [
+                        (model, hash_, rows + i, now)
+                        for i, hash_ in enumerate(rows_by_hash)
+                    ],
+                )
+                self.conn.execute(
+                    "UPDATE segments SET rows = ? WHERE model = ?",
+                    (rows + len(rows_by_hash), model),
+                )
+                self.conn.execute(
+                    "DELETE FROM vectors WHERE rowid IN (SELECT rowid FROM vectors "
+                    "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_vectors,),
+                )
+
+            if any(
+                rows >= COMPACT_MIN_ROWS and rows - live >= self.compact_ratio * rows
+                for _, rows, live in self.segment_usage()
+            ):
+                self.compact()
+
+    def segment_usage(self) -> list[tuple[str, int, int]]:
+        """Model, rows and rows still referenced of every vectors file."""
+        return self.conn.execute(
+            "SELECT segments.model, segments.rows, COUNT(vectors.row) FROM segments "
+            "LEFT JOIN vectors ON vectors.model = segments.model GROUP BY segments.model"
+        ).fetchall()
+
+    def compact(self) -> int:
+        """Rewrite the vectors files without their orphaned rows.
+
+        Returns the number of rows dropped. Files are rewritten as a new
+        generation, processes still reading the previous one keep their map.
+        """
+        dropped, stale = 0, []
+
+        with self.lock:
+            with self.transaction():
+                for model, rows, live in self.segment_usage():
+                    if live == rows:
+                        continue
+                    dim, generation, _ = self.segment(model)
+                    old = self.vectors(model, dim, generation, rows)
+                    kept = self.conn.execute(
+                        "SELECT text_hash, row FROM vectors WHERE model = ? ORDER BY row",
+                        (model,),
+                    ).fetchall()
+
+                    with open(self.vectors_path(model, generation + 1), "wb") as f:
+                        for batch in batches(kept):
+                            f.write(old[[row for _, row in batch]].tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+
+                    self.conn.executemany(
+                        "UPDATE vectors SET row = ? WHERE model = ? AND text_hash = ?",
+                        [(i, model, hash_) for i, (hash_, _) in enumerate(kept)],
+                    )
+                    self.conn.execute(
+                        "UPDATE segments SET generation = ?, rows = ? WHERE model = ?",
+                        (generation + 1, len(kept), model),
+                    )
+                    self.maps.pop(model, None)
+                    stale.append(self.vectors_path(model, generation))
+                    dropped += rows - len(kept)
+
+            for path in stale:
+                if os.path.exists(path):
+                    os.remove(path)
+            if stale:
+                self.compactions += 1
+            return dropped
+
+    def metrics(self) -> dict:
+        with self.lock:
+            usage = self.segment_usage()
+            return {
+                "vectors": sum(live for _, _, live in usage),
+                "orphaned_vectors": sum(rows - live for _, rows, live in usage),
+                "bytes": sum(
+                    os.path.getsize(self.vectors_path(model, generation))
+                    for model, _, generation, _ in self.conn.execute(
+                        "SELECT model, dim, generation, rows FROM segments"
+                    )
+                    if os.path.exists(self.vectors_path(model, generation))
+                ),
+                "compactions": self.compactions,
+                "models": {
+                    model: {
+                        "hits": self.hits[model],
+                        "misses": self.misses[model],
+                        "hit_rate": round(
+                            self.hits[model] / (self.hits[model] + self.misses[model]),
+                            3,
+                        ),
+                    }
+                    for model in {**self.hits, **self.misses}
+                    if self.hits[model] + self.misses[model]
+                },
+            }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings of documents served from the store, only misses are computed.
+
+    Queries are not cached, each is embedded once by `embeddings`.
+    """
+
+    def __init__(self, embeddings: Embeddings, model: str, store: EmbeddingStore):
+        self.embeddings = embeddings
+        self.model = model
+        self.store = store
+
+    def missing(self, texts: list[str], vectors: list) -> list[str]:
+        return list(
+            dict.fromkeys(
+                text for text, vector in zip(texts, vectors) if vector is None
+            )
+        )
+
+    def merge(self, texts, vectors, missing, computed) -> list[list[float]]:
+        computed = dict(zip(missing, computed))
+        return [
+            computed[text] if vector is None else vector.tolist()
+            for text, vector in zip(texts, vectors)
+        ]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = self.store.get_many(self.model, texts)
+        computed = []
+        if missing := self.missing(texts, vectors):
+            computed = self.embeddings.embed_documents(missing)
+            self.store.put_many(self.model, missing, computed)
+        return self.merge(texts, vectors, missing, computed)
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = await asyncio.to_thread(self.store.get_many, self.model, texts)
+        computed = []
+        if missing := self.missing(texts, vectors):
+            computed = await self.embeddings.aembed_documents(missing)
+            await asyncio.to_thread(self.store.put_many, self.model, missing, computed)
+        return self.merge(texts, vectors, missing, computed)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return await self.embeddings.aembed_query(text)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_embedding_store() -> EmbeddingStore:
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore()
+        return _store
+
+
+def cached_embeddings(embeddings: Embeddings, model: str) -> Embeddings:
+    """`embeddings` of `model`, with document embeddings cached on disk."""
+    if not EMBEDDING_CACHE:
+        return embeddings
+    return CachedEmbeddings(embeddings, model=model, store=get_embedding_store())
@@ -0,0 +1,289 @@
+import asyncio
+import importlib.util
+import os
+import re
+import threading
+import time
+import weakref
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import httpx
+
+from common.aio import get_loop
+from common.rate_limit import estimate_tokens, rate_limiter
+
+HTTP_MAX_CONNECTIONS = int(os.environ.get("AGENT_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(
+    os.environ.get("AGENT_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")
+)
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("AGENT_HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("AGENT_HTTP_TIMEOUT_SECONDS", "60"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(
+    os.environ.get("AGENT_HTTP_CONNECT_TIMEOUT_SECONDS", "10")
+)
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+
+# HTTP/2 needs the optional h2 package (httpx[http2])
+HTTP2 = (
+    os.environ.get("AGENT_HTTP2", "1") == "1"
+    and importlib.util.find_spec("h2") is not None
+)
+
+
+def origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+# Endpoints generating tokens, which count against the limits as well
+COMPLETION_PATHS = ("/chat/completions", "/completions", "/responses")
+
+
+def request_tokens(limiter, request: httpx.Request) -> int:
+    if limiter.tokens is None:
+        return 1
+    try:
+        return estimate_tokens(
+            request.content, completion=request.url.path.endswith(COMPLETION_PATHS)
+        )
+    except httpx.RequestNotRead:
+        return 1
+
+
+def request_kind(request: httpx.Request) -> str:
+    """Requests whose latencies to the response headers are comparable."""
+    try:
+        if re.search(rb'"stream"\s*:\s*true', request.content):
+            return "stream"
+    except httpx.RequestNotRead:
+        pass
+    if request.url.path.endswith(COMPLETION_PATHS):
+        return "completion"
+    return "request"
+
+
+class ReleasingStream(httpx.SyncByteStream):
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.release()
+
+
+class AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self.release()
+
+
+class RateLimitedTransport(httpx.HTTPTransport):
+    """Transport holding a slot of the host's rate limiter per request,
+    until the response is closed."""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = rate_limiter.get(request.url.host, request.url.path)
+        if limiter is None:
+            return super().handle_request(request)
+
+        permit = limiter.acquire_sync(tokens=request_tokens(limiter, request))
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            limiter.release(permit)
+            raise
+
+        limiter.observe(
+            response.status_code,
+            response.headers,
+            time.monotonic() - permit.started,
+            kind=request_kind(request),
+        )
+        response.stream = ReleasingStream(
+            response.stream, lambda: limiter.release(permit)
+        )
+        return response
+
+
+class AsyncRateLimitedTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        limiter = rate_limiter.get(request.url.host, request.url.path)
+        if limiter is None:
+            return await super().handle_async_request(request)
+
+        permit = await limiter.acquire(tokens=request_tokens(limiter, request))
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            limiter.release(permit)
+            raise
+
+        limiter.observe(
+            response.status_code,
+            response.headers,
+            time.monotonic() - permit.started,
+            kind=request_kind(request),
+        )
+        response.stream = AsyncReleasingStream(
+            response.stream, lambda: limiter.release(permit)
+        )
+        return response
+
+
+class LoopAsyncClient(httpx.AsyncClient):
+    """Async client sending through the pooled client of the running loop.
+
+    A model or tool built on one thread or loop holds this client and may be
+    awaited on another, while connections stay bound to the loop they were
+    opened on.
+    """
+
+    def __init__(self, registry: "HttpClientRegistry", base_url: str):
+        super().__init__(timeout=registry.timeout)
+        self.registry = registry
+        self.origin = origin(base_url)
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        client = self.registry.loop_client(self.origin)
+        return await client.send(request, **kwargs)
+
+
+class HttpClientRegistry:
+    """Process-wide keep-alive connection pools, one per origin.
+
+    Sync clients are shared by all threads. Async connections are bound to
+    the event loop they are opened on, so there is one pooled client per
+    origin and loop, and the client handed out sends through the one of the
+    loop it is awaited on. Every request and
+    every newly opened connection is counted per origin, the difference
+    being requests served over a reused connection. Requests to hosts with
+    rate limits hold a slot of the host's limiter.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_seconds: float = HTTP_KEEPALIVE_SECONDS,
+        timeout: float = HTTP_TIMEOUT_SECONDS,
+        connect_timeout: float = HTTP_CONNECT_TIMEOUT_SECONDS,
+        http2: bool = HTTP2,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_seconds,
+        )
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2
+        self.clients: dict[str, httpx.Client] = {}
+        self.loop_clients: dict[str, LoopAsyncClient] = {}
+        self.async_clients = weakref.WeakKeyDictionary()
+        self.requests = defaultdict(int)
+        self.connections = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def count_request(self, request: httpx.Request):
+        with self.lock:
+            self.requests[origin(str(request.url))] += 1
+
+    def count_connection(self, request: httpx.Request, event_name: str):
+        if event_name == "connection.connect_tcp.complete":
+            with self.lock:
+                self.connections[origin(str(request.url))] += 1
+
+    def on_request(self, request: httpx.Request):
+        self.count_request(request)
+
+        def trace(event_name, info):
+            self.count_connection(request, event_name)
+
+        request.extensions["trace"] = trace
+
+    async def on_async_request(self, request: httpx.Request):
+        self.count_request(request)
+
+        async def trace(event_name, info):
+            self.count_connection(request, event_name)
+
+        request.extensions["trace"] = trace
+
+    def get_client(self, base_url: str) -> httpx.Client:
+        key = origin(base_url)
+
+        with self.lock:
+            if key not in self.clients:
+                self.clients[key] = httpx.Client(
+                    transport=RateLimitedTransport(
+                        limits=self.limits, http2=self.http2
+                    ),
+                    timeout=self.timeout,
+                    event_hooks={"request": [self.on_request]},
+                )
+            return self.clients[key]
+
+    def get_async_client(self, base_url: str) -> httpx.AsyncClient:
+        key = origin(base_url)
+
+        with self.lock:
+            if key not in self.loop_clients:
+                self.loop_clients[key] = LoopAsyncClient(self, key)
+            return self.loop_clients[key]
+
+    def loop_client(self, key: str) -> httpx.AsyncClient:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = get_loop()
+
+        with self.lock:
+            clients = self.async_clients.setdefault(loop, {})
+            if key not in clients:
+                clients[key] = httpx.AsyncClient(
+                    transport=AsyncRateLimitedTransport(
+                        limits=self.limits, http2=self.http2
+                    ),
+                    timeout=self.timeout,
+                    event_hooks={"request": [self.on_async_request]},
+                )
+            return clients[key]
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                key: {
+                    "requests": self.requests[key],
+                    "connections": self.connections[key],
+                    "reused": self.requests[key] - self.connections[key],
+                }
+                for key in self.requests
+            }
+
+
+http_clients = HttpClientRegistry()
+
+
+def get_client(base_url: str) -> httpx.Client:
+    return http_clients.get_client(base_url)
+
+
+def get_async_client(base_url: str) -> httpx.AsyncClient:
+    return http_clients.get_async_client(base_url)
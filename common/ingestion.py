@@ -0,0 +1,266 @@
+import asyncio
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional
+
+from common.compaction import TokenCounter
+from common.pdf import pdf_extractor
+
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+
+EMBED_BATCH_TOKENS = int(os.environ.get("AGENT_EMBED_BATCH_TOKENS", "8000"))
+EMBED_MAX_IN_FLIGHT = int(os.environ.get("AGENT_EMBED_MAX_IN_FLIGHT", "4"))
+EMBED_MAX_RETRIES = int(os.environ.get("AGENT_EMBED_MAX_RETRIES", "3"))
+EMBED_RETRY_SECONDS = float(os.environ.get("AGENT_EMBED_RETRY_SECONDS", "1"))
+INGEST_QUEUE_SIZE = int(os.environ.get("AGENT_INGEST_QUEUE_SIZE", "64"))
+
+
+class Progress:
+    """Progress of a file ingestion, shown to whoever waits for it."""
+
+    def __init__(self, on_update: Callable[["Progress"], None] = None):
+        self.on_update = on_update
+        self.stage = "Processing"
+        self.done = 0
+        self.total: Optional[int] = None
+        self.retries = 0
+
+    def start(self, stage: str, total: int = None):
+        self.stage = stage
+        self.done = 0
+        self.total = total
+        self.report()
+
+    def advance(self, count: int = 1):
+        self.done += count
+
+    @property
+    def fraction(self) -> float:
+        if not self.total:
+            return 0.0
+        return min(self.done / self.total, 1.0)
+
+    def describe(self) -> str:
+        if self.total:
+            return f"{self.stage} {self.done}/{self.total}"
+        return f"{self.stage} {self.done}"
+
+    def report(self):
+        if self.on_update is not None:
+            self.on_update(self)
+
+
+current_progress: ContextVar[Optional[Progress]] = ContextVar(
+    "current_progress", default=None
+)
+
+
+@contextmanager
+def report_progress(on_update: Callable[[Progress], None]):
+    """Report the progress of ingestions run in this context to `on_update`."""
+    progress = Progress(on_update)
+    token = current_progress.set(progress)
+    try:
+        yield progress
+    finally:
+        current_progress.reset(token)
+
+
+def get_progress() -> Progress:
+    return current_progress.get() or Progress()
+
+
+def read_pages(path: str, progress: Progress = None) -> Iterator["Document"]:
+    """Pages of a PDF, one document each, parsed as they are consumed."""
+    for page in pdf_extractor.pages(path):
+        if progress is not None:
+            progress.total = page.metadata.get("total_pages")
+            progress.advance()
+        yield page
+
+
+def split_pages(
+    pages: Iterable["Document"], chunk_size: int, chunk_overlap: int
+) -> Iterator["Document"]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, chunk_overlap=chunk_overlap
+    )
+    for page in pages:
+        yield from splitter.split_documents([page])
+
+
+class Prefetch(Iterator):
+    """Items of `iterable`, produced by a thread at most `size` items ahead.
+
+    The next stage of an ingestion works on early items while later ones
+    are produced, and a slow stage holds back the ones before it instead of
+    letting items pile up. Closing stops the thread, from any thread.
+    """
+
+    done = object()
+
+    def __init__(self, iterable: Iterable, size: int = INGEST_QUEUE_SIZE):
+        self.items = queue.Queue(maxsize=size)
+        self.stopped = threading.Event()
+        threading.Thread(
+            target=self.produce,
+            args=(iter(iterable),),
+            name="ingestion-prefetch",
+            daemon=True,
+        ).start()
+
+    def put(self, item) -> bool:
+        while not self.stopped.is_set():
+            try:
+                self.items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce(self, iterator: Iterator):
+        try:
+            for item in iterator:
+                if not self.put((item, None)):
+                    return
+            self.put((self.done, None))
+        except BaseException as e:
+            self.put((self.done, e))
+        finally:
+            if close := getattr(iterator, "close", None):
+                close()
+
+    def __next__(self):
+        while not self.stopped.is_set():
+            try:
+                item, error = self.items.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is self.done:
+                self.stopped.set()
+                if error is not None:
+                    raise error
+                break
+            return item
+        raise StopIteration
+
+    def close(self):
+        self.stopped.set()
+
+    def __enter__(self) -> "Prefetch":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EmbeddingPipeline:
+    """Embeds document chunks in batches, concurrently, into a FAISS index.
+
+    Batches hold up to `batch_tokens` tokens and at most `max_in_flight` are
+    embedded at once. A failed batch is retried up to `max_retries` times
+    with exponential backoff, without the batches that succeeded. Vectors
+    are added to the index as their batch completes. Chunks are pulled from
+    `documents` off the event loop, so a generator can still be parsing the
+    document while earlier chunks are embedded.
+    """
+
+    def __init__(
+        self,
+        embeddings: "Embeddings",
+        batch_tokens: int = EMBED_BATCH_TOKENS,
+        max_in_flight: int = EMBED_MAX_IN_FLIGHT,
+        max_retries: int = EMBED_MAX_RETRIES,
+        retry_seconds: float = EMBED_RETRY_SECONDS,
+        progress: Progress = None,
+        model: str = "text-embedding-ada-002",
+    ):
+        self.embeddings = embeddings
+        self.batch_tokens = batch_tokens
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.retry_seconds = retry_seconds
+        self.progress = progress or Progress()
+        self.counter = TokenCounter(model)
+
+    def batches(self, documents: Iterable["Document"]) -> Iterator[list["Document"]]:
+        batch, tokens = [], 0
+        for document in documents:
+            document_tokens = self.counter.text_tokens(document.page_content)
+            if batch and tokens + document_tokens > self.batch_tokens:
+                yield batch
+                batch, tokens = [], 0
+            batch.append(document)
+            tokens += document_tokens
+        if batch:
+            yield batch
+
+    async def embed(self, batch: list["Document"]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = await self.embeddings.aembed_documents(
+                    [document.page_content for document in batch]
+                )
+                return batch, vectors
+            except Exception:
+                if attempt == self.max_retries:
+                    raise
+                self.progress.retries += 1
+                await asyncio.sleep(self.retry_seconds * 2**attempt)
+
+    async def build(self, documents: Iterable["Document"]) -> "FAISS":
+        from langchain_community.vectorstores import FAISS
+
+        vector_store = None
+        pending = set()
+
+        def add(task: asyncio.Task):
+            nonlocal vector_store
+            batch, vectors = task.result()
+            text_embeddings = [
+                (document.page_content, vector)
+                for document, vector in zip(batch, vectors)
+            ]
+            metadatas = [document.metadata for document in batch]
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(
+                    text_embeddings, self.embeddings, metadatas=metadatas
+                )
+            else:
+                vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+
+        batches = self.batches(documents)
+        try:
+            while True:
+                if len(pending) >= self.max_in_flight:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        add(task)
+                batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    break
+                pending.add(asyncio.ensure_future(self.embed(batch)))
+
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    add(task)
+        finally:
+            for task in pending:
+                task.cancel()
+
+        if vector_store is None:
+            raise ValueError("No text found in the document")
+        return vector_store
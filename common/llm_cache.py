@@ -0,0 +1,213 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+LLM_CACHE = os.environ.get("AGENT_LLM_CACHE", "1") == "1"
+LLM_CACHE_DB = os.environ.get("AGENT_LLM_CACHE_DB", ".cache/llm_cache.sqlite")
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("AGENT_LLM_CACHE_TTL_SECONDS", "604800"))
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("AGENT_LLM_CACHE_MAX_ENTRIES", "10000"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at);
+"""
+
+# Per-call message fields that don't change what the model is asked
+VOLATILE_KEYS = ("id", "response_metadata", "usage_metadata")
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Serialized messages without ids, metadata and provider tool call ids."""
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+
+    tool_call_ids = {}
+    for message in messages:
+        kwargs = message.get("kwargs", {})
+        for key in VOLATILE_KEYS:
+            kwargs.pop(key, None)
+        for tool_call in kwargs.get("tool_calls", []):
+            tool_call_ids.setdefault(tool_call["id"], f"call_{len(tool_call_ids)}")
+
+    normalized = json.dumps(messages, sort_keys=True)
+    for tool_call_id, alias in tool_call_ids.items():
+        normalized = normalized.replace(json.dumps(tool_call_id), json.dumps(alias))
+    return normalized
+
+
+class SqliteLLMCache:
+    """LLM responses stored in a local SQLite database.
+
+    Entries expire `ttl_seconds` after being written, and the least recently
+    read entries are evicted beyond `max_entries`. Hits and misses are
+    counted per namespace.
+    """
+
+    def __init__(
+        self,
+        path: str = LLM_CACHE_DB,
+        ttl_seconds: Optional[int] = LLM_CACHE_TTL_SECONDS,
+        max_entries: Optional[int] = LLM_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def get(self, key: str, namespace: str = "") -> Optional[str]:
+        now = time.time()
+
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                with self.conn:
+                    self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses[namespace] += 1
+                return None
+
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+            self.hits[namespace] += 1
+            return row[0]
+
+    def set(self, key: str, value: str):
+        now = time.time()
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            if self.ttl_seconds:
+                self.conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?",
+                    (now - self.ttl_seconds,),
+                )
+            if self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM llm_cache")
+
+    def metrics(self) -> dict:
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            namespaces = {
+                namespace: {
+                    "hits": self.hits[namespace],
+                    "misses": self.misses[namespace],
+                    "hit_rate": round(
+                        self.hits[namespace]
+                        / (self.hits[namespace] + self.misses[namespace]),
+                        3,
+                    ),
+                }
+                for namespace in {**self.hits, **self.misses}
+            }
+            return {"entries": entries, "namespaces": namespaces}
+
+
+class LLMCache(BaseCache):
+    """LangChain cache view on the shared store for one agent.
+
+    Keys hash the model parameters and bound tools (`llm_string`), the
+    normalized messages and the `scope`, typically the API base url.
+    """
+
+    def __init__(self, store: SqliteLLMCache, namespace: str, scope: str = ""):
+        self.store = store
+        self.namespace = namespace
+        self.scope = scope
+
+    def key(self, prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(
+            "\n".join([self.scope, llm_string, normalize_prompt(prompt)]).encode()
+        ).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        value = self.store.get(self.key(prompt, llm_string), self.namespace)
+        return None if value is None else loads(value)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        generations = []
+        for generation in return_val:
+            if hasattr(generation, "message"):
+                # Fresh ids on every hit, reusing one would replace the earlier
+                # message in the graph state
+                generation = generation.model_copy(
+                    update={
+                        "message": generation.message.model_copy(update={"id": None})
+                    }
+                )
+            generations.append(generation)
+        self.store.set(self.key(prompt, llm_string), dumps(generations))
+
+    def clear(self, **kwargs: Any) -> None:
+        self.store.clear()
+
+    async def alookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        return await asyncio.to_thread(self.lookup, prompt, llm_string)
+
+    async def aupdate(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE):
+        await asyncio.to_thread(self.update, prompt, llm_string, return_val)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_llm_cache_store() -> SqliteLLMCache:
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            _store = SqliteLLMCache()
+        return _store
+
+
+def get_llm_cache(namespace: str, scope: str = "") -> Optional[LLMCache]:
+    if not LLM_CACHE:
+        return None
+    return LLMCache(get_llm_cache_store(), namespace=namespace, scope=scope)
@@ -1,11 +1,31 @@
-import tempfile
+import asyncio
+import os
+import time
+import uuid
 
 import streamlit as st
 from langchain_core.messages import SystemMessage, HumanMessage
 from streamlit.commands.page_config import Layout, PageIcon
 
-from common.agent import BaseAgent
-from common.chat import add_chat_message, display_message
+from common.agent import BaseAgent, fingerprint
+from common.aio import iterate
+from common.cancellation import cancel_metrics, cancelled_tool_messages
+from common.coalesce import single_flight
+from common.compaction import compaction_metrics
+from common.embedding_cache import get_embedding_store
+from common.chat import add_chat_message, display_message, stream_message_chunk
+from common.diagram import get_graph_image
+from common.http import http_clients
+from common.ingestion import report_progress
+from common.llm_cache import get_llm_cache_store
+from common.pdf import pdf_extractor
+from common.rate_limit import rate_limiter
+from common.semantic_cache import semantic_cache
+from common.threads import thread_registry
+from common.tool_executor import tool_metrics
+from common.tracing import start_metrics_server, tracer
+from common.uploads import UploadQuotaExceeded, upload_store
+from common.vector_index import vector_indexes
 
 
 def get_api_key(keys):
@@ -43,53 +63,199 @@ class BasePage:
         pass
 
     @classmethod
-    def stream_events(cls, agent_graph, human_message):
-        config = {"configurable": {"thread_id": "1"}}
+    def store_uploaded_file(cls, uploaded_file):
+        st.info("Uploading file, please wait...")
+        try:
+            stored = upload_store.put(
+                uploaded_file,
+                holder=cls.get_thread().thread_id,
+                suffix=os.path.splitext(uploaded_file.name)[1],
+            )
+        except UploadQuotaExceeded as e:
+            st.error(str(e), icon="🚨")
+            # Not retried on every rerun, the file has to be uploaded again
+            st.session_state["uploaded_file"][cls.agent.name] = None
+            st.session_state["uploaded_file_hash"][cls.agent.name] = None
+            st.session_state["uploaded_file_id"][cls.agent.name] = uploaded_file.file_id
+            return
+
+        st.session_state["uploaded_file"][cls.agent.name] = stored.path
+        st.session_state["uploaded_file_hash"][cls.agent.name] = stored.content_hash
+        st.session_state["uploaded_file_id"][cls.agent.name] = uploaded_file.file_id
+
+        # Identical files are processed once per agent and credentials
+        key = fingerprint(cls.agent.get_graph_cache_key())
+        if not upload_store.is_processed(stored.content_hash, key):
+            bar = st.progress(0.0, text="Processing file")
+            with report_progress(
+                lambda progress: bar.progress(
+                    progress.fraction, text=progress.describe()
+                )
+            ):
+                cls.on_file_upload(uploaded_file=stored.path)
+            bar.empty()
+            upload_store.mark_processed(stored.content_hash, key)
+
+        st.info("File uploaded successfully")
+
+    @classmethod
+    def get_thread(cls):
+        if "session_id" not in st.session_state:
+            st.session_state.session_id = uuid.uuid4().hex
+
+        thread = thread_registry.get_thread(
+            session_id=st.session_state.session_id, agent_name=cls.agent.name
+        )
+
+        # An evicted thread released the session's file, a new one holds it again
+        if content_hash := st.session_state.get("uploaded_file_hash", {}).get(
+            cls.agent.name
+        ):
+            if upload_store.acquire(content_hash, holder=thread.thread_id) is None:
+                for key in ["uploaded_file", "uploaded_file_hash", "uploaded_file_id"]:
+                    st.session_state[key][cls.agent.name] = None
+                st.warning("The uploaded file expired, please upload it again.")
 
+        return thread
+
+    @classmethod
+    def is_node_displayed(cls, node):
+        return not cls.agent.nodes_to_display or node in cls.agent.nodes_to_display
+
+    @classmethod
+    def get_agent_input(cls, agent_graph, thread, human_message):
         def is_first_human_message():
-            for message in st.session_state.page_messages[cls.agent.name]:
+            for message in thread.messages:
                 if message.get("role") == "human":
                     return False
             return True
 
-        if human_message:
-            if is_first_human_message():
-                agent_input = {
-                    "messages": [
-                        SystemMessage(content=cls.agent.system_prompt),
-                        HumanMessage(content=human_message),
-                    ]
-                }
-            elif not cls.agent.interrupt_before:
-                agent_input = {
-                    "messages": [
-                        HumanMessage(content=human_message),
-                    ]
-                }
-            else:
-                agent_input = None
-                agent_graph.update_state(
-                    config=config,
-                    values={"messages": [HumanMessage(content=human_message)]}
-                    | cls.agent.update_graph_state(human_message),
-                    as_node=cls.agent.update_as_node,
+        if is_first_human_message():
+            return {
+                "messages": [
+                    SystemMessage(content=cls.agent.system_prompt),
+                    HumanMessage(content=human_message),
+                ]
+            }
+        elif not cls.agent.interrupt_before:
+            messages = []
+            if agent_graph.checkpointer is not None and (
+                thread.interrupted or thread.failed
+            ):
+                # The user moved on from the interrupted or failed run
+                messages = cancelled_tool_messages(
+                    agent_graph.get_state(thread.config).values.get("messages", [])
                 )
-
-            add_chat_message(
-                agent_name=cls.agent.name, role="human", content=human_message
+            return {"messages": messages + [HumanMessage(content=human_message)]}
+        else:
+            agent_graph.update_state(
+                config=thread.config,
+                values={"messages": [HumanMessage(content=human_message)]}
+                | cls.agent.update_graph_state(human_message),
+                as_node=cls.agent.update_as_node,
             )
+            return None
 
-            for event in agent_graph.stream(
-                input=agent_input,
-                config=config,
-                stream_mode="updates",
-            ):
-                for k, v in event.items():
-                    if cls.agent.nodes_to_display:
-                        if k in cls.agent.nodes_to_display:
-                            display_message(agent_name=cls.agent.name, v=v)
-                    else:
-                        display_message(agent_name=cls.agent.name, v=v)
+    @classmethod
+    def stream_events(cls, agent_graph, human_message=None):
+        """Run the graph on a human message, or resume the interrupted run."""
+        thread = cls.get_thread()
+        config = thread.config
+
+        with tracer.run(
+            cls.agent.name,
+            thread.thread_id,
+            latency_budgets=cls.agent.node_latency_budgets,
+        ) as trace:
+            if human_message:
+                agent_input = cls.get_agent_input(agent_graph, thread, human_message)
+                add_chat_message(
+                    messages=thread.messages, role="human", content=human_message
+                )
+            else:
+                # Nodes completed before the interruption are not run again
+                agent_input = None
+                cancel_metrics.record_resume()
+
+            placeholders = {}
+            status = st.empty()
+            start = time.time()
+
+            def heartbeat():
+                # Streamlit stops the script here once the user moved on
+                status.caption(f"Running for {time.time() - start:.0f}s")
+
+            with thread_registry.run(thread) as token:
+                try:
+                    for mode, event in iterate(
+                        trace.stream(
+                            agent_graph.astream(
+                                input=agent_input,
+                                config=token.config(trace.config(config)),
+                                stream_mode=["messages", "updates"],
+                            )
+                        ),
+                        token=token,
+                        on_idle=heartbeat,
+                    ):
+                        if mode == "messages":
+                            chunk, metadata = event
+                            node = metadata.get("langgraph_node")
+                            if cls.is_node_displayed(node):
+                                stream_message_chunk(
+                                    placeholders=placeholders, node=node, chunk=chunk
+                                )
+                        # Resumed runs replay the updates of completed nodes
+                        elif not event.pop("__metadata__", {}).get("cached"):
+                            for k, v in event.items():
+                                if cls.is_node_displayed(k):
+                                    placeholder, _ = placeholders.pop(k, (None, ""))
+                                    with trace.span("render", k):
+                                        display_message(
+                                            messages=thread.messages,
+                                            v=v,
+                                            placeholder=placeholder,
+                                        )
+                except asyncio.CancelledError:
+                    if not token.cancelled:
+                        raise
+                    st.warning(f"Run {token.reason}", icon="⏹️")
+                status.empty()
+
+    @classmethod
+    def display_traces(cls):
+        if not (traces := tracer.get_traces(cls.get_thread().thread_id)):
+            st.caption("No runs yet")
+            return
+
+        trace = st.selectbox(
+            "Run",
+            traces,
+            format_func=lambda trace: (
+                f"{time.strftime('%H:%M:%S', time.localtime(trace.root.start))} "
+                f"({trace.root.duration:.2f}s)"
+            ),
+        )
+        spans = trace.waterfall()
+        st.vega_lite_chart(
+            spans,
+            {
+                "mark": {"type": "bar", "tooltip": True},
+                "height": 18 * len(spans),
+                "encoding": {
+                    "y": {
+                        "field": "span",
+                        "type": "nominal",
+                        "sort": None,
+                        "title": None,
+                    },
+                    "x": {"field": "start_ms", "type": "quantitative", "title": "ms"},
+                    "x2": {"field": "end_ms"},
+                    "color": {"field": "kind", "type": "nominal"},
+                },
+            },
+            use_container_width=True,
+        )
 
     @classmethod
     def pre_render(cls):
@@ -101,6 +267,8 @@ class BasePage:
             page_title=cls.agent.name, page_icon=cls.page_icon, layout=cls.layout
         )
 
+        start_metrics_server()
+
         st.markdown(
             """
             <style>
@@ -149,7 +317,7 @@ class BasePage:
                 )
 
                 st.image(
-                    agent_graph.get_graph(xray=1).draw_mermaid_png(),
+                    get_graph_image(agent_graph),
                     use_column_width="always",
                 )
 
@@ -158,6 +326,11 @@ class BasePage:
                         st.session_state.uploaded_file = {}
                     if cls.agent.name not in st.session_state.uploaded_file:
                         st.session_state.uploaded_file[cls.agent.name] = None
+                    for key in ["uploaded_file_id", "uploaded_file_hash"]:
+                        if key not in st.session_state:
+                            st.session_state[key] = {}
+                    # Drops the session's file if it was deleted since the last run
+                    cls.get_thread()
 
                     st.markdown(
                         f"<br/><br/><h3 style='color:#E9EFEC;font-family: Poppins;text-align: center'>{cls.file_upload_label}</h3>",
@@ -169,37 +342,47 @@ class BasePage:
                         type=cls.file_upload_type,
                         label_visibility="hidden",
                     ):
-                        if not st.session_state["uploaded_file"][cls.agent.name]:
-                            st.info("Uploading file, please wait...")
-                            with tempfile.NamedTemporaryFile(delete=False) as file:
-                                file.write(uploaded_file.read())
-                                file.flush()
-                                st.session_state["uploaded_file"][
-                                    cls.agent.name
-                                ] = file.name
-
-                            cls.on_file_upload(
-                                uploaded_file=st.session_state["uploaded_file"][
-                                    cls.agent.name
-                                ]
-                            )
-                            st.info("File uploaded successfully")
+                        if (
+                            st.session_state.uploaded_file_id.get(cls.agent.name)
+                            != uploaded_file.file_id
+                        ):
+                            cls.store_uploaded_file(uploaded_file)
 
                         agent_graph = cls.agent.get_graph()
 
-            if "page_messages" not in st.session_state:
-                st.session_state.page_messages = {}
-
-            if cls.agent.name not in st.session_state.page_messages:
-                st.session_state.page_messages[cls.agent.name] = []
-
-            for message in st.session_state.page_messages[cls.agent.name]:
+            with st.sidebar:
+                traces = st.expander("Run traces")
+                with st.expander("Worker metrics"):
+                    st.json(thread_registry.metrics())
+                    st.json(cancel_metrics.metrics())
+                    st.json(tool_metrics.snapshot())
+                    st.json(http_clients.metrics())
+                    st.json(get_llm_cache_store().metrics())
+                    st.json(semantic_cache.metrics())
+                    st.json(compaction_metrics.snapshot())
+                    st.json(upload_store.metrics())
+                    st.json(pdf_extractor.metrics())
+                    st.json(vector_indexes.metrics())
+                    st.json(get_embedding_store().metrics())
+                    st.json(single_flight.metrics())
+                    st.json(rate_limiter.metrics())
+
+            for message in cls.get_thread().messages:
                 with st.chat_message(message["role"]):
                     st.markdown(
                         f"<p class='fontStyle'>{message["content"]}</p>",
                         unsafe_allow_html=True,
                     )
 
+            thread = cls.get_thread()
+            # Graphs without a checkpointer have nothing to resume from
+            if (
+                thread.interrupted
+                and agent_graph.checkpointer is not None
+                and st.button(f"Resume the run ({thread.interrupted})", icon="▶️")
+            ):
+                cls.stream_events(agent_graph=agent_graph)
+
             if human_message := st.chat_input():
                 if (
                     cls.show_file_uploader
@@ -213,6 +396,9 @@ class BasePage:
                         agent_graph=agent_graph, human_message=human_message
                     )
 
+            with traces:
+                cls.display_traces()
+
     @classmethod
     def post_render(cls):
         pass
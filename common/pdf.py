@@ -0,0 +1,184 @@
+import math
+import multiprocessing
+import os
+import threading
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Iterator, Optional
+
+if TYPE_CHECKING:
+    import pypdf
+    from langchain_core.documents import Document
+
+PDF_WORKERS = int(os.environ.get("AGENT_PDF_WORKERS", "0"))
+PDF_MIN_PAGES_PER_WORKER = int(os.environ.get("AGENT_PDF_MIN_PAGES_PER_WORKER", "32"))
+PDF_RANGE_PAGES = int(os.environ.get("AGENT_PDF_RANGE_PAGES", "16"))
+
+# Reader of the last PDF a worker process extracted from, reused across ranges
+_reader: Optional[tuple[str, "pypdf.PdfReader", list[str]]] = None
+
+
+def cpu_count() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def extract_range(path: str, start: int, stop: int) -> list[tuple[int, str, str]]:
+    """Index, label and text of pages `start` to `stop` of a PDF, in a worker."""
+    import pypdf
+
+    global _reader
+    key = f"{path}:{os.stat(path).st_mtime_ns}"
+    if _reader is None or _reader[0] != key:
+        # The file stays open, pages are read from it as they are extracted
+        reader = pypdf.PdfReader(open(path, "rb"))
+        _reader = (key, reader, reader.page_labels)
+    _, reader, labels = _reader
+
+    # Extracted as PyPDFLoader does, so the text does not depend on the mode
+    return [
+        (index, labels[index], reader.pages[index].extract_text().strip())
+        for index in range(start, stop)
+    ]
+
+
+class PdfExtractor:
+    """Extracts the pages of PDFs, in parallel processes for long ones.
+
+    Pages are yielded in order with the metadata PyPDFLoader gives them. A
+    PDF of at least `min_pages_per_worker` pages per worker is split into
+    ranges extracted by a pool of processes, one per CPU unless `workers`
+    is set. At most two ranges per worker are extracted ahead of the page
+    being consumed, so memory does not grow with the page count.
+    """
+
+    def __init__(
+        self,
+        workers: int = PDF_WORKERS,
+        min_pages_per_worker: int = PDF_MIN_PAGES_PER_WORKER,
+        range_pages: int = PDF_RANGE_PAGES,
+    ):
+        self.max_workers = workers or cpu_count()
+        self.min_pages_per_worker = min_pages_per_worker
+        self.range_pages = range_pages
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.broken = False
+        self.documents = 0
+        self.parallel_documents = 0
+        self.pages_extracted = 0
+        self.lock = threading.Lock()
+
+    def workers(self, pages: int) -> int:
+        if self.broken:
+            return 1
+        return max(1, min(self.max_workers, pages // self.min_pages_per_worker))
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                # Forking the threads of the app could deadlock the workers
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self.executor
+
+    def pages(self, path: str) -> Iterator["Document"]:
+        from langchain_community.document_loaders import PyPDFLoader
+
+        loader = PyPDFLoader(path).lazy_load()
+        try:
+            first = next(loader, None)
+            if first is None:
+                return
+            with self.lock:
+                self.documents += 1
+                self.pages_extracted += 1
+            yield first
+
+            total = first.metadata["total_pages"]
+            workers = self.workers(total)
+            if workers == 1:
+                for page in loader:
+                    with self.lock:
+                        self.pages_extracted += 1
+                    yield page
+                return
+        finally:
+            loader.close()
+
+        with self.lock:
+            self.parallel_documents += 1
+        yield from self.parallel_pages(path, first, total, workers)
+
+    def parallel_pages(
+        self, path: str, first: "Document", total: int, workers: int
+    ) -> Iterator["Document"]:
+        from langchain_core.documents import Document
+
+        executor = self.get_executor()
+        metadata = {
+            key: value
+            for key, value in first.metadata.items()
+            if key not in ("page", "page_label")
+        }
+
+        # Small enough that every worker gets ranges to extract
+        size = max(1, min(self.range_pages, math.ceil((total - 1) / workers)))
+        ranges = iter(
+            (start, min(start + size, total)) for start in range(1, total, size)
+        )
+        pending = deque()
+
+        def submit():
+            if (page_range := next(ranges, None)) is not None:
+                future = (
+                    None
+                    if self.broken
+                    else executor.submit(extract_range, path, *page_range)
+                )
+                pending.append((page_range, future))
+
+        try:
+            for _ in range(2 * workers):
+                submit()
+            while pending:
+                page_range, future = pending.popleft()
+                try:
+                    if future is None:
+                        raise BrokenProcessPool
+                    rows = future.result()
+                except BrokenProcessPool as e:
+                    # E.g. spawned from a main module without a __main__ guard
+                    if not self.broken:
+                        warnings.warn(f"PDF extraction falls back to one process: {e}")
+                        self.broken = True
+                    rows = extract_range(path, *page_range)
+                submit()
+                with self.lock:
+                    self.pages_extracted += len(rows)
+                for index, label, text in rows:
+                    yield Document(
+                        page_content=text,
+                        metadata=metadata | {"page": index, "page_label": label},
+                    )
+        finally:
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "max_workers": self.max_workers,
+                "broken_pool": self.broken,
+                "documents": self.documents,
+                "parallel_documents": self.parallel_documents,
+                "pages_extracted": self.pages_extracted,
+            }
+
+
+pdf_extractor = PdfExtractor()
@@ -0,0 +1,464 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import heapq
+import inspect
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+RATE_LIMIT = os.environ.get("AGENT_RATE_LIMIT", "1") == "1"
+
+# Requests and tokens per minute and initial concurrency per provider host,
+# or host and path prefix for endpoints with limits of their own, the most
+# specific applies. AGENT_RATE_LIMITS overrides them with JSON of the same shape
+RATE_LIMITS = {
+    "api.openai.com": {"rpm": 500, "tpm": 30000, "concurrency": 8},
+    "api.openai.com/v1/embeddings": {"rpm": 3000, "tpm": 1000000, "concurrency": 8},
+    "api.tavily.com": {"rpm": 100, "concurrency": 4},
+}
+for host, limits in json.loads(os.environ.get("AGENT_RATE_LIMITS", "{}")).items():
+    RATE_LIMITS[host] = RATE_LIMITS.get(host, {}) | limits
+
+RATE_LIMIT_MAX_CONCURRENCY = int(
+    os.environ.get("AGENT_RATE_LIMIT_MAX_CONCURRENCY", "64")
+)
+# Share of a provider's concurrency background work may take
+RATE_LIMIT_BACKGROUND_SHARE = float(
+    os.environ.get("AGENT_RATE_LIMIT_BACKGROUND_SHARE", "0.75")
+)
+# Latency over this multiple of the baseline is taken as a sign of overload
+RATE_LIMIT_LATENCY_TOLERANCE = float(
+    os.environ.get("AGENT_RATE_LIMIT_LATENCY_TOLERANCE", "3")
+)
+# Seconds of the per minute rates that may be used in a burst
+RATE_LIMIT_BURST_SECONDS = 10
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = {INTERACTIVE: 0, BACKGROUND: 1}
+
+current_priority = contextvars.ContextVar("rate_limit_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def lane(priority: str):
+    """Run outbound calls made in the block in the given priority lane."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def background(func):
+    """Run the outbound calls of a graph node in the background lane."""
+    if inspect.iscoroutinefunction(func):
+
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with lane(BACKGROUND):
+                return await func(*args, **kwargs)
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with lane(BACKGROUND):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, burst_seconds: float):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available, capped at the capacity."""
+        self.refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+
+@dataclass(order=True)
+class Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: concurrent.futures.Future = field(
+        compare=False, default_factory=concurrent.futures.Future
+    )
+
+
+@dataclass
+class Permit:
+    priority: int
+    started: float = field(default_factory=time.monotonic)
+    released: bool = False
+
+
+class ProviderLimiter:
+    """Outbound calls to one provider, paced and bounded.
+
+    Calls wait for a slot of the adaptive concurrency limit and for the
+    request and token buckets, interactive calls before background ones.
+    The limit grows by one per limit of successful calls, and is halved on
+    429 responses, when calls also pause for Retry-After, or cut by a tenth
+    when latency exceeds `latency_tolerance` times its baseline. Baselines
+    are kept per kind of request, as the time to the first byte of a
+    streamed completion is not comparable to a whole generation.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: float = None,
+        tpm: float = None,
+        concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_concurrency: int = RATE_LIMIT_MAX_CONCURRENCY,
+        background_share: float = RATE_LIMIT_BACKGROUND_SHARE,
+        latency_tolerance: float = RATE_LIMIT_LATENCY_TOLERANCE,
+        burst_seconds: float = RATE_LIMIT_BURST_SECONDS,
+    ):
+        self.name = name
+        self.requests = TokenBucket(rpm, burst_seconds) if rpm else None
+        self.tokens = TokenBucket(tpm, burst_seconds) if tpm else None
+        self.concurrency = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.background_share = background_share
+        self.latency_tolerance = latency_tolerance
+
+        self.waiters: list[Waiter] = []
+        self.seq = itertools.count()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.latency: Optional[float] = None
+        # Smoothed and lowest latency per kind of request
+        self.latencies: dict[Optional[str], float] = {}
+        self.baselines: dict[Optional[str], float] = {}
+        self.last_decrease = 0.0
+        self.timer: Optional[threading.Timer] = None
+
+        self.granted = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.wait_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def slots(self, priority: int) -> int:
+        limit = max(self.min_concurrency, int(self.concurrency))
+        if priority == PRIORITIES[BACKGROUND]:
+            return max(1, int(limit * self.background_share))
+        return limit
+
+    def dispatch(self):
+        """Grant waiting calls in priority order.
+
+        A call blocked by a pause or a bucket is granted by a timer once it
+        may be, one blocked by the concurrency limit when a call finishes.
+        """
+        with self.lock:
+            now = time.monotonic()
+            while self.waiters:
+                waiter = self.waiters[0]
+                if waiter.future.cancelled():
+                    heapq.heappop(self.waiters)
+                    continue
+                if self.in_flight >= self.slots(waiter.priority):
+                    return
+
+                delay = max(
+                    self.paused_until - now,
+                    self.requests.delay(1, now) if self.requests else 0.0,
+                    self.tokens.delay(waiter.tokens, now) if self.tokens else 0.0,
+                )
+                if delay > 0:
+                    self.wake_in(delay)
+                    return
+
+                heapq.heappop(self.waiters)
+                # Cancelled from its loop without the lock, it can't be anymore
+                if not waiter.future.set_running_or_notify_cancel():
+                    continue
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(waiter.tokens)
+                self.in_flight += 1
+                self.granted += 1
+                waiter.future.set_result(Permit(priority=waiter.priority))
+
+    def wake_in(self, delay: float):
+        if self.timer is None:
+            self.timer = threading.Timer(delay, self.wake)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def wake(self):
+        with self.lock:
+            self.timer = None
+        self.dispatch()
+
+    def enqueue(self, tokens: int, priority: str) -> Waiter:
+        waiter = Waiter(
+            priority=PRIORITIES[priority], seq=next(self.seq), tokens=tokens
+        )
+        with self.lock:
+            heapq.heappush(self.waiters, waiter)
+        return waiter
+
+    def abandon(self, waiter: Waiter):
+        with self.lock:
+            if waiter.future.cancel():
+                return
+        # Granted meanwhile, give the slot back
+        self.release(waiter.future.result())
+
+    def waited(self, start: float):
+        with self.lock:
+            self.wait_seconds += time.monotonic() - start
+
+    async def acquire(self, tokens: int = 1, priority: str = None) -> Permit:
+        start = time.monotonic()
+        waiter = self.enqueue(tokens, priority or current_priority.get())
+        self.dispatch()
+        try:
+            permit = await asyncio.wrap_future(waiter.future)
+        except BaseException:
+            self.abandon(waiter)
+            raise
+        self.waited(start)
+        return permit
+
+    def acquire_sync(self, tokens: int = 1, priority: str = None) -> Permit:
+        start = time.monotonic()
+        waiter = self.enqueue(tokens, priority or current_priority.get())
+        self.dispatch()
+        try:
+            permit = waiter.future.result()
+        except BaseException:
+            self.abandon(waiter)
+            raise
+        self.waited(start)
+        return permit
+
+    def release(self, permit: Permit):
+        with self.lock:
+            if permit.released:
+                return
+            permit.released = True
+            self.in_flight -= 1
+        self.dispatch()
+
+    def observe(
+        self,
+        status_code: int,
+        headers=None,
+        latency: float = None,
+        kind: str = None,
+    ):
+        """Adapt to the status, rate limit headers and latency of a response."""
+        with self.lock:
+            now = time.monotonic()
+            if status_code == 429:
+                self.throttled += 1
+                self.paused_until = max(
+                    self.paused_until, now + retry_after(headers or {})
+                )
+                self.decrease(now, 0.5)
+            elif status_code is not None and status_code < 500:
+                self.sync_remaining(headers or {})
+                if latency is not None:
+                    self.observe_latency(latency, now, kind)
+
+    def decrease(self, now: float, factor: float):
+        # Once per round trip, a burst of signals is one congestion event
+        if now - self.last_decrease < (self.latency or 1.0):
+            return
+        self.concurrency = max(self.min_concurrency, self.concurrency * factor)
+        self.last_decrease = now
+        self.decreases += 1
+
+    def observe_latency(self, latency: float, now: float, kind: str = None):
+        self.latency = (
+            latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+        )
+        smoothed = self.latencies[kind] = (
+            0.8 * self.latencies.get(kind, latency) + 0.2 * latency
+        )
+        # Lowest latency seen, drifting up so that it follows slower workloads
+        baseline = self.baselines[kind] = min(
+            latency, self.baselines.get(kind, latency) * 1.01
+        )
+        if smoothed > self.latency_tolerance * baseline:
+            self.decrease(now, 0.9)
+        else:
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1 / self.concurrency
+            )
+
+    def sync_remaining(self, headers):
+        """Lower the buckets to the remaining quota reported by the provider."""
+        for bucket, header in [
+            (self.requests, "x-ratelimit-remaining-requests"),
+            (self.tokens, "x-ratelimit-remaining-tokens"),
+        ]:
+            if bucket and headers.get(header, "").isdigit():
+                bucket.level = min(bucket.level, float(headers[header]))
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "concurrency": round(self.concurrency, 2),
+                "in_flight": self.in_flight,
+                "waiting": sum(
+                    not waiter.future.cancelled() for waiter in self.waiters
+                ),
+                "granted": self.granted,
+                "throttled": self.throttled,
+                "decreases": self.decreases,
+                "wait_s": round(self.wait_seconds, 3),
+                "latency_s": self.latency and round(self.latency, 3),
+                "requests_available": self.requests and round(self.requests.level, 1),
+                "tokens_available": self.tokens and round(self.tokens.level, 1),
+            }
+
+
+def status_of(error: BaseException) -> Optional[int]:
+    """HTTP status of an error raised by an HTTP client, if any."""
+    for source in (error, getattr(error, "response", None)):
+        for attribute in ("status_code", "status"):
+            if isinstance(status := getattr(source, attribute, None), int):
+                return status
+    return None
+
+
+def input_tokens(value) -> int:
+    """Tokens of an embedding input, text or token ids, one or a list."""
+    if isinstance(value, str):
+        return len(value) // 4 + 1
+    if isinstance(value, list):
+        if value and all(isinstance(item, int) for item in value):
+            return len(value)
+        return sum(input_tokens(item) for item in value)
+    return 1
+
+
+def estimate_tokens(body: bytes, completion: bool = True) -> int:
+    """Tokens a JSON request counts against a tokens per minute limit.
+
+    Completion requests count their prompt and the tokens they may
+    generate, other requests such as embeddings only their input.
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        return 1
+    if not isinstance(payload, dict):
+        return 1
+    if not completion:
+        return input_tokens(payload.get("input"))
+    max_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens")
+    # About four characters per prompt token
+    return len(body) // 4 + (max_tokens or 1000)
+
+
+def retry_after(headers) -> float:
+    if value := headers.get("retry-after-ms"):
+        return float(value) / 1000
+    try:
+        return float(headers.get("retry-after", 1))
+    except ValueError:
+        return 1.0
+
+
+class RateLimiterRegistry:
+    """Process-wide limiters of outbound calls, one per provider host or endpoint."""
+
+    def __init__(self, limits: dict = None, enabled: bool = RATE_LIMIT):
+        self.limits = RATE_LIMITS if limits is None else limits
+        self.enabled = enabled
+        self.limiters: dict[str, ProviderLimiter] = {}
+        self.lock = threading.Lock()
+
+    def key(self, host: str, path: str = "") -> Optional[str]:
+        """The most specific limits of a request, by host and path prefix."""
+        url = f"{host}{path}"
+        keys = [
+            key
+            for key in self.limits
+            if url == key or url.startswith(key if "/" in key else f"{key}/")
+        ]
+        return max(keys, key=len, default=host if host in self.limits else None)
+
+    def get(self, host: str, path: str = "") -> Optional[ProviderLimiter]:
+        if not self.enabled or (key := self.key(host, path)) is None:
+            return None
+        with self.lock:
+            if key not in self.limiters:
+                self.limiters[key] = ProviderLimiter(key, **self.limits[key])
+            return self.limiters[key]
+
+    @asynccontextmanager
+    async def limit(self, host: str, tokens: int = 1):
+        """Hold a slot of `host` for a call not made through the shared clients."""
+        limiter = self.get(host)
+        if limiter is None:
+            yield
+            return
+
+        permit = await limiter.acquire(tokens)
+        try:
+            yield
+        except Exception as e:
+            limiter.observe(status_of(e))
+            raise
+        else:
+            limiter.observe(200, latency=time.monotonic() - permit.started)
+        finally:
+            limiter.release(permit)
+
+    @contextmanager
+    def limit_sync(self, host: str, tokens: int = 1):
+        limiter = self.get(host)
+        if limiter is None:
+            yield
+            return
+
+        permit = limiter.acquire_sync(tokens)
+        try:
+            yield
+        except Exception as e:
+            limiter.observe(status_of(e))
+            raise
+        else:
+            limiter.observe(200, latency=time.monotonic() - permit.started)
+        finally:
+            limiter.release(permit)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            limiters = dict(self.limiters)
+        return {host: limiter.metrics() for host, limiter in limiters.items()}
+
+
+rate_limiter = RateLimiterRegistry()
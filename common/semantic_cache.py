@@ -0,0 +1,267 @@
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import faiss
+
+SEMANTIC_CACHE = os.environ.get("AGENT_SEMANTIC_CACHE", "1") == "1"
+SEMANTIC_CACHE_THRESHOLD = float(
+    os.environ.get("AGENT_SEMANTIC_CACHE_THRESHOLD", "0.85")
+)
+SEMANTIC_CACHE_MAX_ENTRIES = int(
+    os.environ.get("AGENT_SEMANTIC_CACHE_MAX_ENTRIES", "1000")
+)
+SEMANTIC_CACHE_TTL_SECONDS = int(
+    os.environ.get("AGENT_SEMANTIC_CACHE_TTL_SECONDS", "86400")
+)
+
+EMBEDDING_DIM = 1024
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "give", "i", "in",
+    "is", "it", "me", "of", "on", "please", "s", "show", "tell", "the", "to",
+    "what", "whats", "which", "with", "you",
+}  # fmt: skip
+
+
+def embed_question(question: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Local embedding of a question, hashed word and character trigram counts.
+
+    Deterministic across processes and free of any API call, so a lookup
+    costs microseconds. It captures lexical paraphrases (reordering, filler
+    words, inflections), not synonyms.
+    """
+    words = [
+        word
+        for word in re.findall(r"[a-z0-9]+", question.lower())
+        if word not in STOP_WORDS
+    ]
+    features = words + [
+        f"{word[i:i + 3]}#" for word in words for i in range(max(len(word) - 2, 1))
+    ]
+
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in features:
+        vector[zlib.crc32(feature.encode()) % dim] += 1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def key_terms(question: str) -> tuple[set[str], set[str]]:
+    """Numbers and entities of a question, the terms its answer depends on.
+
+    Entities are tickers, capitalised words past the first and quoted
+    phrases, lowercased. Questions differing only in one of these embed
+    close together but have different answers.
+    """
+    numbers = set(re.findall(r"\d+(?:\.\d+)?", question))
+    entities = {
+        phrase.lower().strip()
+        for phrase in re.findall(r"[\"“]([^\"”]+)[\"”]", question)
+    }
+    entities.update(
+        word.lower()
+        for word in re.findall(r"\b[A-Z][A-Za-z0-9&]*", question)[1:]
+        if word != "I"
+    )
+    if question[:1].isupper() and re.match(r"[A-Z0-9&]{2,}\b", question):
+        entities.add(re.match(r"[A-Z0-9&]+", question).group().lower())
+    return numbers, entities
+
+
+def same_key_terms(question: str, other: str) -> bool:
+    """Whether two questions share their numbers and mention each other's entities."""
+    numbers, entities = key_terms(question)
+    other_numbers, other_entities = key_terms(other)
+    if numbers != other_numbers:
+        return False
+
+    def mentions(text: str, entity: str) -> bool:
+        words = " ".join(re.findall(r"[a-z0-9&]+", text.lower()))
+        return f" {entity} " in f" {words} "
+
+    return all(mentions(other, entity) for entity in entities) and all(
+        mentions(question, entity) for entity in other_entities
+    )
+
+
+def source_fingerprint(source: Optional[str]) -> str:
+    if not source or not os.path.exists(source):
+        return ""
+    stat = os.stat(source)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+@dataclass
+class CacheEntry:
+    question: str
+    answer: str
+    expires_at: float
+
+
+def new_index():
+    import faiss
+
+    return faiss.IndexIDMap(faiss.IndexFlatIP(EMBEDDING_DIM))
+
+
+@dataclass
+class CacheScope:
+    fingerprint: str
+    index: "faiss.IndexIDMap" = field(default_factory=new_index)
+    entries: OrderedDict[int, CacheEntry] = field(default_factory=OrderedDict)
+    next_id: int = 0
+
+
+class SemanticCache:
+    """Answers to earlier questions, found by embedding similarity.
+
+    Entries are scoped per agent and data source. A scope is dropped when
+    its source file changes on disk, expired entries are removed on lookup
+    and the least recently hit entries are evicted beyond `max_entries` per
+    scope. A lookup hits when the cosine similarity of an earlier question
+    reaches `threshold` and both questions have the same `key_terms`, so
+    "top 5" never answers "top 10".
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+        embed=embed_question,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embed = embed
+        self.scopes: dict[tuple[str, str], CacheScope] = {}
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+        self.key_term_misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def get_scope(self, agent_name: str, source: Optional[str]) -> CacheScope:
+        key = (agent_name, source or "")
+        fingerprint = source_fingerprint(source)
+
+        scope = self.scopes.get(key)
+        if scope is None:
+            # Replaced uploads leave their scopes stale, drop them with this one
+            for other_key, other in list(self.scopes.items()):
+                if other_key[0] == agent_name and other.fingerprint != (
+                    source_fingerprint(other_key[1])
+                ):
+                    del self.scopes[other_key]
+                    self.invalidations += 1
+        elif scope.fingerprint != fingerprint:
+            self.invalidations += 1
+            scope = None
+
+        if scope is None:
+            scope = self.scopes[key] = CacheScope(fingerprint=fingerprint)
+        return scope
+
+    def remove(self, scope: CacheScope, entry_id: int):
+        scope.entries.pop(entry_id, None)
+        scope.index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def lookup(
+        self,
+        agent_name: str,
+        source: Optional[str],
+        question: str,
+        threshold: float = None,
+    ) -> Optional[str]:
+        vector = self.embed(question)
+
+        with self.lock:
+            scope = self.get_scope(agent_name, source)
+
+            answer = None
+            if scope.entries:
+                # The closest question may differ in a key term where the next does not
+                scores, ids = scope.index.search(
+                    vector[None, :], min(4, len(scope.entries))
+                )
+                for score, entry_id in zip(scores[0].tolist(), ids[0].tolist()):
+                    entry = scope.entries.get(entry_id)
+                    if entry is None or score < (threshold or self.threshold):
+                        continue
+                    if entry.expires_at < time.time():
+                        self.remove(scope, entry_id)
+                    elif same_key_terms(question, entry.question):
+                        scope.entries.move_to_end(entry_id)
+                        answer = entry.answer
+                        break
+                    else:
+                        self.key_term_misses += 1
+
+            if answer is None:
+                self.misses[agent_name] += 1
+            else:
+                self.hits[agent_name] += 1
+            return answer
+
+    def update(
+        self,
+        agent_name: str,
+        source: Optional[str],
+        question: str,
+        answer: str,
+        ttl_seconds: int = None,
+    ):
+        vector = self.embed(question)
+
+        with self.lock:
+            scope = self.get_scope(agent_name, source)
+
+            entry_id = scope.next_id
+            scope.next_id += 1
+            scope.index.add_with_ids(vector[None, :], np.array([entry_id]))
+            scope.entries[entry_id] = CacheEntry(
+                question=question,
+                answer=answer,
+                expires_at=time.time() + (ttl_seconds or self.ttl_seconds),
+            )
+
+            while len(scope.entries) > self.max_entries:
+                self.remove(scope, next(iter(scope.entries)))
+
+    def clear(self):
+        with self.lock:
+            self.scopes.clear()
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "entries": sum(len(scope.entries) for scope in self.scopes.values()),
+                "invalidations": self.invalidations,
+                "key_term_misses": self.key_term_misses,
+                "agents": {
+                    agent_name: {
+                        "hits": self.hits[agent_name],
+                        "misses": self.misses[agent_name],
+                    }
+                    for agent_name in {**self.hits, **self.misses}
+                },
+            }
+
+
+semantic_cache = SemanticCache()
+
+
+def first_question(state) -> Optional[str]:
+    """The question of a single-turn conversation, later turns depend on context."""
+    questions = [message for message in state["messages"] if message.type == "human"]
+    return questions[0].content if len(questions) == 1 else None
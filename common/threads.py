@@ -0,0 +1,172 @@
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from common.cancellation import CancelToken
+from common.checkpoint import get_checkpointer, get_thread_size
+from common.uploads import upload_store
+
+THREADS_MAX_BYTES = int(os.environ.get("AGENT_THREADS_MAX_BYTES", 256 * 1024 * 1024))
+THREADS_IDLE_SECONDS = int(os.environ.get("AGENT_THREADS_IDLE_SECONDS", "3600"))
+THREADS_MIN_IDLE_SECONDS = int(os.environ.get("AGENT_THREADS_MIN_IDLE_SECONDS", "60"))
+
+
+def messages_size(messages) -> int:
+    return sum(sys.getsizeof(message.get("content", "")) for message in messages)
+
+
+@dataclass
+class ConversationThread:
+    session_id: str
+    agent_name: str
+    thread_id: str
+    messages: list[dict] = field(default_factory=list)
+    last_access: float = field(default_factory=time.time)
+    checkpoint_bytes: int = 0
+    active: int = 0
+    token: CancelToken = None
+    # Why the last run stopped early, it can be resumed from its checkpoint
+    interrupted: str = None
+    # The last run raised, running it again would raise again
+    failed: bool = False
+
+    @property
+    def config(self):
+        return {"configurable": {"thread_id": self.thread_id}}
+
+    @property
+    def bytes(self) -> int:
+        return messages_size(self.messages) + self.checkpoint_bytes
+
+
+class ThreadRegistry:
+    """Per-session, per-agent conversation threads with LRU eviction.
+
+    Threads idle for longer than `idle_seconds` are evicted, and least
+    recently used idle threads are evicted while the bytes held by all
+    threads exceed `max_bytes`. Eviction drops the thread's checkpoints and
+    its chat history.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = THREADS_MAX_BYTES,
+        idle_seconds: int = THREADS_IDLE_SECONDS,
+        min_idle_seconds: int = THREADS_MIN_IDLE_SECONDS,
+    ):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.min_idle_seconds = min_idle_seconds
+        self.threads: OrderedDict[tuple[str, str], ConversationThread] = OrderedDict()
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+    def get_thread(self, session_id: str, agent_name: str) -> ConversationThread:
+        key = (session_id, agent_name)
+
+        with self.lock:
+            if key not in self.threads:
+                self.threads[key] = ConversationThread(
+                    session_id=session_id,
+                    agent_name=agent_name,
+                    thread_id=f"{agent_name}:{uuid.uuid4().hex}",
+                )
+
+            thread = self.threads[key]
+            thread.last_access = time.time()
+            self.threads.move_to_end(key)
+            self.evict(keep=thread)
+
+            return thread
+
+    @contextmanager
+    def run(self, thread: ConversationThread):
+        """Run on `thread`, cancelling its previous run, with a cancel token."""
+        token = CancelToken()
+        failed = False
+        with self.lock:
+            previous, thread.token = thread.token, token
+            thread.active += 1
+            thread.interrupted = None
+            thread.failed = False
+        if previous is not None:
+            previous.cancel("superseded")
+
+        try:
+            yield token
+        except Exception:
+            # Not when raised by a cancelled run, which can still be resumed
+            failed = token.cancel("failed")
+            raise
+        except BaseException:
+            token.cancel("interrupted")
+            raise
+        finally:
+            checkpointer = get_checkpointer()
+            if token.cancelled and hasattr(checkpointer, "flush"):
+                # Keep the writes of the nodes that completed before the cancel
+                checkpointer.flush()
+            checkpoint_bytes = get_thread_size(checkpointer, thread.thread_id)
+            with self.lock:
+                if thread.token is token:
+                    thread.token = None
+                    thread.failed = failed
+                    thread.interrupted = None if failed else token.reason
+                thread.active -= 1
+                thread.last_access = time.time()
+                thread.checkpoint_bytes = checkpoint_bytes
+                self.evict(keep=thread)
+
+    def bytes_held(self) -> int:
+        with self.lock:
+            return sum(thread.bytes for thread in self.threads.values())
+
+    def evict(self, keep: ConversationThread = None):
+        with self.lock:
+            now = time.time()
+            bytes_held = self.bytes_held()
+
+            for key, thread in list(self.threads.items()):
+                idle = now - thread.last_access
+                if thread is keep or thread.active or idle < self.min_idle_seconds:
+                    continue
+                if idle > self.idle_seconds or bytes_held > self.max_bytes:
+                    bytes_held -= thread.bytes
+                    self.remove(key)
+
+    def remove(self, key: tuple[str, str]):
+        with self.lock:
+            thread = self.threads.pop(key, None)
+            if thread is None:
+                return
+            self.evictions += 1
+
+        if thread.token is not None:
+            thread.token.cancel("evicted")
+
+        upload_store.release(thread.thread_id)
+
+        checkpointer = get_checkpointer()
+        if hasattr(checkpointer, "delete_thread"):
+            checkpointer.delete_thread(thread.thread_id)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "live_threads": len(self.threads),
+                "live_sessions": len({key[0] for key in self.threads}),
+                "bytes_held": self.bytes_held(),
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "active_runs": sum(
+                    thread.token is not None for thread in self.threads.values()
+                ),
+            }
+
+
+thread_registry = ThreadRegistry()
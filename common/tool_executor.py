@@ -0,0 +1,160 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from typing import Sequence
+
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import BaseTool
+
+TOOL_MAX_CONCURRENCY = int(os.environ.get("AGENT_TOOL_MAX_CONCURRENCY", "8"))
+TOOL_TIMEOUT_SECONDS = float(os.environ.get("AGENT_TOOL_TIMEOUT_SECONDS", "60"))
+
+LATENCY_WINDOW = 1000
+
+
+class ToolMetrics:
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.timeouts = defaultdict(int)
+        self.cancelled = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+        self.in_flight = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def start(self, name: str):
+        with self.lock:
+            self.in_flight[name] += 1
+
+    def record(self, name: str, seconds: float, status: str = "success"):
+        with self.lock:
+            self.in_flight[name] -= 1
+            self.calls[name] += 1
+            self.latencies[name].append(seconds)
+            if status == "error":
+                self.errors[name] += 1
+            elif status == "timeout":
+                self.timeouts[name] += 1
+            elif status == "cancelled":
+                self.cancelled[name] += 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            metrics = {}
+            for name, latencies in self.latencies.items():
+                ordered = sorted(latencies)
+                metrics[name] = {
+                    "calls": self.calls[name],
+                    "errors": self.errors[name],
+                    "timeouts": self.timeouts[name],
+                    "cancelled": self.cancelled[name],
+                    "in_flight": self.in_flight[name],
+                    "mean_ms": round(1000 * sum(ordered) / len(ordered), 1),
+                    "p95_ms": round(1000 * ordered[int(0.95 * (len(ordered) - 1))], 1),
+                    "max_ms": round(1000 * ordered[-1], 1),
+                }
+            return metrics
+
+
+tool_metrics = ToolMetrics()
+
+
+class ToolExecutor:
+    """Graph node running the tool calls of the last AI message concurrently.
+
+    At most `max_concurrency` calls run at once per event loop, further capped
+    per tool by `tool_concurrency`. Calls exceeding their timeout or raising
+    are answered with an error `ToolMessage`, so the LLM can recover. Results
+    are returned in the order of the tool calls.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool],
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        tool_concurrency: dict[str, int] = None,
+        timeout: float = TOOL_TIMEOUT_SECONDS,
+        tool_timeouts: dict[str, float] = None,
+        metrics: ToolMetrics = tool_metrics,
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.max_concurrency = max_concurrency
+        self.tool_concurrency = tool_concurrency or {}
+        self.timeout = timeout
+        self.tool_timeouts = tool_timeouts or {}
+        self.metrics = metrics
+        # asyncio primitives are bound to the loop they are first used on
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def get_semaphore(self, name: str = None):
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        if name is None:
+            limit = self.max_concurrency
+        elif name in self.tool_concurrency:
+            limit = self.tool_concurrency[name]
+        else:
+            return contextlib.nullcontext()
+        if name not in semaphores:
+            semaphores[name] = asyncio.Semaphore(limit)
+        return semaphores[name]
+
+    async def run_tool_call(self, tool_call) -> ToolMessage:
+        name = tool_call["name"]
+
+        if name not in self.tools:
+            return ToolMessage(
+                content=f"Error: {name} is not a valid tool, try one of [{', '.join(self.tools)}].",
+                name=name,
+                tool_call_id=tool_call["id"],
+                status="error",
+            )
+
+        timeout = self.tool_timeouts.get(name, self.timeout)
+
+        # Take the tool's own slot first so waiting calls don't hold a shared one
+        async with self.get_semaphore(name), self.get_semaphore():
+            self.metrics.start(name)
+            start = time.perf_counter()
+            status = "success"
+            try:
+                message = await asyncio.wait_for(
+                    self.tools[name].ainvoke({**tool_call, "type": "tool_call"}),
+                    timeout=timeout,
+                )
+            except asyncio.CancelledError:
+                status = "cancelled"
+                raise
+            except asyncio.TimeoutError:
+                status = "timeout"
+                message = ToolMessage(
+                    content=f"Error: {name} timed out after {timeout}s.",
+                    name=name,
+                    tool_call_id=tool_call["id"],
+                    status="error",
+                )
+            except Exception as e:
+                status = "error"
+                message = ToolMessage(
+                    content=f"Error: {repr(e)}\n Please fix your mistakes.",
+                    name=name,
+                    tool_call_id=tool_call["id"],
+                    status="error",
+                )
+            finally:
+                self.metrics.record(name, time.perf_counter() - start, status)
+
+        return message
+
+    async def __call__(self, state):
+        message = state["messages"][-1]
+        if not isinstance(message, AIMessage):
+            raise ValueError("No AIMessage found in input")
+
+        results = await asyncio.gather(
+            *(self.run_tool_call(tool_call) for tool_call in message.tool_calls)
+        )
+        return {"messages": list(results)}
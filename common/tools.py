@@ -1,29 +1,38 @@
-from langchain_community.document_loaders import WikipediaLoader
-from langchain_community.tools import TavilySearchResults
-from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+from common.coalesce import coalesce
+from common.rate_limit import rate_limiter
 
+TAVILY_HOST = "api.tavily.com"
 
+
+@coalesce("tavily_search")
 def tavily_search(query, tavily_api_key, max_results=3):
     """Retrieve docs from web search"""
+    from langchain_community.tools import TavilySearchResults
+    from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+    with rate_limiter.limit_sync(TAVILY_HOST):
+        docs = TavilySearchResults(
+            max_results=max_results,
+            api_wrapper=TavilySearchAPIWrapper(tavily_api_key=tavily_api_key),
+        ).invoke(query)
+
     return {
         "context": [
             "\n\n---\n\n".join(
                 [
                     f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
-                    for doc in TavilySearchResults(
-                        max_results=max_results,
-                        api_wrapper=TavilySearchAPIWrapper(
-                            tavily_api_key=tavily_api_key
-                        ),
-                    ).invoke(query)
+                    for doc in docs
                 ]
             )
         ]
     }
 
 
+@coalesce("wikipedia_search")
 def wikipedia_search(query, load_max_docs=2):
     """Retrieve docs from wikipedia"""
+    from langchain_community.document_loaders import WikipediaLoader
+
     return {
         "context": [
             "\n\n---\n\n".join(
@@ -37,3 +46,47 @@ def wikipedia_search(query, load_max_docs=2):
             )
         ]
     }
+
+
+@coalesce("tavily_search")
+async def atavily_search(query, tavily_api_key, max_results=3):
+    """Retrieve docs from web search"""
+    from langchain_community.tools import TavilySearchResults
+    from langchain_community.utilities.tavily_search import TavilySearchAPIWrapper
+
+    async with rate_limiter.limit(TAVILY_HOST):
+        docs = await TavilySearchResults(
+            max_results=max_results,
+            api_wrapper=TavilySearchAPIWrapper(tavily_api_key=tavily_api_key),
+        ).ainvoke(query)
+
+    return {
+        "context": [
+            "\n\n---\n\n".join(
+                [
+                    f'<Document href="{doc["url"]}"/>\n{doc["content"]}\n</Document>'
+                    for doc in docs
+                ]
+            )
+        ]
+    }
+
+
+@coalesce("wikipedia_search")
+async def awikipedia_search(query, load_max_docs=2):
+    """Retrieve docs from wikipedia"""
+    from langchain_community.document_loaders import WikipediaLoader
+
+    return {
+        "context": [
+            "\n\n---\n\n".join(
+                [
+                    f'<Document source="{doc.metadata["source"]}" page="{doc.metadata.get("page", "")}"/>\n{doc.page_content}\n</Document>'
+                    for doc in await WikipediaLoader(
+                        query=query,
+                        load_max_docs=load_max_docs,
+                    ).aload()
+                ]
+            )
+        ]
+    }
@@ -0,0 +1,656 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+import warnings
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage
+from pydantic import BaseModel
+
+TRACING = os.environ.get("AGENT_TRACING", "1") == "1"
+TRACE_FILE = os.environ.get("AGENT_TRACE_FILE", ".cache/traces.jsonl")
+TRACE_MAX_TRACES = int(os.environ.get("AGENT_TRACE_MAX_TRACES", "200"))
+TRACE_FILE_MAX_BYTES = int(
+    os.environ.get("AGENT_TRACE_FILE_MAX_BYTES", 64 * 1024 * 1024)
+)
+TRACE_FILE_BACKUPS = int(os.environ.get("AGENT_TRACE_FILE_BACKUPS", "3"))
+METRICS_HOST = os.environ.get("AGENT_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("AGENT_METRICS_PORT", "9464"))
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+# Async checkpointer methods may delegate to the sync ones
+in_checkpoint = contextvars.ContextVar("in_checkpoint", default=False)
+
+
+def payload_size(value) -> int:
+    """Approximate size in characters of a node, LLM or tool payload."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, BaseMessage):
+        return payload_size(value.content) + payload_size(
+            getattr(value, "tool_calls", None) or []
+        )
+    if isinstance(value, dict):
+        return sum(payload_size(item) for item in value.values())
+    if isinstance(value, (list, tuple, set)):
+        return sum(payload_size(item) for item in value)
+    if isinstance(value, BaseModel):
+        return payload_size(value.model_dump())
+    if hasattr(value, "page_content"):
+        return len(value.page_content)
+    if isinstance(value, (int, float, bool)):
+        return len(str(value))
+    return 0
+
+
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    kind: str
+    name: str
+    start: float
+    end: Optional[float] = None
+    status: str = "ok"
+    error: Optional[str] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.time()) - self.start
+
+    def finish(self, error: BaseException = None, **attributes):
+        self.end = time.time()
+        self.attributes.update(attributes)
+        if error is not None:
+            self.status = "error"
+            self.error = repr(error)
+
+
+@dataclass
+class Trace:
+    """Spans of one graph run of an agent in a conversation thread."""
+
+    agent_name: str
+    thread_id: str
+    enabled: bool = True
+    latency_budgets: dict[str, float] = field(default_factory=dict)
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    spans: list[Span] = field(default_factory=list)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self.root = self.start_span("run", self.agent_name, parent_id=None)
+
+    def start_span(
+        self, kind: str, name: str, parent_id: str = "", span_id: str = None, **attrs
+    ) -> Span:
+        span = Span(
+            trace_id=self.trace_id,
+            span_id=span_id or uuid.uuid4().hex,
+            parent_id=self.root.span_id if parent_id == "" else parent_id,
+            kind=kind,
+            name=name,
+            start=time.time(),
+            attributes=attrs,
+        )
+        with self.lock:
+            self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, kind: str, name: str, **attributes):
+        if not self.enabled:
+            yield None
+            return
+
+        span = self.start_span(kind, name, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span.finish(error=e)
+            raise
+        else:
+            span.finish()
+
+    def config(self, config: dict) -> dict:
+        if not self.enabled:
+            return config
+        return {**config, "callbacks": [TraceCallbackHandler(self)]}
+
+    def activate(self):
+        if not self.enabled:
+            return nullcontext()
+        return activate(self)
+
+    async def stream(self, async_iterable):
+        """Iterate over a graph stream with this trace active on the event loop."""
+        with self.activate():
+            async for item in async_iterable:
+                yield item
+
+    def waterfall(self) -> list[dict]:
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        return [
+            {
+                "span": f"{span.kind}: {span.name}",
+                "kind": span.kind,
+                "start_ms": round(1000 * (span.start - self.root.start), 1),
+                "end_ms": round(
+                    1000 * (span.start - self.root.start + span.duration), 1
+                ),
+                "duration_ms": round(1000 * span.duration, 1),
+                "status": span.status,
+                "over_budget": span.attributes.get("over_budget", False),
+            }
+            for span in spans
+        ]
+
+
+@contextmanager
+def activate(trace: Trace):
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Spans of the graph nodes, LLM calls and tool calls of a run.
+
+    Nodes are the chain runs LangGraph names after the node, prefixed with
+    the path of the subgraph they run in. Other chain runs are only tracked
+    to parent spans to the closest enclosing span.
+    """
+
+    run_inline = True
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self.parents = {}
+        self.spans = {}
+
+    def parent_span_id(self, parent_run_id) -> str:
+        while parent_run_id is not None:
+            if parent_run_id in self.spans:
+                return self.spans[parent_run_id].span_id
+            parent_run_id = self.parents.get(parent_run_id)
+        return ""
+
+    def start(self, kind, name, run_id, parent_run_id, **attributes):
+        self.parents[run_id] = parent_run_id
+        self.spans[run_id] = self.trace.start_span(
+            kind,
+            name,
+            parent_id=self.parent_span_id(parent_run_id),
+            span_id=run_id.hex,
+            **attributes,
+        )
+
+    def finish(self, run_id, error=None, **attributes):
+        if span := self.spans.get(run_id):
+            span.finish(error=error, **attributes)
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs
+    ):
+        metadata = metadata or {}
+        name = kwargs.get("name")
+        if not name or name != metadata.get("langgraph_node"):
+            self.parents[run_id] = parent_run_id
+            return
+
+        namespace = metadata.get("langgraph_checkpoint_ns", "")
+        path = "/".join(part.split(":")[0] for part in namespace.split("|"))
+        self.start(
+            "node",
+            path or name,
+            run_id,
+            parent_run_id,
+            input_size=payload_size(inputs),
+        )
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self.finish(run_id, output_size=payload_size(outputs))
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, error=error)
+
+    def on_chat_model_start(
+        self,
+        serialized,
+        messages,
+        *,
+        run_id,
+        parent_run_id=None,
+        metadata=None,
+        **kwargs,
+    ):
+        metadata = metadata or {}
+        self.start(
+            "llm",
+            metadata.get("ls_model_name") or kwargs.get("name") or "llm",
+            run_id,
+            parent_run_id,
+            node=metadata.get("langgraph_node"),
+            input_size=payload_size(messages),
+        )
+
+    def on_llm_start(
+        self,
+        serialized,
+        prompts,
+        *,
+        run_id,
+        parent_run_id=None,
+        metadata=None,
+        **kwargs,
+    ):
+        metadata = metadata or {}
+        self.start(
+            "llm",
+            metadata.get("ls_model_name") or kwargs.get("name") or "llm",
+            run_id,
+            parent_run_id,
+            node=metadata.get("langgraph_node"),
+            input_size=payload_size(prompts),
+        )
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens = output_tokens = 0
+        output_size = 0
+        for generations in response.generations:
+            for generation in generations:
+                output_size += payload_size(
+                    getattr(generation, "message", None) or generation.text
+                )
+                usage = getattr(
+                    getattr(generation, "message", None), "usage_metadata", None
+                )
+                if usage:
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+
+        if not input_tokens and not output_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            input_tokens = usage.get("prompt_tokens", 0)
+            output_tokens = usage.get("completion_tokens", 0)
+
+        self.finish(
+            run_id,
+            output_size=output_size,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, error=error)
+
+    def on_tool_start(
+        self,
+        serialized,
+        input_str,
+        *,
+        run_id,
+        parent_run_id=None,
+        metadata=None,
+        **kwargs,
+    ):
+        metadata = metadata or {}
+        self.start(
+            "tool",
+            kwargs.get("name") or (serialized or {}).get("name") or "tool",
+            run_id,
+            parent_run_id,
+            node=metadata.get("langgraph_node"),
+            input_size=payload_size(kwargs.get("inputs") or input_str),
+        )
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.finish(run_id, output_size=payload_size(output))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, error=error)
+
+
+CHECKPOINT_METHODS = [
+    f"{prefix}{method}"
+    for prefix in ("", "a")
+    for method in ("get_tuple", "list", "put", "put_writes")
+]
+
+
+def instrument_checkpointer(checkpointer):
+    """Record checkpointer calls made during a traced run as spans."""
+
+    def traced(name, method):
+        if inspect.isasyncgenfunction(method) or inspect.isgeneratorfunction(method):
+            # Listing is lazy, its time is spent in the caller
+            return method
+
+        if inspect.iscoroutinefunction(method):
+
+            @functools.wraps(method)
+            async def async_wrapper(*args, **kwargs):
+                trace = current_trace.get()
+                if trace is None or in_checkpoint.get():
+                    return await method(*args, **kwargs)
+                token = in_checkpoint.set(True)
+                try:
+                    with trace.span("checkpoint", name):
+                        return await method(*args, **kwargs)
+                finally:
+                    in_checkpoint.reset(token)
+
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            trace = current_trace.get()
+            if trace is None or in_checkpoint.get():
+                return method(*args, **kwargs)
+            token = in_checkpoint.set(True)
+            try:
+                with trace.span("checkpoint", name):
+                    return method(*args, **kwargs)
+            finally:
+                in_checkpoint.reset(token)
+
+        return wrapper
+
+    for name in CHECKPOINT_METHODS:
+        setattr(checkpointer, name, traced(name, getattr(checkpointer, name)))
+    return checkpointer
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels: dict) -> str:
+    return ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+
+
+class Tracer:
+    """Finished traces, kept in memory, appended to a JSONL file and
+    aggregated into Prometheus metrics.
+
+    The file is rolled over to `path.1`, `path.2`, ... once it would exceed
+    `max_file_bytes`, keeping `file_backups` of them, or none if 0.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = TRACE_FILE,
+        max_traces: int = TRACE_MAX_TRACES,
+        max_file_bytes: int = TRACE_FILE_MAX_BYTES,
+        file_backups: int = TRACE_FILE_BACKUPS,
+        enabled: bool = TRACING,
+        buckets: tuple[float, ...] = DURATION_BUCKETS,
+    ):
+        self.path = path
+        self.max_file_bytes = max_file_bytes
+        self.file_backups = file_backups
+        self.enabled = enabled
+        self.buckets = buckets
+        self.traces: OrderedDict[str, Trace] = OrderedDict()
+        self.max_traces = max_traces
+        self.thread_traces = defaultdict(lambda: deque(maxlen=10))
+
+        self.durations = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self.duration_sums = defaultdict(float)
+        self.errors = defaultdict(int)
+        self.tokens = defaultdict(int)
+        self.payloads = defaultdict(int)
+        self.over_budget = defaultdict(int)
+        self.lock = threading.Lock()
+        self.file_lock = threading.Lock()
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @contextmanager
+    def run(
+        self, agent_name: str, thread_id: str, latency_budgets: dict[str, float] = None
+    ):
+        """Trace a graph run, active in the calling thread until it finishes.
+
+        Node runs slower than their budget in `latency_budgets`, by node name,
+        are marked and counted.
+        """
+        trace = Trace(
+            agent_name=agent_name,
+            thread_id=thread_id,
+            enabled=self.enabled,
+            latency_budgets=latency_budgets or {},
+        )
+        with trace.activate():
+            try:
+                yield trace
+            except BaseException as e:
+                trace.root.finish(error=e)
+                raise
+            else:
+                trace.root.finish()
+            finally:
+                if self.enabled:
+                    self.record(trace)
+
+    def record(self, trace: Trace):
+        with trace.lock:
+            spans = list(trace.spans)
+        for span in spans:
+            if span.end is None:
+                # Cancelled before its callback ran
+                span.end = time.time()
+                span.status = "unfinished"
+            if span.kind == "node":
+                budget = trace.latency_budgets.get(span.name.rsplit("/", 1)[-1])
+                if budget is not None and span.duration > budget:
+                    span.attributes.update(over_budget=True, budget_s=budget)
+
+        with self.lock:
+            self.traces[trace.trace_id] = trace
+            while len(self.traces) > self.max_traces:
+                _, dropped = self.traces.popitem(last=False)
+                # Threads are forgotten with their last trace
+                thread_traces = self.thread_traces.get(dropped.thread_id, ())
+                if dropped.trace_id in thread_traces:
+                    thread_traces.remove(dropped.trace_id)
+                if not thread_traces:
+                    self.thread_traces.pop(dropped.thread_id, None)
+            self.thread_traces[trace.thread_id].appendleft(trace.trace_id)
+
+            for span in spans:
+                key = (trace.agent_name, span.kind, span.name)
+                counts = self.durations[key]
+                for i, bucket in enumerate(self.buckets):
+                    if span.duration <= bucket:
+                        counts[i] += 1
+                counts[-1] += 1
+                self.duration_sums[key] += span.duration
+                if span.status == "error":
+                    self.errors[key] += 1
+                if span.attributes.get("over_budget"):
+                    self.over_budget[(trace.agent_name, span.name)] += 1
+                for direction in ("input", "output"):
+                    self.payloads[(*key, direction)] += span.attributes.get(
+                        f"{direction}_size", 0
+                    )
+                    if span.kind == "llm":
+                        node = span.attributes.get("node") or ""
+                        self.tokens[
+                            (trace.agent_name, node, direction)
+                        ] += span.attributes.get(f"{direction}_tokens", 0)
+
+        if self.path:
+            lines = "".join(
+                json.dumps(
+                    {
+                        "agent": trace.agent_name,
+                        "thread_id": trace.thread_id,
+                        **asdict(span),
+                        "duration": span.duration,
+                    },
+                    default=str,
+                )
+                + "\n"
+                for span in spans
+            )
+            with self.file_lock:
+                self.rotate(len(lines))
+                with open(self.path, "a") as file:
+                    file.write(lines)
+
+    def rotate(self, incoming: int):
+        """Roll the file over if `incoming` more bytes would take it past the limit."""
+        try:
+            size = os.path.getsize(self.path)
+        except FileNotFoundError:
+            return
+        if (
+            not self.max_file_bytes
+            or not size
+            or size + incoming <= self.max_file_bytes
+        ):
+            return
+
+        for index in range(self.file_backups - 1, 0, -1):
+            if os.path.exists(backup := f"{self.path}.{index}"):
+                os.replace(backup, f"{self.path}.{index + 1}")
+        if self.file_backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def get_traces(self, thread_id: str) -> list[Trace]:
+        """Traces of the most recent runs in a thread, latest first."""
+        with self.lock:
+            return [
+                self.traces[trace_id]
+                for trace_id in self.thread_traces.get(thread_id, [])
+                if trace_id in self.traces
+            ]
+
+    def prometheus(self) -> str:
+        lines = [
+            "# HELP agent_span_duration_seconds Duration of runs, graph nodes, "
+            "LLM calls, tool calls, checkpoint calls and rendering.",
+            "# TYPE agent_span_duration_seconds histogram",
+        ]
+
+        with self.lock:
+            for (agent, kind, name), counts in sorted(self.durations.items()):
+                labels = format_labels({"agent": agent, "kind": kind, "name": name})
+                for bucket, count in zip(self.buckets, counts):
+                    lines.append(
+                        f'agent_span_duration_seconds_bucket{{{labels},le="{bucket}"}} {count}'
+                    )
+                lines += [
+                    f'agent_span_duration_seconds_bucket{{{labels},le="+Inf"}} {counts[-1]}',
+                    f"agent_span_duration_seconds_sum{{{labels}}} "
+                    f"{self.duration_sums[(agent, kind, name)]:.6f}",
+                    f"agent_span_duration_seconds_count{{{labels}}} {counts[-1]}",
+                ]
+
+            lines += [
+                "# HELP agent_span_errors_total Spans that ended with an error.",
+                "# TYPE agent_span_errors_total counter",
+            ]
+            for (agent, kind, name), count in sorted(self.errors.items()):
+                labels = format_labels({"agent": agent, "kind": kind, "name": name})
+                lines.append(f"agent_span_errors_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP agent_node_over_budget_total Node runs slower than their "
+                "latency budget.",
+                "# TYPE agent_node_over_budget_total counter",
+            ]
+            for (agent, node), count in sorted(self.over_budget.items()):
+                labels = format_labels({"agent": agent, "node": node})
+                lines.append(f"agent_node_over_budget_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP agent_llm_tokens_total Tokens reported by LLM calls.",
+                "# TYPE agent_llm_tokens_total counter",
+            ]
+            for (agent, node, direction), count in sorted(self.tokens.items()):
+                labels = format_labels(
+                    {"agent": agent, "node": node, "type": direction}
+                )
+                lines.append(f"agent_llm_tokens_total{{{labels}}} {count}")
+
+            lines += [
+                "# HELP agent_payload_chars_total Characters of span inputs and outputs.",
+                "# TYPE agent_payload_chars_total counter",
+            ]
+            for (agent, kind, name, direction), count in sorted(self.payloads.items()):
+                if count:
+                    labels = format_labels(
+                        {
+                            "agent": agent,
+                            "kind": kind,
+                            "name": name,
+                            "direction": direction,
+                        }
+                    )
+                    lines.append(f"agent_payload_chars_total{{{labels}}} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+
+        body = tracer.prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """Serve the Prometheus metrics on http://host:port/metrics, once per process."""
+    global _metrics_server
+
+    with _metrics_server_lock:
+        if _metrics_server is not None or not port:
+            return
+        try:
+            _metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            _metrics_server = False
+            warnings.warn(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return
+        threading.Thread(
+            target=_metrics_server.serve_forever, name="agent-metrics", daemon=True
+        ).start()
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import BinaryIO, Optional
+
+UPLOAD_DIR = os.environ.get("AGENT_UPLOAD_DIR", ".cache/uploads")
+UPLOAD_QUOTA_BYTES = int(os.environ.get("AGENT_UPLOAD_QUOTA_BYTES", 1024**3))
+UPLOAD_CHUNK_BYTES = int(os.environ.get("AGENT_UPLOAD_CHUNK_BYTES", 1024**2))
+
+STORED_NAME = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+
+
+def file_content_hash(path: str, chunk_bytes: int = UPLOAD_CHUNK_BYTES) -> str:
+    """Content hash of a file, read from the name of stored uploads."""
+    if match := STORED_NAME.match(os.path.basename(path)):
+        return match.group(1)
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_bytes):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class UploadQuotaExceeded(Exception):
+    pass
+
+
+@dataclass
+class StoredFile:
+    content_hash: str
+    path: str
+    size: int
+    holders: set[str] = field(default_factory=set)
+    processed: set[str] = field(default_factory=set)
+    last_access: float = field(default_factory=time.time)
+
+
+class PendingUpload:
+    """Upload written to a part file in chunks while hashed."""
+
+    def __init__(self, directory: str):
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix=".part")
+        self.file = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.digest.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def close(self) -> str:
+        self.file.close()
+        return self.digest.hexdigest()
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadStore:
+    """Uploaded files stored once per content hash.
+
+    Uploads are streamed to disk in chunks of `chunk_bytes` while hashed,
+    and identical content is kept in a single file whatever session or
+    agent uploaded it. A holder, typically a conversation thread, holds one
+    file at a time. Files no holder references are deleted, least recently
+    used first, while the store exceeds `quota_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: str = UPLOAD_DIR,
+        quota_bytes: int = UPLOAD_QUOTA_BYTES,
+        chunk_bytes: int = UPLOAD_CHUNK_BYTES,
+    ):
+        self.directory = directory
+        self.quota_bytes = quota_bytes
+        self.chunk_bytes = chunk_bytes
+        self.files: dict[str, StoredFile] = {}
+        self.held: dict[str, str] = {}
+        self.uploads = 0
+        self.deduplicated = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.scan()
+
+    def scan(self):
+        """Index files kept from earlier processes, drop interrupted uploads."""
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                os.remove(path)
+            elif match := STORED_NAME.match(name):
+                stat = os.stat(path)
+                self.files[match.group(1)] = StoredFile(
+                    content_hash=match.group(1),
+                    path=path,
+                    size=stat.st_size,
+                    last_access=stat.st_mtime,
+                )
+
+    def open_upload(self) -> "PendingUpload":
+        return PendingUpload(self.directory)
+
+    def put(self, source: BinaryIO, holder: str, suffix: str = "") -> StoredFile:
+        """Store the content of a binary file object for `holder`."""
+        upload = self.open_upload()
+        try:
+            while chunk := source.read(self.chunk_bytes):
+                upload.write(chunk)
+        except BaseException:
+            upload.discard()
+            raise
+        return self.commit(upload, holder, suffix)
+
+    def commit(
+        self, upload: "PendingUpload", holder: str, suffix: str = ""
+    ) -> StoredFile:
+        """Store a finished upload, or drop it if its content is stored already."""
+        try:
+            content_hash = upload.close()
+
+            with self.lock:
+                self.uploads += 1
+                stored = self.files.get(content_hash)
+                if stored is not None and os.path.exists(stored.path):
+                    self.deduplicated += 1
+                    upload.discard()
+                else:
+                    path = os.path.join(self.directory, content_hash + suffix.lower())
+                    os.replace(upload.path, path)
+                    stored = self.files[content_hash] = StoredFile(
+                        content_hash=content_hash, path=path, size=upload.size
+                    )
+
+                self.hold(content_hash, holder)
+                try:
+                    self.gc()
+                except UploadQuotaExceeded:
+                    self.release(holder)
+                    if not stored.holders:
+                        self.remove(content_hash)
+                    raise
+                return stored
+        except BaseException:
+            upload.discard()
+            raise
+
+    def hold(self, content_hash: str, holder: str):
+        with self.lock:
+            self.release(holder)
+            stored = self.files[content_hash]
+            stored.holders.add(holder)
+            stored.last_access = time.time()
+            self.held[holder] = content_hash
+
+    def acquire(self, content_hash: str, holder: str) -> Optional[StoredFile]:
+        """Hold the file of `content_hash` for `holder`, if it is still stored."""
+        with self.lock:
+            stored = self.files.get(content_hash)
+            if stored is None or not os.path.exists(stored.path):
+                return None
+            if self.held.get(holder) != content_hash:
+                self.hold(content_hash, holder)
+            return stored
+
+    def release(self, holder: str):
+        with self.lock:
+            content_hash = self.held.pop(holder, None)
+            if content_hash in self.files:
+                self.files[content_hash].holders.discard(holder)
+
+    def get(self, content_hash: str) -> Optional[StoredFile]:
+        with self.lock:
+            stored = self.files.get(content_hash)
+            if stored is not None:
+                stored.last_access = time.time()
+            return stored
+
+    def is_processed(self, content_hash: str, key: str) -> bool:
+        with self.lock:
+            stored = self.files.get(content_hash)
+            return stored is not None and key in stored.processed
+
+    def mark_processed(self, content_hash: str, key: str):
+        """Record that `key`, e.g. an agent and its credentials, processed the file."""
+        with self.lock:
+            if content_hash in self.files:
+                self.files[content_hash].processed.add(key)
+
+    def bytes_held(self) -> int:
+        with self.lock:
+            return sum(stored.size for stored in self.files.values())
+
+    def gc(self):
+        with self.lock:
+            total = self.bytes_held()
+            unreferenced = sorted(
+                (stored for stored in self.files.values() if not stored.holders),
+                key=lambda stored: stored.last_access,
+            )
+            for stored in unreferenced:
+                if total <= self.quota_bytes:
+                    break
+                self.remove(stored.content_hash)
+                total -= stored.size
+
+            if total > self.quota_bytes:
+                raise UploadQuotaExceeded(
+                    f"Uploads in use take {total} bytes, over the quota of "
+                    f"{self.quota_bytes} bytes"
+                )
+
+    def remove(self, content_hash: str):
+        with self.lock:
+            stored = self.files.pop(content_hash, None)
+            if stored is None:
+                return
+            for holder in stored.holders:
+                self.held.pop(holder, None)
+            self.evictions += 1
+        if os.path.exists(stored.path):
+            os.remove(stored.path)
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "files": len(self.files),
+                "bytes_held": self.bytes_held(),
+                "quota_bytes": self.quota_bytes,
+                "holders": len(self.held),
+                "uploads": self.uploads,
+                "deduplicated": self.deduplicated,
+                "evictions": self.evictions,
+            }
+
+
+upload_store = UploadStore()
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    import faiss
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+    from langchain_core.embeddings import Embeddings
+
+VECTOR_INDEX_DIR = os.environ.get("AGENT_VECTOR_INDEX_DIR", ".cache/indexes")
+VECTOR_INDEX_CACHE_SIZE = int(os.environ.get("AGENT_VECTOR_INDEX_CACHE_SIZE", "16"))
+
+INDEX_FILE = "index.faiss"
+DOCUMENTS_FILE = "documents.json"
+
+
+def index_key(content_hash: str, **params) -> str:
+    """Key of the index of a document, for the parameters it is built with."""
+    payload = json.dumps([content_hash, params], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclass
+class LoadedIndex:
+    index: "faiss.Index"
+    documents: dict[str, "Document"]
+    index_to_docstore_id: dict[int, str]
+
+
+class VectorIndexStore:
+    """FAISS indexes of documents, built once and shared.
+
+    Indexes are keyed by `index_key`, the content hash of the document and
+    the chunking and embedding parameters, so every session querying the
+    same document uses the same index. Built indexes are saved under
+    `directory` and loaded with their vectors memory-mapped, so loading
+    costs no copy and processes share the pages through the OS cache. The
+    `cache_size` most recently used indexes stay loaded.
+    """
+
+    def __init__(
+        self,
+        directory: str = VECTOR_INDEX_DIR,
+        cache_size: int = VECTOR_INDEX_CACHE_SIZE,
+    ):
+        self.directory = directory
+        self.cache_size = cache_size
+        self.loaded: OrderedDict[str, LoadedIndex] = OrderedDict()
+        self.building = defaultdict(threading.Lock)
+        self.builds = 0
+        self.build_seconds = 0.0
+        self.loads = 0
+        self.hits = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        # Builds interrupted by an earlier process
+        for name in os.listdir(directory):
+            if name.endswith(".part"):
+                shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(os.path.join(self.path(key), INDEX_FILE))
+
+    def save(self, key: str, vector_store: "FAISS"):
+        import faiss
+
+        # Written aside and moved in place, so readers never see a partial index
+        path = tempfile.mkdtemp(dir=self.directory, suffix=".part")
+        try:
+            faiss.write_index(vector_store.index, os.path.join(path, INDEX_FILE))
+            documents = [
+                vector_store.docstore.search(docstore_id)
+                for docstore_id in vector_store.index_to_docstore_id.values()
+            ]
+            with open(os.path.join(path, DOCUMENTS_FILE), "w") as f:
+                json.dump(
+                    [
+                        {
+                            "id": docstore_id,
+                            "page_content": document.page_content,
+                            "metadata": document.metadata,
+                        }
+                        for docstore_id, document in zip(
+                            vector_store.index_to_docstore_id.values(), documents
+                        )
+                    ],
+                    f,
+                    default=str,
+                )
+            try:
+                os.replace(path, self.path(key))
+            except OSError:
+                # Saved by another process meanwhile, theirs is kept
+                if not self.exists(key):
+                    raise
+                shutil.rmtree(path, ignore_errors=True)
+        except BaseException:
+            shutil.rmtree(path, ignore_errors=True)
+            raise
+
+    def load(self, key: str) -> LoadedIndex:
+        import faiss
+        from langchain_core.documents import Document
+
+        path = self.path(key)
+        index = faiss.read_index(
+            os.path.join(path, INDEX_FILE),
+            faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY,
+        )
+        with open(os.path.join(path, DOCUMENTS_FILE)) as f:
+            rows = json.load(f)
+
+        return LoadedIndex(
+            index=index,
+            documents={
+                row["id"]: Document(
+                    id=row["id"],
+                    page_content=row["page_content"],
+                    metadata=row["metadata"],
+                )
+                for row in rows
+            },
+            index_to_docstore_id={i: row["id"] for i, row in enumerate(rows)},
+        )
+
+    def get(self, key: str, build: Callable[[], "FAISS"]) -> LoadedIndex:
+        """Index of `key`, built by `build` if no process has built it yet."""
+        with self.lock:
+            if loaded := self.loaded.get(key):
+                self.hits += 1
+                self.loaded.move_to_end(key)
+                return loaded
+            building = self.building[key]
+
+        # One build per key, concurrent callers wait for it
+        with building:
+            with self.lock:
+                if loaded := self.loaded.get(key):
+                    self.hits += 1
+                    return loaded
+
+            if not self.exists(key):
+                start = time.perf_counter()
+                self.save(key, build())
+                with self.lock:
+                    self.builds += 1
+                    self.build_seconds += time.perf_counter() - start
+
+            loaded = self.load(key)
+            with self.lock:
+                self.loads += 1
+                self.loaded[key] = loaded
+                self.building.pop(key, None)
+                while len(self.loaded) > self.cache_size:
+                    self.loaded.popitem(last=False)
+            return loaded
+
+    def vector_store(
+        self, key: str, build: Callable[[], "FAISS"], embeddings: "Embeddings"
+    ) -> "FAISS":
+        """Vector store over the shared index, querying with `embeddings`."""
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        from langchain_community.vectorstores import FAISS
+
+        loaded = self.get(key, build)
+        return FAISS(
+            embedding_function=embeddings,
+            index=loaded.index,
+            docstore=InMemoryDocstore(loaded.documents),
+            index_to_docstore_id=loaded.index_to_docstore_id,
+        )
+
+    def metrics(self) -> dict:
+        with self.lock:
+            return {
+                "loaded_indexes": len(self.loaded),
+                "loaded_vectors": sum(
+                    loaded.index.ntotal for loaded in self.loaded.values()
+                ),
+                "builds": self.builds,
+                "build_seconds": round(self.build_seconds, 2),
+                "loads": self.loads,
+                "hits": self.hits,
+            }
+
+
+vector_indexes = VectorIndexStore()
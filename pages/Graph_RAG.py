@@ -1,12 +1,15 @@
+import itertools
+import os
+
 import streamlit
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.graphs import Neo4jGraph
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_openai import ChatOpenAI
 
 from agents.graph_rag_agent import GraphRAGAgent
+from common.aio import run
+from common.ingestion import Prefetch, get_progress, read_pages
 from common.page import BasePage
 
+GRAPH_BATCH_PAGES = int(os.environ.get("AGENT_GRAPH_BATCH_PAGES", "4"))
+
 
 class GraphRAGPage(BasePage):
     agent = GraphRAGAgent
@@ -24,21 +27,29 @@ class GraphRAGPage(BasePage):
 
     @classmethod
     def on_file_upload(cls, uploaded_file):
-        graph_documents = LLMGraphTransformer(
-            llm=ChatOpenAI(
-                model="gpt-4o",
-                api_key=streamlit.session_state["OPENAI_API_KEY"],
-                temperature=0,
-            )
-        ).convert_to_graph_documents(PyPDFLoader(uploaded_file).load())
-
-        Neo4jGraph(
+        from langchain_community.graphs import Neo4jGraph
+        from langchain_experimental.graph_transformers import LLMGraphTransformer
+
+        transformer = LLMGraphTransformer(llm=cls.agent.get_llm(temperature=0))
+        graph = Neo4jGraph(
             url=streamlit.session_state["NEO4J_URI"],
             username=streamlit.session_state["NEO4J_USERNAME"],
             password=streamlit.session_state["NEO4J_PASSWORD"],
-        ).add_graph_documents(
-            graph_documents=graph_documents, baseEntityLabel=True, include_source=True
         )
 
+        progress = get_progress()
+        progress.start("Extracting graph from pages")
+        # Pages are parsed while earlier ones are extracted, a batch at a time
+        with Prefetch(read_pages(uploaded_file, progress), GRAPH_BATCH_PAGES) as pages:
+            for batch in itertools.batched(pages, GRAPH_BATCH_PAGES):
+                graph.add_graph_documents(
+                    graph_documents=run(
+                        transformer.aconvert_to_graph_documents(batch),
+                        on_idle=progress.report,
+                    ),
+                    baseEntityLabel=True,
+                    include_source=True,
+                )
+
 
 GraphRAGPage.display()
@@ -11,5 +11,11 @@ class SimpleRAGPage(BasePage):
     file_upload_label = "Upload PDF file"
     file_upload_type = ["pdf"]
 
+    @classmethod
+    def on_file_upload(cls, uploaded_file):
+        # Queries load the index built here instead of embedding the PDF
+        for tool in cls.agent.get_tools():
+            tool.build_index()
+
 
 SimpleRAGPage.display()
@@ -0,0 +1,382 @@
+"""HTTP API serving the agents without Streamlit.
+
+    uvicorn server:app
+
+Credentials are sent with every run and fall back to the environment.
+Conversations are keyed by the thread id chosen by the client, and runs
+stream their events as server-sent events. A run stops when its client
+disconnects or it is cancelled, and a run with `resume` continues the
+stopped run from its checkpoint.
+"""
+
+import asyncio
+import json
+import os
+import re
+import uuid
+import weakref
+from typing import Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel as PydanticModel
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+    StreamingResponse,
+)
+from starlette.routing import Route
+
+from agents.data_query_assistant_agent import DataQueryAssistantAgent
+from agents.financial_assistant_agent import FinancialAssistantAgent
+from agents.graph_rag_agent import GraphRAGAgent
+from agents.podcast_script_writer_agent import PodcastScriptWriterAgent
+from agents.python_and_react_assistant_agent import PythonAndReactAssistantAgent
+from agents.reddit_search_agent import RedditSearchAgent
+from agents.research_analyst_agent import ResearchAnalystAgent
+from agents.simple_rag_agent import SimpleRAGAgent
+from common.cancellation import CancelToken, cancel_metrics, cancelled_tool_messages
+from common.checkpoint import get_checkpointer
+from common.config import AgentConfig, use_config
+from common.tracing import tracer
+from common.uploads import UploadQuotaExceeded, upload_store
+
+SERVER_MAX_UPLOAD_BYTES = int(
+    os.environ.get("AGENT_SERVER_MAX_UPLOAD_BYTES", 100 * 1024 * 1024)
+)
+
+
+def slugify(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+AGENTS = {
+    slugify(agent.name): agent
+    for agent in [
+        DataQueryAssistantAgent,
+        FinancialAssistantAgent,
+        GraphRAGAgent,
+        PodcastScriptWriterAgent,
+        PythonAndReactAssistantAgent,
+        RedditSearchAgent,
+        ResearchAnalystAgent,
+        SimpleRAGAgent,
+    ]
+}
+
+# file id -> content hash of files uploaded through the API
+uploaded_files: dict[str, str] = {}
+
+# One run at a time per conversation thread
+_thread_locks = weakref.WeakValueDictionary()
+# Cancel token of the run in progress on a thread
+_run_tokens: dict[str, CancelToken] = {}
+
+
+class RunRequest(PydanticModel):
+    message: str = ""
+    resume: bool = False
+    keys: dict[str, str] = {}
+    file_id: Optional[str] = None
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        self.status_code = status_code
+        self.detail = detail
+
+
+def to_jsonable(value):
+    if isinstance(value, BaseMessage):
+        message = {"type": value.type, "id": value.id, "content": value.content}
+        if getattr(value, "tool_calls", None):
+            message["tool_calls"] = value.tool_calls
+        if getattr(value, "name", None):
+            message["name"] = value.name
+        return message
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(item) for item in value]
+    if isinstance(value, PydanticModel):
+        return to_jsonable(value.model_dump())
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(to_jsonable(data))}\n\n"
+
+
+def get_agent(request: Request):
+    agent = AGENTS.get(request.path_params["agent"])
+    if agent is None:
+        raise HTTPError(404, f"Unknown agent {request.path_params['agent']}")
+    return agent
+
+
+def get_thread_id(agent, request: Request) -> str:
+    return f"{agent.name}:{request.path_params['thread_id']}"
+
+
+def get_agent_config(agent, run: RunRequest) -> AgentConfig:
+    keys = {key: os.environ[key] for key in agent.config_keys if key in os.environ}
+    keys |= run.keys
+
+    if missing := [key for key in agent.config_keys if not keys.get(key)]:
+        raise HTTPError(400, f"Missing keys: {', '.join(missing)}")
+
+    files, hashes = {}, {}
+    if run.file_id:
+        stored = upload_store.get(uploaded_files.get(run.file_id, ""))
+        if stored is None:
+            raise HTTPError(404, f"Unknown file {run.file_id}")
+        files[agent.name] = stored.path
+        hashes[agent.name] = stored.content_hash
+
+    return AgentConfig(keys=keys, uploaded_files=files, uploaded_file_hashes=hashes)
+
+
+async def get_agent_input(agent, graph, config, message: str):
+    """Graph input for a human message, mirroring BasePage.get_agent_input."""
+    # Graphs without a checkpointer start over on every run
+    state = None if graph.checkpointer is None else await graph.aget_state(config)
+
+    if state is None or not state.values.get("messages"):
+        return {
+            "messages": [
+                SystemMessage(content=agent.system_prompt),
+                HumanMessage(content=message),
+            ]
+        }
+    if not agent.interrupt_before:
+        return {
+            "messages": cancelled_tool_messages(state.values["messages"])
+            + [HumanMessage(content=message)]
+        }
+
+    await graph.aupdate_state(
+        config,
+        {"messages": [HumanMessage(content=message)]}
+        | agent.update_graph_state(message),
+        as_node=agent.update_as_node,
+    )
+    return None
+
+
+async def stream_run(agent, graph, config, run: RunRequest, lock: asyncio.Lock):
+    thread_id = config["configurable"]["thread_id"]
+    token = _run_tokens[thread_id] = CancelToken()
+    token.cancel_task(asyncio.current_task())
+
+    try:
+        with tracer.run(
+            agent.name, thread_id, latency_budgets=agent.node_latency_budgets
+        ) as trace:
+            if run.resume:
+                agent_input = None
+                cancel_metrics.record_resume()
+            else:
+                agent_input = await get_agent_input(agent, graph, config, run.message)
+
+            async for mode, event in graph.astream(
+                input=agent_input,
+                config=token.config(trace.config(config)),
+                stream_mode=["messages", "updates"],
+            ):
+                if mode == "messages":
+                    chunk, metadata = event
+                    yield sse(
+                        "token",
+                        {
+                            "node": metadata.get("langgraph_node"),
+                            "content": chunk.content,
+                        },
+                    )
+                # Resumed runs replay the updates of completed nodes
+                elif not event.pop("__metadata__", {}).get("cached"):
+                    for node, update in event.items():
+                        yield sse("update", {"node": node, "update": update})
+
+        state = None if graph.checkpointer is None else await graph.aget_state(config)
+        yield sse(
+            "end",
+            {"trace_id": trace.trace_id, "next": list(state.next) if state else []},
+        )
+    except asyncio.CancelledError:
+        if not token.cancel("disconnected"):
+            # Cancelled through the API, the client is still listening
+            asyncio.current_task().uncancel()
+            yield sse("cancelled", {"reason": token.reason})
+        else:
+            raise
+    except Exception as e:
+        token.cancel("failed")
+        yield sse("error", {"error": repr(e)})
+    finally:
+        if token.cancelled and hasattr(checkpointer := get_checkpointer(), "flush"):
+            await asyncio.to_thread(checkpointer.flush)
+        if _run_tokens.get(thread_id) is token:
+            del _run_tokens[thread_id]
+        lock.release()
+
+
+async def list_agents(request: Request):
+    return JSONResponse(
+        [
+            {
+                "id": agent_id,
+                "name": agent.name,
+                "config_keys": agent.config_keys,
+                "nodes_to_display": agent.nodes_to_display,
+                "interrupt_before": agent.interrupt_before,
+                "models": {node: agent.get_model(node) for node in agent.model_routes},
+                "node_latency_budgets": agent.node_latency_budgets,
+            }
+            for agent_id, agent in AGENTS.items()
+        ]
+    )
+
+
+async def upload_file(request: Request):
+    get_agent(request)
+
+    file_id = uuid.uuid4().hex
+    filename = request.query_params.get("filename", "")
+
+    upload = upload_store.open_upload()
+    try:
+        async for chunk in request.stream():
+            if upload.size + len(chunk) > SERVER_MAX_UPLOAD_BYTES:
+                raise HTTPError(413, "File too large")
+            upload.write(chunk)
+    except BaseException:
+        upload.discard()
+        raise
+
+    try:
+        stored = upload_store.commit(
+            upload, holder=f"api:{file_id}", suffix=os.path.splitext(filename)[1]
+        )
+    except UploadQuotaExceeded as e:
+        raise HTTPError(507, str(e))
+
+    uploaded_files[file_id] = stored.content_hash
+    return JSONResponse(
+        {"file_id": file_id, "content_hash": stored.content_hash, "bytes": stored.size},
+        status_code=201,
+    )
+
+
+async def delete_file(request: Request):
+    file_id = request.path_params["file_id"]
+    if uploaded_files.pop(file_id, None) is None:
+        raise HTTPError(404, f"Unknown file {file_id}")
+
+    upload_store.release(f"api:{file_id}")
+    return Response(status_code=204)
+
+
+async def create_run(request: Request):
+    agent = get_agent(request)
+
+    try:
+        run = RunRequest.model_validate(await request.json())
+    except ValueError as e:
+        raise HTTPError(422, str(e))
+
+    if not run.message and not run.resume:
+        raise HTTPError(422, "A message is required")
+
+    agent_config = get_agent_config(agent, run)
+    config = {"configurable": {"thread_id": get_thread_id(agent, request)}}
+
+    lock = _thread_locks.setdefault(config["configurable"]["thread_id"], asyncio.Lock())
+    if lock.locked():
+        raise HTTPError(409, "A run is already in progress on this thread")
+    await lock.acquire()
+
+    try:
+        # Building may read uploaded files, keep it off the event loop
+        with use_config(agent_config):
+            graph = await asyncio.to_thread(agent.get_graph)
+        if run.resume and graph.checkpointer is None:
+            raise HTTPError(409, "Runs of this agent are not checkpointed")
+    except Exception:
+        lock.release()
+        raise
+
+    return StreamingResponse(
+        stream_run(agent, graph, config, run, lock),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def cancel_run(request: Request):
+    agent = get_agent(request)
+    token = _run_tokens.get(get_thread_id(agent, request))
+
+    if token is None or not token.cancel("cancelled"):
+        raise HTTPError(404, "No run in progress on this thread")
+    return Response(status_code=202)
+
+
+async def get_thread(request: Request):
+    agent = get_agent(request)
+    config = {"configurable": {"thread_id": get_thread_id(agent, request)}}
+
+    checkpoint = await get_checkpointer().aget_tuple(config)
+    if checkpoint is None:
+        raise HTTPError(404, "Unknown thread")
+
+    return JSONResponse(
+        to_jsonable(
+            {
+                key: value
+                for key, value in checkpoint.checkpoint["channel_values"].items()
+                if not key.startswith("__")
+            }
+        )
+    )
+
+
+async def delete_thread(request: Request):
+    agent = get_agent(request)
+    checkpointer = get_checkpointer()
+
+    if hasattr(checkpointer, "delete_thread"):
+        await asyncio.to_thread(
+            checkpointer.delete_thread, get_thread_id(agent, request)
+        )
+    return Response(status_code=204)
+
+
+async def metrics(request: Request):
+    return PlainTextResponse(
+        tracer.prometheus(), media_type="text/plain; version=0.0.4"
+    )
+
+
+async def http_error(request: Request, exc: HTTPError):
+    return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+
+
+app = Starlette(
+    routes=[
+        Route("/agents", list_agents),
+        Route("/agents/{agent}/files", upload_file, methods=["POST"]),
+        Route("/files/{file_id}", delete_file, methods=["DELETE"]),
+        Route("/agents/{agent}/threads/{thread_id}/runs", create_run, methods=["POST"]),
+        Route(
+            "/agents/{agent}/threads/{thread_id}/cancel", cancel_run, methods=["POST"]
+        ),
+        Route("/agents/{agent}/threads/{thread_id}", get_thread, methods=["GET"]),
+        Route("/agents/{agent}/threads/{thread_id}", delete_thread, methods=["DELETE"]),
+        Route("/metrics", metrics),
+    ],
+    exception_handlers={HTTPError: http_error},
+)
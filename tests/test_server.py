@@ -0,0 +1,72 @@
+import json
+
+import pytest
+from langchain_core.messages import AIMessage
+from langgraph.constants import END, START
+from langgraph.graph import MessagesState, StateGraph
+from starlette.testclient import TestClient
+
+import server
+
+
+class UncheckpointedAgent:
+    name = "Uncheckpointed Agent"
+    system_prompt = "You are a test agent."
+    config_keys = []
+    interrupt_before = []
+    node_latency_budgets = {}
+
+    @classmethod
+    def get_graph(cls):
+        async def agent(state):
+            return {"messages": [AIMessage(content=state["messages"][-1].content)]}
+
+        graph = StateGraph(MessagesState)
+        graph.add_node("agent", agent)
+        graph.add_edge(START, "agent")
+        graph.add_edge("agent", END)
+        return graph.compile()
+
+
+def events(body: str) -> list[tuple[str, dict]]:
+    parsed = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n")
+        parsed.append((event.removeprefix("event: "), json.loads(data[6:])))
+    return parsed
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setitem(server.AGENTS, "uncheckpointed", UncheckpointedAgent)
+    with TestClient(server.app) as client:
+        yield client
+
+
+def test_run_graph_without_checkpointer(client):
+    for message in ["first", "second"]:
+        response = client.post(
+            "/agents/uncheckpointed/threads/t1/runs", json={"message": message}
+        )
+        assert response.status_code == 200
+
+        (*updates, (event, data)) = events(response.text)
+        assert event == "end"
+        assert data["next"] == []
+        # Only the message of the run, nothing is kept from the previous one
+        (update,) = [data for event, data in updates if event == "update"]
+        assert update["node"] == "agent"
+        assert [m["content"] for m in update["update"]["messages"]] == [message]
+
+
+def test_resume_graph_without_checkpointer(client):
+    response = client.post(
+        "/agents/uncheckpointed/threads/t2/runs", json={"resume": True}
+    )
+    assert response.status_code == 409
+
+    # The thread is not left locked
+    response = client.post(
+        "/agents/uncheckpointed/threads/t2/runs", json={"message": "hello"}
+    )
+    assert events(response.text)[-1][0] == "end"
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+from common.vector_index import VectorIndexStore
+
+
+class HashEmbeddings(Embeddings):
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return np.random.default_rng(len(text)).random(8).tolist()
+
+
+def build(texts):
+    return lambda: FAISS.from_texts(texts, HashEmbeddings())
+
+
+def test_save_same_key_twice(tmp_path):
+    # Two workers indexing the same upload, each with its own store
+    first = VectorIndexStore(directory=str(tmp_path))
+    second = VectorIndexStore(directory=str(tmp_path))
+
+    first.save("key", build(["first", "index"])())
+    second.save("key", build(["second", "index", "dropped"])())
+
+    assert os.listdir(tmp_path) == ["key"]
+    loaded = second.get("key", build(["unused"]))
+    assert loaded.index.ntotal == 2
+    assert sorted(doc.page_content for doc in loaded.documents.values()) == [
+        "first",
+        "index",
+    ]
@@ -2,11 +2,14 @@ from datetime import date
 from enum import Enum
 from typing import Dict, Union, List, Optional, Annotated
 
-import requests
+import httpx
 from langchain_core.tools import BaseTool
 from langchain_core.utils.pydantic import TypeBaseModel
 from pydantic import BaseModel, Field, SkipValidation
 
+from common.coalesce import coalesce
+from common.http import get_client, get_async_client
+
 FINANCIAL_DATASETS_BASE_URL = "https://api.financialdatasets.ai/"
 
 
@@ -120,6 +123,23 @@ class SearchLineItemsTool(BaseTool):
     args_schema: Annotated[Optional[TypeBaseModel], SkipValidation()] = SearchLineItems
     return_direct: bool = True
 
+    @staticmethod
+    def _payload(tickers, line_items, period, limit, start_date, end_date):
+        payload = {
+            "tickers": tickers,
+            "line_items": line_items,
+            "period": period,
+            "limit": limit,
+        }
+
+        if start_date:
+            payload["start_date"] = start_date
+        if end_date:
+            payload["end_date"] = end_date
+
+        return payload
+
+    @coalesce("search-line-items", "financial_datasets_api_key")
     def _run(
         self,
         tickers: List[str],
@@ -131,20 +151,43 @@ class SearchLineItemsTool(BaseTool):
     ) -> Union[Dict, str]:
         url = f"{FINANCIAL_DATASETS_BASE_URL}financials/search/line-items"
 
-        payload = {
-            "tickers": tickers,
-            "line_items": line_items,
-            "period": period,
-            "limit": limit,
-        }
+        payload = self._payload(
+            tickers, line_items, period, limit, start_date, end_date
+        )
 
-        if start_date:
-            payload["start_date"] = start_date
-        if end_date:
-            payload["end_date"] = end_date
+        try:
+            response = get_client(FINANCIAL_DATASETS_BASE_URL).post(
+                url,
+                json=payload,
+                headers={
+                    "X-API-Key": self.financial_datasets_api_key,
+                    "Content-Type": "application/json",
+                },
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data
+        except httpx.HTTPError as e:
+            return {"search_results": [], "error": str(e)}
+
+    @coalesce("search-line-items", "financial_datasets_api_key")
+    async def _arun(
+        self,
+        tickers: List[str],
+        line_items: List[str],
+        period: str = "ttm",
+        limit: int = 1,
+        start_date: str = None,
+        end_date: str = None,
+    ) -> Union[Dict, str]:
+        url = f"{FINANCIAL_DATASETS_BASE_URL}financials/search/line-items"
+
+        payload = self._payload(
+            tickers, line_items, period, limit, start_date, end_date
+        )
 
         try:
-            response = requests.post(
+            response = await get_async_client(FINANCIAL_DATASETS_BASE_URL).post(
                 url,
                 json=payload,
                 headers={
@@ -155,5 +198,5 @@ class SearchLineItemsTool(BaseTool):
             response.raise_for_status()
             data = response.json()
             return data
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {"search_results": [], "error": str(e)}
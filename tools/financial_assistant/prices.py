@@ -1,10 +1,12 @@
 from typing import Dict, Union, Annotated, Optional
 
-import requests
 from langchain_core.tools import BaseTool
 from langchain_core.utils.pydantic import TypeBaseModel
 from pydantic import BaseModel, Field, SkipValidation
 
+from common.coalesce import coalesce
+from common.http import get_client, get_async_client
+
 FINANCIAL_DATASETS_BASE_URL = "https://api.financialdatasets.ai/"
 
 
@@ -42,6 +44,19 @@ class PricesTool(BaseTool):
     args_schema: Annotated[Optional[TypeBaseModel], SkipValidation()] = Prices
     return_direct: bool = True
 
+    @staticmethod
+    def _url(ticker, start_date, end_date, interval, interval_multiplier, limit):
+        return (
+            f"{FINANCIAL_DATASETS_BASE_URL}prices"
+            f"?ticker={ticker}"
+            f"&start_date={start_date}"
+            f"&end_date={end_date}"
+            f"&interval={interval}"
+            f"&interval_multiplier={interval_multiplier}"
+            f"&limit={limit}"
+        )
+
+    @coalesce("get-prices", "financial_datasets_api_key")
     def _run(
         self,
         ticker: str,
@@ -51,18 +66,35 @@ class PricesTool(BaseTool):
         interval_multiplier: int = 1,
         limit: int = 5000,
     ) -> Union[Dict, str]:
-        url = (
-            f"{FINANCIAL_DATASETS_BASE_URL}prices"
-            f"?ticker={ticker}"
-            f"&start_date={start_date}"
-            f"&end_date={end_date}"
-            f"&interval={interval}"
-            f"&interval_multiplier={interval_multiplier}"
-            f"&limit={limit}"
+        url = self._url(
+            ticker, start_date, end_date, interval, interval_multiplier, limit
+        )
+
+        try:
+            response = get_client(FINANCIAL_DATASETS_BASE_URL).get(
+                url, headers={"X-API-Key": self.financial_datasets_api_key}
+            )
+            data = response.json()
+            return data
+        except Exception as e:
+            return {"ticker": ticker, "prices": [], "error": str(e)}
+
+    @coalesce("get-prices", "financial_datasets_api_key")
+    async def _arun(
+        self,
+        ticker: str,
+        start_date: str,
+        end_date: str,
+        interval: str,
+        interval_multiplier: int = 1,
+        limit: int = 5000,
+    ) -> Union[Dict, str]:
+        url = self._url(
+            ticker, start_date, end_date, interval, interval_multiplier, limit
         )
 
         try:
-            response = requests.get(
+            response = await get_async_client(FINANCIAL_DATASETS_BASE_URL).get(
                 url, headers={"X-API-Key": self.financial_datasets_api_key}
             )
             data = response.json()
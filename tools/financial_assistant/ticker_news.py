@@ -1,10 +1,12 @@
 from typing import Dict, Union, Annotated, Optional
 
-import requests
 from langchain_core.tools import BaseTool
 from langchain_core.utils.pydantic import TypeBaseModel
 from pydantic import BaseModel, Field, SkipValidation
 
+from common.coalesce import coalesce
+from common.http import get_client, get_async_client
+
 POLYGON_BASE_URL = "https://api.polygon.io/"
 
 
@@ -22,11 +24,20 @@ class TickerNewsTool(BaseTool):
     args_schema: Annotated[Optional[TypeBaseModel], SkipValidation()] = TickerNews
     return_direct: bool = True
 
+    @coalesce("get-ticker-news", "polygon_api_key")
     def _run(self, ticker: str, limit: str) -> Union[Dict, str]:
         url = f"{POLYGON_BASE_URL}v2/reference/news?ticker={ticker}&apiKey={self.polygon_api_key}&limit={limit}"
-        response = requests.get(url)
-        data = response.json()
+        response = get_client(POLYGON_BASE_URL).get(url)
+        return self._parse(response.json())
+
+    @coalesce("get-ticker-news", "polygon_api_key")
+    async def _arun(self, ticker: str, limit: str) -> Union[Dict, str]:
+        url = f"{POLYGON_BASE_URL}v2/reference/news?ticker={ticker}&apiKey={self.polygon_api_key}&limit={limit}"
+        response = await get_async_client(POLYGON_BASE_URL).get(url)
+        return self._parse(response.json())
 
+    @staticmethod
+    def _parse(data):
         status = data.get("status", None)
         if status != "OK":
             raise ValueError(f"API Error: {data}")
@@ -1,11 +1,14 @@
 from typing import Dict, Union, Annotated
 from typing import List, Optional
 
-import requests
+import httpx
 from langchain_core.tools import BaseTool
 from langchain_core.utils.pydantic import TypeBaseModel
 from pydantic import BaseModel, Field, SkipValidation
 
+from common.coalesce import coalesce
+from common.http import get_client, get_async_client
+
 TAVILY_BASE_URL = "https://api.tavily.com"
 
 
@@ -63,6 +66,7 @@ class WebSearchTool(BaseTool):
     args_schema: Annotated[Optional[TypeBaseModel], SkipValidation()] = WebSearch
     return_direct: bool = True
 
+    @coalesce("web-search", "tavily_api_key")
     def _run(
         self,
         query: str,
@@ -91,7 +95,47 @@ class WebSearchTool(BaseTool):
         }
 
         try:
-            response = requests.post(
+            response = get_client(TAVILY_BASE_URL).post(
+                f"{TAVILY_BASE_URL}/search",
+                json=payload,
+                headers={"Content-Type": "application/json"},
+            )
+            response.raise_for_status()
+            data = response.json()
+            return data
+        except httpx.HTTPError as e:
+            return {"error": str(e)}
+
+    @coalesce("web-search", "tavily_api_key")
+    async def _arun(
+        self,
+        query: str,
+        search_depth: str = "advanced",
+        topic: str = "general",
+        days: int = 3,
+        max_results: int = 3,
+        include_images: bool = False,
+        include_answer: bool = True,
+        include_raw_content: bool = False,
+        include_domains: list = None,
+        exclude_domains: list = None,
+    ) -> Union[Dict, str]:
+        payload = {
+            "api_key": self.tavily_api_key,
+            "query": query,
+            "search_depth": search_depth,
+            "topic": topic,
+            "days": days,
+            "max_results": max_results,
+            "include_images": include_images,
+            "include_answer": include_answer,
+            "include_raw_content": include_raw_content,
+            "include_domains": include_domains if include_domains is not None else [],
+            "exclude_domains": exclude_domains if exclude_domains is not None else [],
+        }
+
+        try:
+            response = await get_async_client(TAVILY_BASE_URL).post(
                 f"{TAVILY_BASE_URL}/search",
                 json=payload,
                 headers={"Content-Type": "application/json"},
@@ -99,5 +143,5 @@ class WebSearchTool(BaseTool):
             response.raise_for_status()
             data = response.json()
             return data
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             return {"error": str(e)}
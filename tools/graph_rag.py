@@ -1,14 +1,11 @@
+import asyncio
 from typing import Union, Dict
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.graphs import Neo4jGraph
-from langchain_community.vectorstores import Neo4jVector
 from langchain_core.tools import BaseTool
-from langchain_experimental.graph_transformers import LLMGraphTransformer
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from openai import api_key
 from pydantic import Field
 
+from common.http import OPENAI_BASE_URL, get_client, get_async_client
+
 
 class DocumentsRetrieverTool(BaseTool):
     pdf_file: str = Field(..., description="Uploaded PDF file")
@@ -20,21 +17,38 @@ class DocumentsRetrieverTool(BaseTool):
     name: str = "documents-retriever"
     description: str = "Retrieve similar documents chunks"
 
-    def _run(self, query: str) -> Union[Dict, str]:
+    def _vector_index(self):
+        from langchain_community.graphs import Neo4jGraph
+        from langchain_community.vectorstores import Neo4jVector
+        from langchain_openai import OpenAIEmbeddings
+
         graph = Neo4jGraph(
             url=self.neo4j_uri,
             username=self.neo4j_username,
             password=self.neo4j_password,
         )
 
-        vector_index = Neo4jVector.from_existing_graph(
+        return Neo4jVector.from_existing_graph(
             graph=graph,
-            embedding=OpenAIEmbeddings(api_key=self.openai_api_key),
+            embedding=OpenAIEmbeddings(
+                api_key=self.openai_api_key,
+                http_client=get_client(OPENAI_BASE_URL),
+                http_async_client=get_async_client(OPENAI_BASE_URL),
+            ),
             node_label="Document",
             text_node_properties=["text"],
             embedding_node_property="embedding",
         )
 
+    def _run(self, query: str) -> Union[Dict, str]:
+        return "\n\n".join(
+            doc.page_content
+            for doc in self._vector_index().as_retriever().invoke(query)
+        )
+
+    async def _arun(self, query: str) -> Union[Dict, str]:
+        # The Neo4j driver connects synchronously
+        vector_index = await asyncio.to_thread(self._vector_index)
         return "\n\n".join(
-            doc.page_content for doc in vector_index.as_retriever().invoke(query)
+            doc.page_content for doc in await vector_index.as_retriever().ainvoke(query)
         )
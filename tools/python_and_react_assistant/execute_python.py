@@ -1,7 +1,7 @@
+import asyncio
 import base64
 from typing import Union, Dict
 
-from e2b_code_interpreter import Sandbox
 from langchain_core.tools import BaseTool
 from pydantic import Field
 
@@ -15,6 +15,8 @@ class ExecutePythonTool(BaseTool):
     )
 
     def _run(self, code: str) -> Union[Dict, str]:
+        from e2b_code_interpreter import Sandbox
+
         with Sandbox(api_key=self.e2b_api_key) as sandbox:
             execution = sandbox.run_code(code)
 
@@ -49,3 +51,6 @@ class ExecutePythonTool(BaseTool):
                 message += "Stderr: " + "\n".join(execution.logs.stderr) + "\n"
 
         return message
+
+    async def _arun(self, code: str) -> Union[Dict, str]:
+        return await asyncio.to_thread(self._run, code)
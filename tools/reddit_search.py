@@ -1,10 +1,11 @@
+import asyncio
 from typing import Union, Dict
 
-import praw
 from langchain_core.tools import BaseTool
-from praw.models import Comment
 from pydantic import Field, BaseModel
 
+from common.coalesce import coalesce
+
 
 class Rec(BaseModel):
     title: str
@@ -23,7 +24,13 @@ class RedditSearchTool(BaseTool):
     name: str = "reddit-search"
     description: str = "Provides access to search reddit"
 
+    @coalesce(
+        "reddit-search", "reddit_client_id", "reddit_client_secret", "reddit_user_agent"
+    )
     def _run(self, query: str) -> Union[Dict, str]:
+        import praw
+        from praw.models import Comment
+
         reddit = praw.Reddit(
             client_id=self.reddit_client_id,
             client_secret=self.reddit_client_secret,
@@ -56,3 +63,7 @@ class RedditSearchTool(BaseTool):
             recommendations += str(rec) + "\n\n"
 
         return recommendations
+
+    async def _arun(self, query: str) -> Union[Dict, str]:
+        # praw is synchronous only, identical searches are coalesced by _run
+        return await asyncio.to_thread(self._run, query)
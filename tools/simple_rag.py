@@ -1,29 +1,94 @@
-from typing import Union, Dict
+import asyncio
+import os
+from typing import Union, Dict, Optional
 
-from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import FAISS
 from langchain_core.tools import BaseTool
-from langchain_openai import OpenAIEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from pydantic import Field
 
+from common.aio import run
+from common.embedding_cache import cached_embeddings
+from common.http import OPENAI_BASE_URL, get_client, get_async_client
+from common.ingestion import (
+    EmbeddingPipeline,
+    Prefetch,
+    Progress,
+    get_progress,
+    read_pages,
+    split_pages,
+)
+from common.uploads import file_content_hash
+from common.vector_index import index_key, vector_indexes
+
+CHUNK_SIZE = int(os.environ.get("AGENT_RAG_CHUNK_SIZE", "500"))
+CHUNK_OVERLAP = int(os.environ.get("AGENT_RAG_CHUNK_OVERLAP", "50"))
+EMBEDDING_MODEL = os.environ.get("AGENT_EMBEDDING_MODEL", "text-embedding-ada-002")
+
 
 class DocumentsRetrieverTool(BaseTool):
     pdf_file: str = Field(..., description="Uploaded PDF file")
     openai_api_key: str = Field(..., description="OpenAI API key")
+    content_hash: Optional[str] = Field(None, description="Content hash of the PDF")
 
     name: str = "documents-retriever"
     description: str = "Retrieve documents chunks"
 
+    def _split_documents(self, progress: Progress = None):
+        return split_pages(
+            read_pages(self.pdf_file, progress), CHUNK_SIZE, CHUNK_OVERLAP
+        )
+
+    def _embeddings(self):
+        from langchain_openai import OpenAIEmbeddings
+
+        # Chunks embedded for any earlier document are not sent again
+        return cached_embeddings(
+            OpenAIEmbeddings(
+                model=EMBEDDING_MODEL,
+                api_key=self.openai_api_key,
+                http_client=get_client(OPENAI_BASE_URL),
+                http_async_client=get_async_client(OPENAI_BASE_URL),
+            ),
+            model=EMBEDDING_MODEL,
+        )
+
+    def _index_key(self) -> str:
+        return index_key(
+            self.content_hash or file_content_hash(self.pdf_file),
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
+            embedding_model=EMBEDDING_MODEL,
+        )
+
+    def _build_index(self):
+        progress = get_progress()
+        progress.start("Indexing pages")
+        pipeline = EmbeddingPipeline(
+            self._embeddings(), progress=progress, model=EMBEDDING_MODEL
+        )
+        # Pages are parsed and split while earlier chunks are embedded
+        with Prefetch(self._split_documents(progress)) as documents:
+            return run(
+                pipeline.build(documents), on_idle=progress.report, idle_seconds=0.2
+            )
+
+    def _vector_store(self):
+        """Index of the PDF, built by the first query if not at upload."""
+        return vector_indexes.vector_store(
+            self._index_key(), self._build_index, self._embeddings()
+        )
+
+    def build_index(self):
+        vector_indexes.get(self._index_key(), self._build_index)
+
     def _run(self, query: str) -> Union[Dict, str]:
         return "\n\n".join(
             doc.page_content
-            for doc in FAISS.from_documents(
-                RecursiveCharacterTextSplitter(
-                    chunk_size=500, chunk_overlap=50
-                ).split_documents(PyPDFLoader(self.pdf_file).load()),
-                OpenAIEmbeddings(api_key=self.openai_api_key),
-            )
-            .as_retriever()
-            .invoke(query)
+            for doc in self._vector_store().as_retriever().invoke(query)
+        )
+
+    async def _arun(self, query: str) -> Union[Dict, str]:
+        # Loading reads the index from disk, and the first query may build it
+        vector_store = await asyncio.to_thread(self._vector_store)
+        return "\n\n".join(
+            doc.page_content for doc in await vector_store.as_retriever().ainvoke(query)
         )